@@ -0,0 +1,335 @@
+"""
+asyncio counterpart of blackduck.Client
+
+Mirrors list_resources, get_resource, get_metadata, get_json and get_items using
+coroutines and async generators on top of aiohttp, so thousands of resources can be
+fanned out from a single thread. Requires the optional aiohttp dependency:
+
+    pip3 install blackduck[async]
+
+Usage:
+
+    async with AsyncClient(token=..., base_url="https://your.blackduck.url") as bd:
+        async for project in bd.get_resource('projects'):
+            print(project.get('name'))
+"""
+
+from .Authentication import AsyncBearerAuth
+from .Models import Resource
+from .Utils import LinkIndex
+import asyncio
+import json
+import logging
+from http import HTTPStatus
+from pprint import pformat
+from urllib.parse import urljoin
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHubSession:
+    """Hold base_url, timeout, retries, and provide sensible defaults (see HubSession)"""
+
+    # HTTP response status codes retried, as in HubSession
+    status_forcelist = (429, 500, 502, 503, 504)
+    # methods safe to send again, as urllib3's Retry.DEFAULT_ALLOWED_METHODS: a POST is never
+    # repeated once it may have reached the server
+    allowed_methods = frozenset(('HEAD', 'GET', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'))
+
+    def __init__(self, base_url, timeout, retries, verify, limit=100):
+        if aiohttp is None:
+            raise ImportError("AsyncClient requires aiohttp. Install it with: pip3 install blackduck[async]")
+        self.base_url = base_url
+        self.verify = verify
+        self.retries = int(retries)
+        self.backoff_factor = 2  # exponential retry 2, 4, 8, 16 sec ...
+        self.auth = None
+        self._timeout = aiohttp.ClientTimeout(total=float(timeout))
+        self._limit = limit  # maximum number of simultaneous connections
+        self._session = None
+        logger.info("Using an async session with a %s second timeout and up to %s retries per request",
+                    timeout, retries)
+
+    def _get_session(self):
+        # aiohttp sessions must be created inside the running event loop
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._limit, ssl=None if self.verify else False)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+        return self._session
+
+    async def request(self, method, url, **kwargs):
+        """Issue a request and return the aiohttp.ClientResponse with its body already read
+
+        Args:
+            method (str): HTTP verb
+            url (str): absolute or relative to base_url
+            kwargs: passed to aiohttp.ClientSession.request. auth=None disables authentication.
+        """
+        auth = kwargs.pop('auth', self.auth)
+        headers = kwargs.pop('headers', dict())
+
+        if method.lower() == 'get':
+            lc_keys = {key.lower(): value for (key, value) in headers.items()}
+            if 'accept' not in lc_keys and 'content-type' not in lc_keys:
+                # set default media type only if neither 'accept' nor 'content-type'
+                # exist as some endpoints may only accept one or the other but not both
+                lc_keys['accept'] = "application/json"
+                lc_keys['content-type'] = "application/json"
+            headers = lc_keys
+
+        url = urljoin(self.base_url, url)
+        idempotent = method.upper() in self.allowed_methods
+        attempt = 0
+        while True:
+            request_headers = dict(headers)
+            if auth is not None:
+                await auth(request_headers)
+            try:
+                response = await self._get_session().request(method, url, headers=request_headers, **kwargs)
+                await response.read()
+            except aiohttp.ClientConnectorError:
+                # the connection could not be made, so nothing was sent: safe for any method
+                if attempt >= self.retries:
+                    raise
+                logger.debug("%s %s failed to connect, retrying", method, url, exc_info=True)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not idempotent or attempt >= self.retries:
+                    raise
+                logger.debug("%s %s failed, retrying", method, url, exc_info=True)
+            else:
+                if not idempotent or response.status not in self.status_forcelist or attempt >= self.retries:
+                    return response
+                logger.debug("%s %s returned %s, retrying", method, url, response.status)
+            attempt += 1
+            await asyncio.sleep(self.backoff_factor * (2 ** (attempt - 1)))
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request('PUT', url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request('DELETE', url, **kwargs)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncClient:
+    """asyncio binding to Blackduck's REST API with the same interface as Client.
+
+    Use it as an async context manager, or call close() when done.
+    """
+    def __init__(self,
+                 token=None,
+                 base_url=None,
+                 session=None,
+                 auth=None,
+                 verify=True,
+                 timeout=15.0,  # in seconds
+                 retries=3,
+                 limit=100):
+        """Instantiate an AsyncClient for use with Hub's REST-API
+
+        Args:
+            token (str): Access Token obtained from the Hub UI: System -> My Access Tokens
+            base_url (str): e.g. "https://your.blackduck.url"
+            session (AsyncHubSession): custom session if specified.  For advanced users only.
+            auth (callable): custom authorization coroutine taking the request headers dict.
+                If not provided, one based on the access token is generated and used.
+            verify (bool): TLS certificate verification. Defaults to True.
+            timeout (float): request timeout in seconds. Defaults to 15 seconds.
+            retries (int): maximum number of times to retry a request. Defaults to 3.
+            limit (int): maximum number of simultaneous connections. Defaults to 100.
+        """
+        self.base_url = base_url
+        self.session = session or AsyncHubSession(base_url, timeout, retries, verify, limit)
+        self.session.auth = auth or AsyncBearerAuth(self.session, token)
+        self.root_resources_dict = None
+        self.link_index = LinkIndex()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.session.close()
+
+    async def list_resources(self, parent=None):
+        """List named resources that can be fetched.
+
+        Args:
+            parent (dict/json): resource object from prior get_resource invocations.
+                                Defaults to None (for root /api/ base).
+
+        Returns:
+            dict(str -> str): of public resource names to urls
+                              To obtain the url to the parent itself, use key 'href'.
+        """
+        if isinstance(parent, Resource):
+            return parent.resources
+        if parent is not None and not isinstance(parent, dict):
+            raise TypeError("parent parameter must be a dict or a blackduck.Models.Resource if not None")
+
+        if not parent:
+            if self.root_resources_dict is None:
+                # cache root resources for efficiency
+                resp = await self.session.get("/api/")
+                resources_dict = await resp.json(content_type=None)
+                resources_dict['href'] = str(resp.url)  # save url to root itself
+                del resources_dict['_meta']
+                self.root_resources_dict = resources_dict
+            return self.root_resources_dict
+        else:
+            return self.link_index.links(parent)
+
+    def get_resource(self, name, parent=None, items=True, **kwargs):
+        """Fetch a named resource.
+
+        Use 'async for' on the result when items=True, otherwise await it.
+
+        Args:
+            name (str): resource name i.e. specific key from list_resources()
+            parent (dict/json): resource object from prior get_resource() call.
+                                Use None for root /api/ base.
+            items (bool): enable resource generator for paginated results. Defaults to True.
+            kwargs: passed to session.request
+
+        Returns:
+            async generator (items=True) or coroutine returning dict formed from returned json
+        """
+        if items:
+            return self._get_resource_items(name, parent, **kwargs)
+        return self._get_resource_json(name, parent, **kwargs)
+
+    async def _get_resource_json(self, name, parent, **kwargs):
+        url = await self._get_resource_url(name, parent)
+        return await self.get_json(url, **kwargs)
+
+    async def _get_resource_items(self, name, parent, **kwargs):
+        url = await self._get_resource_url(name, parent)
+        async for item in self.get_items(url, **kwargs):
+            yield item
+
+    async def _get_resource_url(self, name, parent):
+        if not isinstance(name, str) or not name:
+            raise TypeError("name parameter must be a non-empty str")
+        if parent is not None and not isinstance(parent, (dict, Resource)):
+            raise TypeError("parent parameter must be a dict or a blackduck.Models.Resource if not None")
+
+        resources_dict = await self.list_resources(parent)
+        if name not in resources_dict:
+            msg = f"resource name '{name}' not found in available resources"
+            logger.error(msg)
+            logger.error(pformat(resources_dict))
+            raise KeyError(msg)
+        return resources_dict[name]
+
+    async def get_metadata(self, name, parent=None, **kwargs):
+        """Fetch named resource metadata and other useful data such as totalCount.
+
+        Args:
+            name (str): resource name i.e. specific key from list_resources()
+            parent (dict/json): resource object from prior get_resource() call.
+                                Use None for root /api/ base.
+            kwargs: passed to session.request
+
+        Returns:
+            dict/json: named resource metadata
+        """
+        kwargs['params'] = {'limit': 1}
+        return await self.get_resource(name, parent, items=False, **kwargs)
+
+    async def get_json(self, url, **kwargs):
+        """Streamline GET request to url endpoint and return json result
+           while preserving underlying error handling.
+
+        Args:
+            url (str): of endpoint
+            kwargs: passed to session.request
+
+        Returns:
+            json/dict: requested object
+
+        Raises:
+            aiohttp.ClientResponseError: from response.raise_for_status()
+            json.JSONDecodeError: if response.text is not json
+        """
+        r = await self.session.get(url, **kwargs)
+
+        if r.status != 200:
+            # print out a more descriptive error message before raising an exception
+            await self.http_error_handler(r)
+
+        r.raise_for_status()
+
+        content_type = r.headers.get('Content-Type', '')
+        if 'internal' in content_type:
+            logger.warning("Response contains internal proprietary Content-Type: " + content_type)
+
+        try:
+            return await r.json(content_type=None)
+        except json.JSONDecodeError:
+            await self.http_error_handler(r)
+            raise
+
+    async def get_items(self, url, page_size=250, **kwargs):
+        """Fetch 'pages' of items
+
+        Args:
+            url (str): of endpoint
+            page_size (int): Number of items to get per page. Defaults to 250.
+            kwargs: passed to session.request
+
+        Yields:
+            async generator(dict/json): of items
+        """
+        offset = 0
+        params = kwargs.pop('params', dict())
+
+        while True:
+            params.update({'offset': f"{offset}", 'limit': f"{page_size}"})
+            kwargs['params'] = params
+            items = (await self.get_json(url, **kwargs)).get('items', list())
+
+            for item in items:
+                yield item
+
+            if len(items) < page_size:
+                # This will be true if there are no more 'pages' to view
+                break
+
+            offset += page_size
+
+    @staticmethod
+    async def http_error_handler(r):
+        """Handle an unexpected aiohttp.ClientResponse by logging useful information.
+
+        Args:
+            r (aiohttp.ClientResponse): to handle
+        """
+        logger.error(f"{r.method} {r.url}")
+        try:
+            status_description = HTTPStatus(r.status).phrase
+        except ValueError:
+            status_description = "unknown"
+        logger.error(f"HTTP response status code {r.status}: {status_description}")
+        text = await r.text()
+        try:
+            content = json.dumps(json.loads(text), indent=4)
+            logger.error(f"HTTP response json (formatted): {content}")
+        except json.JSONDecodeError:
+            logger.error(f"HTTP response text: {text}")
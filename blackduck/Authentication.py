@@ -3,6 +3,7 @@ Created on Dec 23, 2020
 @author: ar-calder
 """
  
+import asyncio
 import requests
 from requests.auth import AuthBase
 import logging
@@ -91,6 +92,92 @@ class BearerAuth(AuthBase):
         raise RuntimeError("Unhandled HTTP response", response)
 
 
+class AsyncBearerAuth:
+    """Authenticate an AsyncHubSession with Blackduck hub using access token
+
+       Same renewal semantics as BearerAuth: a bearer token is obtained on first use
+       and renewed 5 minutes before it expires. Concurrent requests share a single renewal.
+    """
+
+    def __init__(self, session, token):
+        """
+        Args:
+            session (AsyncHubSession): async session to authenticate
+            token (string): of Blackduck user from UI: System -> My Access Tokens
+        """
+        if any(arg is False for arg in (session, token)):
+            raise ValueError(
+                'session & token are required'
+            )
+
+        self.session = session
+        self.access_token = token
+        self.bearer_token = None
+        self.csrf_token = None
+        self.valid_until = datetime.now()
+        self._lock = None
+
+    def _needs_renewal(self):
+        return not self.bearer_token or datetime.now() > self.valid_until - timedelta(minutes=5)
+
+    async def __call__(self, headers):
+        if self._needs_renewal():
+            # If bearer token not set or nearing expiry
+            if self._lock is None:
+                self._lock = asyncio.Lock()  # created lazily so it binds to the running event loop
+            async with self._lock:
+                if self._needs_renewal():  # another task may have renewed it while we waited
+                    await self.authenticate()
+
+        headers.update({
+            "authorization": f"bearer {self.bearer_token}",
+            "X-CSRF-TOKEN": self.csrf_token
+        })
+
+        return headers
+
+    async def authenticate(self):
+        if not self.session.verify:
+            # Announce this on every auth attempt, as a little incentive to properly configure certs
+            logger.warning("ssl verification disabled, connection insecure. do NOT use verify=False in production!")
+
+        response = await self.session.post(
+            url="api/tokens/authenticate",
+            auth=None,  # temporarily strip authentication to avoid infinite recursion
+            headers={"Authorization": f"token {self.access_token}"}
+        )
+
+        if response.status == 200:
+            try:
+                content = await response.json(content_type=None)
+                self.bearer_token = content['bearerToken']
+                self.csrf_token = response.headers['X-CSRF-TOKEN']
+                self.valid_until = datetime.now() + timedelta(milliseconds=int(content['expiresInMilliseconds']))
+                logger.info(f"success: auth granted until {self.valid_until.astimezone()}")
+                return
+            except (json.JSONDecodeError, KeyError):
+                logger.exception("HTTP response status code 200 but unable to obtain bearer token")
+                # fall through
+
+        text = await response.text()
+        if response.status == 401:
+            logger.error("HTTP response status code = 401 (Unauthorized)")
+            try:
+                logger.error(json.loads(text)['errorMessage'])
+            except (json.JSONDecodeError, KeyError):
+                logger.exception("unable to extract error message")
+                logger.error("HTTP response headers: %s", response.headers)
+                logger.error("HTTP response text: %s", text)
+            raise RuntimeError("Unauthorized access token", response)
+
+        # all unhandled responses fall through to here
+        logger.error("Unhandled HTTP response")
+        logger.error("HTTP response status code %i", response.status)
+        logger.error("HTTP response headers: %s", response.headers)
+        logger.error("HTTP response text: %s", text)
+        raise RuntimeError("Unhandled HTTP response", response)
+
+
 class CookieAuth(AuthBase):
     """Authenticate with Blackduck hub using username/password
 
@@ -0,0 +1,424 @@
+"""
+Bulk mutation of many resources
+
+BOM edits (usages, approval statuses, remediation, policy overrides) are one PUT per
+entry, and scripts send them one after the other. A BulkMutator queues PUT/POST/DELETE
+operations and executes them concurrently with a cap on requests per second per host,
+retrying what is safe to retry, and returns a BulkReport with one result per operation.
+
+Retries are idempotent-aware: PUT and DELETE are retried after network errors and
+429/5xx responses (a DELETE answered 404 on a retry counts as done, as the first attempt
+went through); POST is retried only when the server refused it without processing it
+(429/503) or never reached it (connection refused or timed out while connecting), so
+nothing is created twice. Any other error of an operation (e.g. a body that is not JSON
+serializable) fails that operation only and is recorded in its result.
+Attempts the session's own urllib3 Retry already made (Client.session and
+HubInstance.session have one) count toward retries, so the two layers do not multiply.
+
+Usage:
+
+    from blackduck.Bulk import BulkMutator
+
+    bulk = BulkMutator(bd.session, max_workers=16, rate=50)
+    for vulnerability in vulnerable_components:
+        bulk.put(vulnerability['_meta']['href'], {'remediationStatus': "IGNORED", 'comment': "not reachable"},
+                 key=vulnerability['vulnerabilityWithRemediation']['vulnerabilityName'])
+    report = bulk.execute()
+    report.write_csv("remediation-results.csv")
+
+With a HubInstance, pass its session and authentication headers:
+BulkMutator(hub.session, headers=hub.get_headers()).
+
+plan() and Plan.apply() add a dry-run layer on top: the desired state (e.g. read from a CSV
+or YAML file) is diffed against the current objects, fetched concurrently, and only the
+objects that actually differ are PUT. Unchanged objects cost no write and trigger no
+recomputation on the server.
+
+    from blackduck.Bulk import BulkMutator, plan, read_csv
+
+    desired = read_csv("users.csv", key='userName')  # other columns are fields; empty cells are left alone
+    users_plan = plan(desired, lambda name: find_user(bd, name))
+    print("\n".join(users_plan.describe()))
+    if not args.dry_run:
+        report = users_plan.apply(BulkMutator(bd.session))
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import csv
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.packages.urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from .RateLimit import TokenBucket
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+POST_RETRY_STATUS_CODES = (429, 503)  # refused before being processed
+
+
+class Operation:
+    """One queued request"""
+
+    __slots__ = ('method', 'url', 'body', 'headers', 'key')
+
+    def __init__(self, method, url, body=None, headers=None, key=None):
+        self.method = method
+        self.url = url
+        self.body = body
+        self.headers = headers or {}
+        self.key = key if key is not None else url
+
+
+class OperationResult:
+    """Outcome of one operation"""
+
+    __slots__ = ('operation', 'ok', 'status_code', 'attempts', 'seconds', 'error', 'location')
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.ok = False
+        self.status_code = None
+        self.attempts = 0
+        self.seconds = 0.0
+        self.error = None
+        self.location = None  # Location header, e.g. of what a POST created
+
+    def as_dict(self):
+        return {
+            'key': self.operation.key, 'method': self.operation.method, 'url': self.operation.url,
+            'ok': self.ok, 'status_code': self.status_code, 'attempts': self.attempts,
+            'seconds': round(self.seconds, 3), 'error': self.error, 'location': self.location,
+        }
+
+    def __repr__(self):
+        return f"OperationResult({self.operation.method} {self.operation.key}, ok={self.ok}, {self.status_code})"
+
+
+class BulkReport:
+    """Results of BulkMutator.execute(), in the order the operations were queued"""
+
+    def __init__(self, results, seconds):
+        self.results = results
+        self.seconds = seconds
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    def write_csv(self, path):
+        """Write one row per operation to a CSV file"""
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(OperationResult(Operation(None, None)).as_dict()))
+            writer.writeheader()
+            writer.writerows(r.as_dict() for r in self.results)
+
+
+class BulkMutator:
+    """Queue PUT/POST/DELETE operations and execute them concurrently, rate limited per host"""
+
+    def __init__(self, session, max_workers=8, rate=None, retries=3, backoff=1.0, headers=None):
+        """
+        Args:
+            session (requests.Session): e.g. Client.session or HubInstance.session
+            max_workers (int): operations executed concurrently. Defaults to 8.
+            rate (float): maximum requests per second to each host. Defaults to None (no limit).
+            retries (int): further attempts for an operation that may be retried. Defaults to 3.
+            backoff (float): seconds before the first retry, doubled for each next one, unless the
+                server sends Retry-After. Defaults to 1.
+            headers (dict): sent with every operation, e.g. HubInstance.get_headers(). Defaults to None.
+        """
+        self.session = session
+        self.max_workers = max_workers
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.headers = headers or {}
+        self.operations = []
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.operations)
+
+    def put(self, url, body, headers=None, key=None):
+        """Queue a PUT of body (json) to url; key identifies the operation in the report (default: url)"""
+        self.operations.append(Operation('PUT', url, body, headers, key))
+
+    def post(self, url, body, headers=None, key=None):
+        """Queue a POST of body (json) to url"""
+        self.operations.append(Operation('POST', url, body, headers, key))
+
+    def delete(self, url, headers=None, key=None):
+        """Queue a DELETE of url"""
+        self.operations.append(Operation('DELETE', url, None, headers, key))
+
+    def execute(self):
+        """Execute the queued operations, emptying the queue
+
+        Returns:
+            BulkReport: one OperationResult per operation
+        """
+        operations, self.operations = self.operations, []
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self._execute, operations))
+        report = BulkReport(results, time.monotonic() - start)
+        logger.info(f"executed {len(results)} operations in {report.seconds:.1f}s: "
+                    f"{len(report.succeeded)} succeeded, {len(report.failed)} failed")
+        return report
+
+    def _throttle(self, url):
+        if self.rate is None:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate)
+        bucket.acquire()
+
+    def _execute(self, operation):
+        result = OperationResult(operation)
+        headers = dict(self.headers, **operation.headers)
+        start = time.monotonic()
+        while True:
+            result.attempts += 1
+            self._throttle(operation.url)
+            retry_after = None
+            try:
+                response = self.session.request(operation.method, operation.url, json=operation.body,
+                                                headers=headers)
+                result.attempts += _adapter_retries(response)
+                result.status_code = response.status_code
+                if response.ok or (operation.method == 'DELETE' and response.status_code == 404
+                                   and result.attempts > 1):
+                    result.ok = True
+                    result.error = None
+                    result.location = response.headers.get('Location')
+                    break
+                result.error = f"HTTP {response.status_code}: {response.text[:200]}"
+                retry_codes = POST_RETRY_STATUS_CODES if operation.method == 'POST' else RETRY_STATUS_CODES
+                retryable = response.status_code in retry_codes
+                retry_after = response.headers.get('Retry-After')
+            except requests.exceptions.RetryError as err:
+                # the session's adapter retried until it gave up: retrying again would only multiply attempts
+                result.error = str(err)
+                result.attempts += _adapter_total(self.session, operation.url)
+                retryable = False
+            except requests.RequestException as err:
+                result.error = str(err)
+                retryable = operation.method != 'POST' or _never_sent(err)
+                if err.args and isinstance(err.args[0], MaxRetryError):
+                    # the adapter already retried (connecting, for any method) until it gave up
+                    adapter_retries = _adapter_total(self.session, operation.url)
+                    result.attempts += adapter_retries
+                    retryable = retryable and not adapter_retries
+            except Exception as err:
+                # e.g. a body json cannot encode: fail this operation, not the whole execute()
+                logger.exception(f"{operation.method} {operation.url} raised {err!r}")
+                result.error = f"{type(err).__name__}: {err}"
+                break
+            if not retryable or result.attempts > self.retries:
+                logger.error(f"{operation.method} {operation.url} failed: {result.error}")
+                break
+            wait = float(retry_after) if retry_after and retry_after.isdigit() else \
+                self.backoff * 2 ** (result.attempts - 1)
+            logger.debug(f"{operation.method} {operation.url} failed ({result.error}), retrying in {wait}s")
+            time.sleep(wait)
+        result.seconds = time.monotonic() - start
+        return result
+
+
+def _adapter_retries(response):
+    """Retries urllib3 made inside the session's adapter before returning response"""
+    retries = getattr(getattr(response, 'raw', None), 'retries', None)
+    return len(getattr(retries, 'history', None) or ())
+
+
+def _never_sent(err):
+    """True if err means the request never reached the server: the connection could not be made"""
+    if isinstance(err, requests.ConnectTimeout):
+        return True
+    if not isinstance(err, requests.ConnectionError) or not err.args:
+        return False
+    reason = getattr(err.args[0], 'reason', err.args[0])  # urllib3 wraps it in a MaxRetryError
+    return isinstance(reason, NewConnectionError)
+
+
+def _adapter_total(session, url):
+    """Retries the session's adapter makes at most"""
+    max_retries = getattr(session.get_adapter(url), 'max_retries', None)
+    total = getattr(max_retries, 'total', None)
+    return total if isinstance(total, int) else 0
+
+
+def read_csv(path, key):
+    """Desired state from a CSV file with a header row
+
+    Args:
+        path (str): CSV file
+        key (str): column identifying each object; the other columns are the desired fields
+
+    Returns:
+        dict: key -> {field: value}, leaving out empty cells (fields left as they are)
+    """
+    desired = dict()
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            desired[row[key]] = {field: value for field, value in row.items()
+                                 if field != key and field is not None and value not in (None, "")}
+    return desired
+
+
+def read_yaml(path, key=None):
+    """Desired state from a YAML file: either a mapping key -> fields, or a list of mappings with a key field
+
+    Requires PyYAML (pip3 install blackduck[yaml]).
+    """
+    if yaml is None:
+        raise ImportError("Reading YAML requires PyYAML. Install it with: pip3 install blackduck[yaml]")
+    with open(path) as f:
+        document = yaml.safe_load(f) or {}
+    if isinstance(document, dict):
+        return document
+    if key is None:
+        raise ValueError("key is required when the YAML document is a list")
+    return {item[key]: {field: value for field, value in item.items() if field != key} for item in document}
+
+
+def _coerce(value, current):
+    """Convert a value read from text to the type of the current value, e.g. "true" for a boolean"""
+    if not isinstance(value, str) or current is None or isinstance(current, str):
+        return value
+    try:
+        if isinstance(current, bool):
+            return {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}[value.lower()]
+        if isinstance(current, int):
+            return int(value)
+        if isinstance(current, float):
+            return float(value)
+    except (KeyError, ValueError):
+        pass
+    return value  # left to the server to reject
+
+
+def _diff(current, desired, prefix=""):
+    """Merge desired into a copy of current, returning (merged, {dotted field: (old, new)})"""
+    merged = copy.deepcopy(current)
+    differences = dict()
+    for field, value in desired.items():
+        old = current.get(field)
+        if isinstance(value, dict) and isinstance(old, dict):
+            merged[field], nested = _diff(old, value, f"{prefix}{field}.")
+            differences.update(nested)
+            continue
+        value = _coerce(value, old)
+        if value != old:
+            merged[field] = value
+            differences[prefix + field] = (old, value)
+    return merged, differences
+
+
+class Change:
+    """An object whose current state differs from the desired one"""
+
+    __slots__ = ('key', 'url', 'body', 'differences')
+
+    def __init__(self, key, url, body, differences):
+        self.key = key
+        self.url = url
+        self.body = body  # the current object with the desired fields applied: what is PUT
+        self.differences = differences
+
+    def __repr__(self):
+        return f"Change({self.key}, {sorted(self.differences)})"
+
+
+class Plan:
+    """Outcome of plan(): what apply() would change"""
+
+    def __init__(self):
+        self.changes = []
+        self.unchanged = []  # keys already in the desired state
+        self.missing = []  # keys for which no object was found
+        self.errors = dict()  # key -> error fetching the current object
+
+    def __len__(self):
+        return len(self.changes)
+
+    def describe(self):
+        """Human readable lines, one per difference, for a dry run"""
+        lines = []
+        for change in self.changes:
+            for field, (old, new) in sorted(change.differences.items()):
+                lines.append(f"{change.key}: {field}: {old!r} -> {new!r}")
+        lines.extend(f"{key}: not found" for key in self.missing)
+        lines.extend(f"{key}: {error}" for key, error in self.errors.items())
+        lines.append(f"{len(self.changes)} to change, {len(self.unchanged)} unchanged, "
+                     f"{len(self.missing)} not found, {len(self.errors)} errors")
+        return lines
+
+    def apply(self, mutator):
+        """PUT the changed objects with a BulkMutator
+
+        Returns:
+            BulkReport: one result per change
+        """
+        for change in self.changes:
+            mutator.put(change.url, change.body, key=change.key)
+        return mutator.execute()
+
+
+def plan(desired, resolve, max_workers=8):
+    """Diff the desired state against the current objects, fetched concurrently
+
+    Args:
+        desired (dict): key -> desired fields (nested dicts are compared field by field), or a
+            callable(current object) returning them, for fields derived from the current state.
+            Text values are converted to the type of the current value ("true", "42").
+        resolve (callable): resolve(key) returns the current object (a dict with _meta.href) or None
+        max_workers (int): objects fetched concurrently. Defaults to 8.
+
+    Returns:
+        Plan: with a Change for each object that differs, in the order of desired
+    """
+    def fetch(key):
+        try:
+            return resolve(key), None
+        except requests.RequestException as err:
+            return None, str(err)
+
+    result = Plan()
+    keys = list(desired)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        currents = list(executor.map(fetch, keys))
+    for key, (current, error) in zip(keys, currents):
+        if error is not None:
+            result.errors[key] = error
+        elif current is None:
+            result.missing.append(key)
+        else:
+            fields = desired[key](current) if callable(desired[key]) else desired[key]
+            body, differences = _diff(current, fields)
+            if differences:
+                result.changes.append(Change(key, current['_meta']['href'], body, differences))
+            else:
+                result.unchanged.append(key)
+    logger.info(f"planned {len(result.changes)} changes, {len(result.unchanged)} unchanged, "
+                f"{len(result.missing)} not found, {len(result.errors)} errors")
+    return result
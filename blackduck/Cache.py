@@ -0,0 +1,214 @@
+"""
+HTTP response caches for HubSession
+
+GET responses are stored keyed by url (including query parameters) and Accept header.
+Entries younger than the cache ttl are served without contacting the server. Older
+entries are revalidated with If-None-Match / If-Modified-Since and a 304 Not Modified
+response refreshes them instead of transferring the body again. A PUT, PATCH or DELETE
+through the session drops the entries of its url, of the urls below it and of its parent
+collection; a POST drops those of the collection it posts to and of its owner.
+
+Two backends are provided: MemoryCache (per process) and SqliteCache (on disk, survives
+restarts and can be shared by consecutive script runs). Both evict the least recently
+used entries once max_entries is reached.
+
+Usage:
+
+    from blackduck import Client
+    from blackduck.Cache import SqliteCache
+
+    bd = Client(token=..., base_url=..., cache=SqliteCache(".blackduck-cache.sqlite", ttl=600))
+"""
+
+from collections import OrderedDict
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    """A cached GET response"""
+    __slots__ = ('url', 'stored_at', 'status_code', 'headers', 'content', 'encoding')
+
+    def __init__(self, url, stored_at, status_code, headers, content, encoding):
+        self.url = url
+        self.stored_at = stored_at
+        self.status_code = status_code
+        self.headers = dict(headers)
+        self.content = content
+        self.encoding = encoding
+
+    @classmethod
+    def from_response(cls, response):
+        return cls(response.url, time.time(), response.status_code, response.headers,
+                   response.content, response.encoding)
+
+    def is_fresh(self, ttl):
+        return time.time() - self.stored_at < ttl
+
+    def validators(self):
+        """Conditional request headers to revalidate this entry with the server"""
+        headers = CaseInsensitiveDict(self.headers)
+        validators = {}
+        if 'ETag' in headers:
+            validators['If-None-Match'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            validators['If-Modified-Since'] = headers['Last-Modified']
+        return validators
+
+    def to_response(self, request=None):
+        """Rebuild a requests.Response from this entry
+
+        Args:
+            request (requests.PreparedRequest): that is being answered from the cache
+        """
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.content
+        response.encoding = self.encoding
+        response.request = request
+        response.from_cache = True
+        return response
+
+
+def cache_key(url, accept):
+    """Key a GET request by its full url (with query string) and Accept header"""
+    return f"{accept or ''} {url}"
+
+
+def is_cacheable(response):
+    cache_control = response.headers.get('Cache-Control', '').lower()
+    return response.status_code == 200 and 'no-store' not in cache_control
+
+
+def _is_under(entry_url, url, below):
+    return entry_url == url or (below and entry_url.startswith(url.rstrip('/') + '/'))
+
+
+class MemoryCache:
+    """In-process LRU response cache"""
+
+    def __init__(self, ttl=300, max_entries=1024):
+        """
+        Args:
+            ttl (float): seconds a response is served without revalidation. Defaults to 300.
+            max_entries (int): number of responses kept before evicting the least recently used
+        """
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, url, below=False):
+        """Drop every entry fetched from url, whatever its query string or Accept header
+
+        Args:
+            url (str): url whose entries to drop
+            below (bool): also drop the entries of the urls below it, e.g. the versions of a project.
+                Defaults to False.
+        """
+        base_url = url.split('?')[0]
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if _is_under(e.url.split('?')[0], base_url, below)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteCache:
+    """On-disk LRU response cache backed by sqlite3"""
+
+    def __init__(self, path, ttl=300, max_entries=10000):
+        """
+        Args:
+            path (str): sqlite database file, created if missing
+            ttl (float): seconds a response is served without revalidation. Defaults to 300.
+            max_entries (int): number of responses kept before evicting the least recently used
+        """
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, base_url TEXT, url TEXT, stored_at REAL, last_used REAL, "
+                "status_code INTEGER, headers TEXT, content BLOB, encoding TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_base_url ON responses (base_url)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, stored_at, status_code, headers, content, encoding FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._db:
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        url, stored_at, status_code, headers, content, encoding = row
+        return CacheEntry(url, stored_at, status_code, json.loads(headers), content, encoding)
+
+    def set(self, key, entry):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, entry.url.split('?')[0], entry.url, entry.stored_at, time.time(), entry.status_code,
+                 json.dumps(entry.headers), entry.content, entry.encoding)
+            )
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def delete(self, key):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def invalidate(self, url, below=False):
+        """Drop every entry fetched from url (and from the urls below it if below), see MemoryCache.invalidate"""
+        base_url = url.split('?')[0]
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses WHERE base_url = ?", (base_url,))
+            if below:
+                prefix = base_url.rstrip('/') + '/'
+                self._db.execute("DELETE FROM responses WHERE substr(base_url, 1, ?) = ?", (len(prefix), prefix))
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses")
+
+    def close(self):
+        self._db.close()
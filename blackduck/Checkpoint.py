@@ -0,0 +1,100 @@
+"""
+Checkpoint stores for resumable Client.get_items crawls
+
+A checkpoint store remembers, per collection url (including its query parameters), the
+offset of the first page that has not been completely consumed yet. When get_items is
+given a store it starts from that offset, advances it each time the caller has finished
+with a page, and forgets it once the collection has been walked to the end. An interrupted
+crawl that is started again therefore resumes where it stopped instead of from zero.
+
+Usage:
+
+    from blackduck.Checkpoint import SqliteCheckpointStore
+
+    checkpoint = SqliteCheckpointStore("crawl.sqlite")
+    for project in bd.get_resource('projects', checkpoint=checkpoint):
+        for version in bd.get_resource('versions', project, checkpoint=checkpoint):
+            ...
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+
+def checkpoint_key(url, params):
+    """Identify a collection by its url and query parameters, excluding offset and limit"""
+    params = sorted((k, v) for k, v in (params or {}).items() if k not in ('offset', 'limit'))
+    return f"{url}?{urlencode(params, doseq=True)}" if params else url
+
+
+class FileCheckpointStore:
+    """Checkpoints kept in a JSON file, rewritten atomically on every update"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): JSON file, created if missing
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._offsets = json.load(f)
+        except FileNotFoundError:
+            self._offsets = {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._offsets, f, indent=3)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        with self._lock:
+            return self._offsets.get(key)
+
+    def set(self, key, offset):
+        with self._lock:
+            self._offsets[key] = offset
+            self._save()
+
+    def delete(self, key):
+        with self._lock:
+            if self._offsets.pop(key, None) is not None:
+                self._save()
+
+
+class SqliteCheckpointStore:
+    """Checkpoints kept in a sqlite3 database"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): sqlite database file, created if missing
+        """
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS checkpoints (key TEXT PRIMARY KEY, offset INTEGER)")
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT offset FROM checkpoints WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, offset):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?)", (key, offset))
+
+    def delete(self, key):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+
+    def close(self):
+        self._db.close()
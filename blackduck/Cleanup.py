@@ -0,0 +1,242 @@
+"""
+Server-wide cleanup of old and empty project versions
+
+Purge scripts walk every project and version serially, list all codelocations of each
+version to find out whether it is empty, and delete one thing at a time. A Cleanup crawls
+projects and versions in parallel (Client.walk), applies a RetentionPolicy locally, checks
+emptiness only for the versions the policy would otherwise keep, with limit=1 metadata
+requests (totalCount only), and deletes concurrently through a BulkMutator.
+
+A RetentionPolicy deletes a version when, in order:
+
+    * it is not one of the keep_latest most recent versions of its project
+    * its phase is not excluded (RELEASED and ARCHIVED by default)
+    * it is older than the maximum age for its phase, or it has neither codelocations
+      nor components (delete_empty)
+
+A project all of whose versions would be deleted, or that has no versions at all, is
+deleted as a whole (delete_projects),
+and the codelocations mapped to versions deleted for their age are deleted first
+(delete_codelocations). plan() only reads; execute() raises SafetyCapExceeded, before
+deleting anything, when the plan deletes more versions than max_deletions (the versions
+of a project deleted as a whole count one by one) or more codelocations than
+max_codelocations. Deleted codelocations take their scan data with them.
+
+Usage:
+
+    from blackduck.Cleanup import Cleanup, RetentionPolicy
+
+    policy = RetentionPolicy(max_age=14, phase_max_age={'PRERELEASE': 30}, keep_latest=1)
+    cleanup = Cleanup(bd, policy, max_workers=16, max_deletions=500)
+    plan = cleanup.plan()
+    print("\\n".join(plan.describe()))
+    report = cleanup.execute(plan)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+
+from .Bulk import BulkMutator, BulkReport
+from .Exceptions import SafetyCapExceeded
+from .Utils import iso8601_to_date
+
+logger = logging.getLogger(__name__)
+
+EMPTY = "empty"
+
+
+class RetentionPolicy:
+    """Which project versions to keep"""
+
+    def __init__(self, max_age=None, phase_max_age=None, excluded_phases=('RELEASED', 'ARCHIVED'), keep_latest=0,
+                 delete_empty=True, delete_projects=True, delete_codelocations=True):
+        """
+        Args:
+            max_age (int): days after which a version is deleted. Defaults to None (never for its age).
+            phase_max_age (dict): phase -> days, overriding max_age for versions in that phase. Defaults to None.
+            excluded_phases (iterable(str)): phases whose versions are never deleted.
+                Defaults to ('RELEASED', 'ARCHIVED').
+            keep_latest (int): most recently created versions of each project never deleted. Defaults to 0.
+            delete_empty (bool): delete versions without codelocations and components. Defaults to True.
+            delete_projects (bool): delete a project all of whose versions would be deleted (otherwise its
+                newest version is spared), and projects without versions. Defaults to True.
+            delete_codelocations (bool): delete the codelocations mapped to versions deleted for their age.
+                Defaults to True.
+        """
+        self.max_age = max_age
+        self.phase_max_age = phase_max_age or dict()
+        self.excluded_phases = set(excluded_phases)
+        self.keep_latest = keep_latest
+        self.delete_empty = delete_empty
+        self.delete_projects = delete_projects
+        self.delete_codelocations = delete_codelocations
+
+    def max_age_for(self, phase):
+        return self.phase_max_age.get(phase, self.max_age)
+
+    def candidates(self, versions, now):
+        """Split the versions of one project by what the policy decides without asking the server
+
+        Returns:
+            tuple: ([(version, reason)] to delete for their age, [version] to delete if empty)
+        """
+        newest_first = sorted(versions, key=lambda v: v['createdAt'], reverse=True)
+        aged, maybe_empty = [], []
+        for version in newest_first[self.keep_latest:]:
+            if version.get('phase') in self.excluded_phases:
+                continue
+            max_age = self.max_age_for(version.get('phase'))
+            age = (now - iso8601_to_date(version['createdAt'])).days
+            if max_age is not None and age > max_age:
+                aged.append((version, f"{age} days old (limit {max_age})"))
+            elif self.delete_empty:
+                maybe_empty.append(version)
+        return aged, maybe_empty
+
+
+class CleanupPlan:
+    """What Cleanup.execute() would delete"""
+
+    def __init__(self):
+        self.projects = []  # (project, [(version, reason)]): every version goes, so the project does
+        self.versions = []  # (project, version, reason)
+        self.project_count = 0
+        self.version_count = 0
+
+    def __len__(self):
+        """Number of versions deleted, on their own or with their project"""
+        return len(self.versions) + sum(len(versions) for _, versions in self.projects)
+
+    def describe(self):
+        """Human readable lines, one per deletion, for a dry run"""
+        lines = []
+        for project, versions in self.projects:
+            reasons = ", ".join(f"{v['versionName']}: {reason}" for v, reason in versions) or "no versions"
+            lines.append(f"delete project {project['name']} ({reasons})")
+        for project, version, reason in self.versions:
+            lines.append(f"delete version {project['name']} {version['versionName']}: {reason}")
+        lines.append(f"{len(self.projects)} of {self.project_count} projects and {len(self)} of "
+                     f"{self.version_count} versions to delete")
+        return lines
+
+
+class Cleanup:
+    """Evaluate a RetentionPolicy over every project version and delete what it does not keep"""
+
+    def __init__(self, bd, policy, max_workers=8, max_deletions=100, max_codelocations=500, rate=None):
+        """
+        Args:
+            bd (blackduck.Client): client to crawl and delete with
+            policy (RetentionPolicy): what to keep
+            max_workers (int): concurrent requests while crawling and deleting. Defaults to 8.
+            max_deletions (int): execute() refuses plans deleting more versions than this, counting
+                the versions of projects deleted as a whole. Defaults to 100; None for no cap.
+            max_codelocations (int): execute() refuses plans deleting more codelocations (and their
+                scan data) than this. Defaults to 500; None for no cap.
+            rate (float): maximum delete requests per second. Defaults to None (no limit).
+        """
+        self.bd = bd
+        self.policy = policy
+        self.max_workers = max_workers
+        self.max_deletions = max_deletions
+        self.max_codelocations = max_codelocations
+        self.rate = rate
+
+    def is_empty(self, version):
+        """True if the version has no codelocations and no components, asking only for their counts"""
+        for name in ('codelocations', 'components'):
+            if self.bd.get_metadata(name, version)['totalCount'] != 0:
+                return False
+        return True
+
+    def plan(self, now=None):
+        """Crawl the server and decide what to delete, without deleting anything
+
+        Args:
+            now (datetime): reference time for ages, naive UTC. Defaults to None (now).
+
+        Returns:
+            CleanupPlan
+        """
+        now = now or datetime.utcnow()
+        projects = dict()  # href -> (project, [version])
+
+        def listed(project):
+            # every project as it is listed, including those without versions the walk yields nothing for
+            projects[project['_meta']['href']] = (project, [])
+            return True
+
+        for project, version in self.bd.walk("projects/versions", filters={'projects': listed},
+                                             max_workers=self.max_workers):
+            projects[project['_meta']['href']][1].append(version)
+
+        doomed = dict()  # project href -> [(version, reason)]
+        maybe_empty = []
+        for href, (project, versions) in projects.items():
+            aged, candidates = self.policy.candidates(versions, now)
+            doomed[href] = aged
+            maybe_empty.extend((href, version) for version in candidates)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            empty = list(executor.map(lambda candidate: self.is_empty(candidate[1]), maybe_empty))
+        for (href, version), is_empty in zip(maybe_empty, empty):
+            if is_empty:
+                doomed[href].append((version, EMPTY))
+
+        plan = CleanupPlan()
+        plan.project_count = len(projects)
+        for href, (project, versions) in projects.items():
+            plan.version_count += len(versions)
+            deletions = doomed[href]
+            if not versions:
+                if self.policy.delete_projects:
+                    plan.projects.append((project, []))
+                continue
+            if deletions and len(deletions) == len(versions):
+                if self.policy.delete_projects:
+                    plan.projects.append((project, deletions))
+                    continue
+                newest = max(versions, key=lambda v: v['createdAt'])
+                deletions = [(v, reason) for v, reason in deletions if v is not newest]
+            plan.versions.extend((project, version, reason) for version, reason in deletions)
+        logger.info(f"cleanup plan: {len(plan.projects)} projects and {len(plan.versions)} versions to delete")
+        return plan
+
+    def execute(self, plan):
+        """Delete what plan lists: first the codelocations of aged versions, then versions and projects
+
+        Returns:
+            BulkReport: one result per deletion
+
+        Raises:
+            SafetyCapExceeded: plan deletes more versions than max_deletions, or more codelocations
+                than max_codelocations; nothing is deleted then
+        """
+        if self.max_deletions is not None and len(plan) > self.max_deletions:
+            raise SafetyCapExceeded(f"plan deletes {len(plan)} versions, more than the cap of {self.max_deletions}")
+        mutator = BulkMutator(self.bd.session, max_workers=self.max_workers, rate=self.rate)
+        results, seconds = [], 0.0
+
+        if self.policy.delete_codelocations:
+            aged = [version for _, version, reason in plan.versions if reason != EMPTY]
+            aged.extend(version for _, versions in plan.projects for version, reason in versions if reason != EMPTY)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for codelocations in executor.map(lambda v: list(self.bd.get_resource('codelocations', v)), aged):
+                    for codelocation in codelocations:
+                        mutator.delete(codelocation['_meta']['href'], key=codelocation['name'])
+            if self.max_codelocations is not None and len(mutator) > self.max_codelocations:
+                raise SafetyCapExceeded(f"plan deletes {len(mutator)} codelocations, "
+                                        f"more than the cap of {self.max_codelocations}")
+            report = mutator.execute()
+            results.extend(report.results)
+            seconds += report.seconds
+
+        for project, version, reason in plan.versions:
+            mutator.delete(version['_meta']['href'], key=f"{project['name']} {version['versionName']}")
+        for project, _ in plan.projects:
+            mutator.delete(project['_meta']['href'], key=project['name'])
+        report = mutator.execute()
+        results.extend(report.results)
+        report = BulkReport(results, seconds + report.seconds)
+        logger.info(f"cleanup deleted {len(report.succeeded)} objects, {len(report.failed)} failed")
+        return report
@@ -7,10 +7,17 @@ Upon initialization Bearer token is obtained and used for all subsequent calls.
 Token will auto-renew on timeout.
 """
 
-from .Utils import safe_get
+from .Utils import LinkIndex, project_item
 from .Authentication import BearerAuth
+from .Cache import CacheEntry, cache_key, is_cacheable
+from .Checkpoint import checkpoint_key
+from .Models import Resource
+from .Pagination import KeysetCursor
+from .RateLimit import was_throttled
 import json
 import logging
+import threading
+import time
 import requests
 from pprint import pformat
 import requests.packages.urllib3
@@ -18,37 +25,81 @@ from requests.packages.urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin
 
+try:
+    import ijson
+except ImportError:  # optional dependency, only needed for get_items(..., streaming=True)
+    ijson = None
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
 logger = logging.getLogger(__name__)
 
 
+def retry_adapter(retries, pool_maxsize=10, raise_on_status=True):
+    """Build the HTTPAdapter shared by HubSession and HubInstance sessions
+
+    Args:
+        retries (int): maximum number of times to retry a request
+        pool_maxsize (int): maximum number of keep-alive connections kept per host. Defaults to 10.
+        raise_on_status (bool): raise requests.exceptions.RetryError once the retries of a
+            429/5xx response are exhausted; otherwise return that last response. Defaults to True.
+
+    Returns:
+        requests.adapters.HTTPAdapter: with connection pooling and retries
+    """
+    # use sane defaults to handle unreliable networks
+    """HTTP response status codes:
+            429 = Too Many Requests
+            500 = Internal Server Error
+            502 = Bad Gateway
+            503 = Service Unavailable
+            504 = Gateway Timeout
+    """
+    retry_strategy = Retry(
+        total=int(retries),
+        backoff_factor=2,  # exponential retry 1, 2, 4, 8, 16 sec ...
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=raise_on_status,
+    )
+
+    return HTTPAdapter(max_retries=retry_strategy, pool_maxsize=int(pool_maxsize))
+
+
 class HubSession(requests.Session):
     """Hold base_url, timeout, retries, and provide sensible defaults"""
 
-    def __init__(self, base_url, timeout, retries, verify):
+    def __init__(self, base_url, timeout, retries, verify, pool_maxsize=10, cache=None, coalesce=False,
+                 rate_limiter=None, concurrency_limiter=None, retry_policy=None):
         super().__init__()
         self.base_url = base_url
         self._timeout = float(timeout)  # timeout is not a member of requests.Session
         self.verify = verify
-
-        # use sane defaults to handle unreliable networks
-        """HTTP response status codes:
-                429 = Too Many Requests
-                500 = Internal Server Error
-                502 = Bad Gateway
-                503 = Service Unavailable
-                504 = Gateway Timeout
-        """
-        retry_strategy = Retry(
-            total=int(retries),
-            backoff_factor=2,  # exponential retry 1, 2, 4, 8, 16 sec ...
-            status_forcelist=[429, 500, 502, 503, 504],
-        )
-
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        self.cache = cache  # optional response cache, see blackduck.Cache
+        self.coalesce = coalesce  # share one response between concurrent identical GETs
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self.rate_limiter = rate_limiter  # optional blackduck.RateLimit.TokenBucket
+        self.concurrency_limiter = concurrency_limiter  # optional blackduck.RateLimit.AIMDLimiter
+
+        self.retry_policy = retry_policy  # optional blackduck.RetryPolicy.RetryPolicy
+        if retry_policy is None:
+            adapter = retry_adapter(retries, pool_maxsize)
+            self._endpoint_adapters = []
+        else:
+            adapter = retry_policy.adapter(pool_maxsize)
+            self._endpoint_adapters = retry_policy.endpoint_adapters(pool_maxsize)
+            retries = retry_policy.retries
         self.mount("https://", adapter)
         self.mount("http://", adapter)
         logger.info("Using a session with a %s second timeout and up to %s retries per request", timeout, retries)
 
+    def get_adapter(self, url):
+        # per-endpoint retry overrides take precedence over the adapters mounted by url prefix
+        for pattern, adapter in self._endpoint_adapters:
+            if pattern.search(url):
+                return adapter
+        return super().get_adapter(url)
+
     def request(self, method, url, **kwargs):
         kwargs['timeout'] = self._timeout
 
@@ -63,8 +114,100 @@ class HubSession(requests.Session):
             kwargs['headers'] = lc_keys
 
         url = urljoin(self.base_url, url)
+
+        if method.lower() == 'get' and not kwargs.get('stream'):
+            if self.coalesce:
+                return self._coalesced_get(url, **kwargs)
+            if self.cache is not None:
+                return self._cached_get(url, **kwargs)
+        elif self.cache is not None and method.lower() in ('put', 'post', 'patch', 'delete'):
+            self._invalidate(method, url)
+
         return super().request(method, url, **kwargs)
 
+    def _invalidate(self, method, url):
+        """Drop the cached responses a write to url makes stale"""
+        path = url.split('?')[0].rstrip('/')
+        # a POST adds to the collection at url; a PUT/PATCH/DELETE changes the object there and what is below it
+        self.cache.invalidate(path, below=method.lower() != 'post')
+        parent = path.rsplit('/', 1)[0]
+        if not parent.endswith('/api'):
+            # the collection listing the object, or the object owning the collection
+            self.cache.invalidate(parent)
+
+    def send(self, request, **kwargs):
+        # every request that reaches the network passes through here, cache hits do not
+        if self.retry_policy is not None and self.retry_policy.budget is not None:
+            self.retry_policy.budget.record_request()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        if self.concurrency_limiter is None:
+            return super().send(request, **kwargs)
+
+        start = self.concurrency_limiter.acquire()
+        throttled = True  # timeouts and connection errors count as congestion
+        try:
+            response = super().send(request, **kwargs)
+            throttled = was_throttled(response)
+            return response
+        finally:
+            self.concurrency_limiter.release(start, throttled)
+
+    def _coalesced_get(self, url, **kwargs):
+        """Collapse concurrent identical GETs into one request whose response all callers share"""
+        url = requests.Request('GET', url, params=kwargs.pop('params', None)).prepare().url
+        key = cache_key(url, kwargs['headers'].get('accept'))
+
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            logger.debug("joining in-flight request for %s", url)
+            return future.result()
+
+        try:
+            if self.cache is not None:
+                response = self._cached_get(url, **kwargs)
+            else:
+                response = super().request('GET', url, **kwargs)
+            response.content  # read the body before it is shared across threads
+            future.set_result(response)
+            return response
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+
+    def _cached_get(self, url, **kwargs):
+        """Serve a GET from the cache while fresh, otherwise revalidate it with the server"""
+        url = requests.Request('GET', url, params=kwargs.pop('params', None)).prepare().url
+        headers = kwargs.pop('headers')
+        key = cache_key(url, headers.get('accept'))
+
+        entry = self.cache.get(key)
+        if entry is not None and entry.is_fresh(self.cache.ttl):
+            logger.debug("cache hit for %s", url)
+            return entry.to_response(requests.Request('GET', url, headers=headers).prepare())
+
+        conditional_headers = dict(headers, **entry.validators()) if entry is not None else headers
+        response = super().request('GET', url, headers=conditional_headers, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            logger.debug("cache revalidated for %s", url)
+            entry.stored_at = time.time()
+            self.cache.set(key, entry)
+            return entry.to_response(response.request)
+        if is_cacheable(response):
+            self.cache.set(key, CacheEntry.from_response(response))
+        elif entry is not None:
+            self.cache.delete(key)
+        return response
+
 
 class Client:
     """A binding to Blackduck's REST API that provides a robust connection backed by a session object.
@@ -83,7 +226,12 @@ class Client:
                  auth=None,
                  verify=True,
                  timeout=15.0,  # in seconds
-                 retries=3):
+                 retries=3,
+                 cache=None,
+                 coalesce=False,
+                 rate_limiter=None,
+                 concurrency_limiter=None,
+                 retry_policy=None):
         """Instantiate a Client for use with Hub's REST-API
 
         Args:
@@ -98,11 +246,23 @@ class Client:
             verify (bool): TLS certificate verification. Defaults to True.
             timeout (float): request timeout in seconds. Defaults to 15 seconds.
             retries (int): maximum number of times to retry a request. Defaults to 3.
+            cache (blackduck.Cache.MemoryCache or SqliteCache): opt-in cache for GET responses
+                with ETag/Last-Modified revalidation. Defaults to None (no caching).
+            coalesce (bool): collapse concurrent identical GETs (e.g. from threads sharing this Client)
+                into a single request whose response is shared. Defaults to False.
+            rate_limiter (blackduck.RateLimit.TokenBucket): cap on requests per second. Defaults to None.
+            concurrency_limiter (blackduck.RateLimit.AIMDLimiter): adaptive cap on requests in flight.
+                Defaults to None.
+            retry_policy (blackduck.RetryPolicy.RetryPolicy): jittered backoff, Retry-After, retry budget and
+                per-endpoint overrides. Replaces retries when given. Defaults to None (fixed backoff).
         """
         self.base_url = base_url
-        self.session = session or HubSession(base_url, timeout, retries, verify)
+        self.session = session or HubSession(base_url, timeout, retries, verify, cache=cache, coalesce=coalesce,
+                                             rate_limiter=rate_limiter, concurrency_limiter=concurrency_limiter,
+                                             retry_policy=retry_policy)
         self.session.auth = auth or BearerAuth(self.session, token)
         self.root_resources_dict = None
+        self.link_index = LinkIndex()
 
     def list_resources(self, parent=None):
         """List named resources that can be fetched.
@@ -115,8 +275,10 @@ class Client:
             dict(str -> str): of public resource names to urls
                               To obtain the url to the parent itself, use key 'href'.
         """
+        if isinstance(parent, Resource):
+            return parent.resources
         if parent is not None and not isinstance(parent, dict):
-            raise TypeError("parent parameter must be a dict if not None")
+            raise TypeError("parent parameter must be a dict or a blackduck.Models.Resource if not None")
 
         if not parent:
             # the root resources are in a different format (name -> href)
@@ -130,22 +292,7 @@ class Client:
                 self.root_resources_dict = resources_dict
             return self.root_resources_dict
         else:
-            key = '_hub_rest_api_python_resources_dict'
-            if key not in parent:
-                obj = safe_get(parent, '_meta', 'links')
-                try:
-                    rel_href_pairs = iter(obj)
-                except TypeError:
-                    logger.error("unable to list resources on parent object (missing ['_meta']['links']):")
-                    logger.error(pformat(parent))
-                    raise
-                resources_dict = {}
-                for res in rel_href_pairs:
-                    resources_dict[res['rel']] = res['href']
-                # save url to parent itself if available, otherwise save 'href': None
-                resources_dict['href'] = safe_get(parent, '_meta', 'href')
-                parent[key] = resources_dict  # cache for future use
-            return parent[key]
+            return self.link_index.links(parent)
 
     def get_resource(self, name, parent=None, items=True, **kwargs):
         """Fetch a named resource.
@@ -155,15 +302,15 @@ class Client:
             parent (dict/json): resource object from prior get_resource() call.
                                 Use None for root /api/ base.
             items (bool): enable resource generator for paginated results. Defaults to True.
-            kwargs: passed to session.request
+            kwargs: passed to get_items (e.g. page_size, max_workers, checkpoint) or session.request
 
         Returns:
             list (items=True) or dict formed from returned json
         """
         if not isinstance(name, str) or not name:
             raise TypeError("name parameter must be a non-empty str")
-        if parent is not None and not isinstance(parent, dict):
-            raise TypeError("parent parameter must be a dict if not None")
+        if parent is not None and not isinstance(parent, (dict, Resource)):
+            raise TypeError("parent parameter must be a dict or a blackduck.Models.Resource if not None")
 
         resources_dict = self.list_resources(parent)
         if name not in resources_dict:
@@ -178,6 +325,55 @@ class Client:
         else:
             return self.get_json(url, **kwargs)
 
+    def walk(self, path, filters=None, params=None, max_workers=8, **kwargs):
+        """Fetch a hierarchy of named resources in parallel, e.g. 'projects/versions/components'
+
+        Each item of one level is the parent of the next level. Child collections are fetched
+        on a bounded thread pool as soon as their parent arrives, replacing nested serial
+        get_resource() loops.
+
+        Args:
+            path (str): '/' separated resource names, starting from the root /api/ resources
+            filters (dict(str -> callable)): resource name -> predicate; items for which it returns
+                                             False are dropped together with their whole subtree
+            params (dict(str -> dict)): resource name -> query parameters (e.g. 'q' or 'filter') for that level
+            max_workers (int): maximum number of collections fetched at the same time. Defaults to 8.
+            kwargs: passed to get_items (e.g. page_size) for every level
+
+        Yields:
+            generator(tuple): one (item of level 1, item of level 2, ...) per leaf item, in completion order
+        """
+        names = [name for name in path.split('/') if name]
+        if not names:
+            raise ValueError("path must name at least one resource")
+        filters = filters or dict()
+        params = params or dict()
+
+        def fetch(level, parent):
+            name = names[level]
+            keep = filters.get(name)
+            items = self.get_resource(name, parent, params=dict(params.get(name, dict())), **kwargs)
+            return [item for item in items if keep is None or keep(item)]
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = {executor.submit(fetch, 0, None): tuple()}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ancestors = pending.pop(future)
+                    for item in future.result():
+                        chain = ancestors + (item,)
+                        if len(chain) == len(names):
+                            yield chain
+                        else:
+                            pending[executor.submit(fetch, len(chain), item)] = chain
+        finally:
+            # generator may be closed early by the consumer: drop collections not yet started
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
     def get_metadata(self, name, parent=None, **kwargs):
         """Fetch named resource metadata and other useful data such as totalCount.
 
@@ -228,34 +424,207 @@ class Client:
             self.http_error_handler(r)
             raise
 
-    def get_items(self, url, page_size=250, **kwargs):
+    def get_items(self, url, page_size=250, max_workers=None, checkpoint=None, streaming=False,
+                  fields=None, projection=None, **kwargs):
         """Fetch 'pages' of items
 
         Args:
             url (str): of endpoint
             page_size (int): Number of items to get per page. Defaults to 250.
+            max_workers (int): Number of pages to fetch concurrently. Defaults to None (one page at a time).
+                               When set, totalCount is read from the first page and the remaining
+                               pages are prefetched in parallel. Items are still yielded in order.
+            checkpoint (blackduck.Checkpoint.FileCheckpointStore or SqliteCheckpointStore): store the offset
+                               of the pages consumed so far so an interrupted crawl resumes where it stopped.
+                               The checkpoint is cleared once all items have been fetched. Defaults to None.
+            streaming (bool): parse each page incrementally and yield items as soon as they are decoded,
+                              so memory is bounded by one item rather than one page. The connection stays
+                              open while the page is consumed. Requires ijson. Defaults to False.
+            fields (list(str)): keep only these keys of each item plus a compact ['_meta'] (href and a
+                                rel -> href dict) which list_resources() and get_resource() still understand.
+                                Defaults to None (whole items).
+            projection (callable): applied to each item (after fields) before it is yielded. Defaults to None.
             kwargs: passed to session.request
 
         Yields:
             generator(dict/json): of items
         """
-        offset = 0
+        if fields is not None or projection is not None:
+            items = self.get_items(url, page_size, max_workers, checkpoint, streaming, **kwargs)
+            if fields is not None:
+                items = (project_item(item, fields) for item in items)
+            if projection is not None:
+                items = map(projection, items)
+            yield from items
+            return
+
+        if streaming and max_workers and max_workers > 1:
+            raise ValueError("streaming pages cannot be combined with concurrent prefetching (max_workers)")
         params = kwargs.pop('params', dict())
 
-        while True:
+        if checkpoint is not None:
+            key = checkpoint_key(url, params)
+            offset = checkpoint.get(key) or 0
+            if offset:
+                logger.info(f"resuming {key} from checkpoint at offset {offset}")
+
+            def page_done(offset):
+                checkpoint.set(key, offset + page_size)
+        else:
+            offset = 0
+
+            def page_done(offset):
+                pass
+
+        if max_workers and max_workers > 1:
+            offset = yield from self._get_items_concurrently(url, offset, page_size, max_workers, params, kwargs,
+                                                             page_done)
+        while offset is not None:
             params.update({'offset': f"{offset}", 'limit': f"{page_size}"})
             kwargs['params'] = params
-            items = self.get_json(url, **kwargs).get('items', list())
+            if streaming:
+                items = self._stream_items(url, **kwargs)
+            else:
+                items = self.get_json(url, **kwargs).get('items', list())
 
+            count = 0
             for item in items:
+                count += 1
                 yield item
 
-            if len(items) < page_size:
+            if count < page_size:
                 # This will be true if there are no more 'pages' to view
                 break
 
+            page_done(offset)
             offset += page_size
 
+        if checkpoint is not None:
+            checkpoint.delete(key)
+
+    def _stream_items(self, url, **kwargs):
+        """Yield the 'items' of a json page while it is being downloaded
+
+        Raises:
+            requests.exceptions.HTTPError: from response.raise_for_status()
+            ijson.JSONError: if the response is not json
+        """
+        if ijson is None:
+            raise ImportError("streaming requires ijson. Install it with: pip3 install blackduck[streaming]")
+
+        r = self.session.get(url, stream=True, **kwargs)
+        try:
+            if r.status_code != 200:
+                # print out a more descriptive error message before raising an exception
+                self.http_error_handler(r)
+
+            r.raise_for_status()
+
+            if 'Content-Type' in r.headers:
+                content_type = r.headers['Content-Type']
+                if 'internal' in content_type:
+                    logger.warning("Response contains internal proprietary Content-Type: " + content_type)
+
+            r.raw.decode_content = True  # let urllib3 undo any gzip transfer encoding
+            yield from ijson.items(r.raw, 'items.item', use_float=True)
+        finally:
+            r.close()
+
+    def _get_page(self, url, offset, page_size, params, kwargs):
+        page_kwargs = dict(kwargs)
+        page_kwargs['params'] = dict(params, offset=f"{offset}", limit=f"{page_size}")
+        return self.get_json(url, **page_kwargs)
+
+    def _get_items_concurrently(self, url, start, page_size, max_workers, params, kwargs, page_done):
+        """Yield items from all pages, prefetching up to 2 * max_workers pages ahead of the consumer.
+
+        Returns:
+            int: offset to continue from serially if the collection grew during the walk, otherwise None
+        """
+        first_page = self._get_page(url, start, page_size, params, kwargs)
+        items = first_page.get('items', list())
+        yield from items
+        if len(items) < page_size:
+            return None
+        page_done(start)
+
+        total_count = first_page.get('totalCount', 0)
+        offsets = iter(range(start + page_size, total_count, page_size))
+        next_offset = start + page_size
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        def submit_next():
+            offset = next(offsets, None)
+            if offset is not None:
+                pending.append((offset, executor.submit(self._get_page, url, offset, page_size, params, kwargs)))
+
+        try:
+            for _ in range(2 * max_workers):
+                submit_next()
+            while pending:
+                offset, future = pending.popleft()
+                items = future.result().get('items', list())
+                submit_next()
+                yield from items
+                if len(items) < page_size:
+                    return None
+                page_done(offset)
+                next_offset = offset + page_size
+        finally:
+            # generator may be closed early by the consumer: drop pages not yet started
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        # every page was full so the collection may have grown since totalCount was read
+        return next_offset
+
+    def get_items_by_key(self, url, cursor=None, key_params=None, page_size=250, **kwargs):
+        """Fetch items with keyset pagination instead of offsets
+
+        The collection is sorted ascending by cursor.key and each page asks for the items
+        at or after the last key value seen, so the walk stays fast for very deep collections
+        and tolerates items being added while it runs. Items already yielded are skipped.
+
+        Args:
+            url (str): of endpoint, which must support sorting by cursor.key
+            cursor (blackduck.Pagination.KeysetCursor): position to resume from; it is updated as items
+                are yielded so cursor.token can be saved at any time. Defaults to a new cursor on 'createdAt'.
+            key_params (callable): given the last key value, return the params restricting the
+                collection to items with a key at or after it. Defaults to the startDate
+                parameter supported by e.g. /api/notifications.
+            page_size (int): Number of items to get per page. Defaults to 250.
+            kwargs: passed to session.request
+
+        Yields:
+            generator(dict/json): of items
+        """
+        cursor = cursor or KeysetCursor()
+        key_params = key_params or (lambda value: {'startDate': value})
+        params = kwargs.pop('params', dict())
+        offset = 0
+
+        while True:
+            page_params = dict(params, sort=f"{cursor.key} ASC", offset=f"{offset}", limit=f"{page_size}")
+            if cursor.value is not None:
+                page_params.update(key_params(cursor.value))
+            start_value = cursor.value
+            items = self.get_json(url, params=page_params, **kwargs).get('items', list())
+
+            for item in items:
+                if cursor.advance(item):
+                    yield item
+
+            if len(items) < page_size:
+                break
+
+            if cursor.value == start_value:
+                # a whole page shares one key value; step over it with an offset within that value
+                offset += page_size
+            else:
+                offset = 0
+
     @staticmethod
     def http_error_handler(r):
         """Handle an unexpected HTTPError or Response by logging useful information.
@@ -4,7 +4,9 @@ import json
 from operator import itemgetter
 import urllib.parse
 
+from .Client import retry_adapter
 from .Exceptions import UnknownVersion, CreateFailedAlreadyExists, CreateFailedUnknown
+from .Utils import link_index
 
 logger = logging.getLogger(__name__)
 
@@ -20,17 +22,25 @@ def write_config(self):
     with open(self.configfile,'w') as f:
         json.dump(self.config, f, indent=3)
         
+def _create_session(self, pool_size=10, retries=3):
+    # One pooled, keep-alive session per HubInstance, using the same retry adapter as the Client's HubSession.
+    # Callers check status_code, so the last 429/5xx response is returned rather than raised once retried.
+    session = requests.Session()
+    session.verify = not self.config['insecure']
+    adapter = retry_adapter(retries, pool_size, raise_on_status=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 def get_auth_token(self):
     api_token = self.config.get('api_token', False)
     if api_token:
         authendpoint = "/api/tokens/authenticate"
         url = self.config['baseurl'] + authendpoint
-        session = requests.session()
-        response = session.post(
+        response = self.session.post(
             url, 
             data={}, 
-            headers={'Authorization': 'token {}'.format(api_token)}, 
-            verify=not self.config['insecure']
+            headers={'Authorization': 'token {}'.format(api_token)}
         )
         csrf_token = response.headers['X-CSRF-TOKEN']
         try:
@@ -42,11 +52,10 @@ def get_auth_token(self):
     else:
         authendpoint="/j_spring_security_check"
         url = self.config['baseurl'] + authendpoint
-        session=requests.session()
         credentials = dict()
         credentials['j_username'] = self.config['username']
         credentials['j_password'] = self.config['password']
-        response = session.post(url, credentials, verify= not self.config['insecure'])
+        response = self.session.post(url, credentials)
         cookie = response.headers['Set-Cookie']
         token = cookie[cookie.index('=')+1:cookie.index(';')]
     return (token, None, cookie)
@@ -54,9 +63,8 @@ def get_auth_token(self):
 def _get_hub_rest_api_version_info(self):
     '''Get the version info from the server, if available
     '''
-    session = requests.session()
     url = self.config['baseurl'] + "/api/current-version"
-    response = session.get(url, verify = not self.config['insecure'])
+    response = self.session.get(url)
 
     if response.status_code == 200:
         version_info = response.json()
@@ -98,18 +106,12 @@ def _get_parameter_string(self, parameters={}):
 
 def get_tags_url(self, component_or_project):
     # Utility method to return the tags URL from either a component or project object
-    url = None
-    for link_d in component_or_project['_meta']['links']:
-        if link_d['rel'] == 'tags':
-            return link_d['href']
-    return url
+    return link_index.get(component_or_project, 'tags')
 
 def get_link(self, bd_rest_obj, link_name):
     # returns the URL for the link_name OR None
     if bd_rest_obj and '_meta' in bd_rest_obj and 'links' in bd_rest_obj['_meta']:
-        for link_obj in bd_rest_obj['_meta']['links']:
-            if 'rel' in link_obj and link_obj['rel'] == link_name:
-                return link_obj.get('href', None)
+        return link_index.get(bd_rest_obj, link_name)
     else:
         logger.warning("This does not appear to be a BD REST object. It should have ['_meta']['links']")
 
@@ -121,7 +123,7 @@ def get_apibase(self):
 
 def execute_delete(self, url):
     headers = self.get_headers()
-    response = requests.delete(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.delete(url, headers=headers)
     return response
 
 def _validated_json_data(self, data_to_validate):
@@ -135,7 +137,7 @@ def _validated_json_data(self, data_to_validate):
 def execute_get(self, url, custom_headers={}):
     headers = self.get_headers()
     headers.update(custom_headers)
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     return response
     
 def execute_put(self, url, data, custom_headers={}):
@@ -143,7 +145,7 @@ def execute_put(self, url, data, custom_headers={}):
     headers = self.get_headers()
     headers["Content-Type"] = "application/json"
     headers.update(custom_headers)
-    response = requests.put(url, headers=headers, data=json_data, verify = not self.config['insecure'])
+    response = self.session.put(url, headers=headers, data=json_data)
     return response
 
 def _create(self, url, json_body):
@@ -174,7 +176,7 @@ def execute_post(self, url, data, custom_headers={}):
     headers = self.get_headers()
     headers["Content-Type"] = "application/json"
     headers.update(custom_headers)
-    response = requests.post(url, headers=headers, data=json_data, verify = not self.config['insecure'])
+    response = self.session.post(url, headers=headers, data=json_data)
     return response
 
 def get_matched_components(self, version_obj, limit=9999):
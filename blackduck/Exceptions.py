@@ -32,6 +32,18 @@ class EndpointNotFound(Exception):
 class UnacceptableContentType(Exception):
     pass
 
+class ScanFailed(Exception):
+    # A scan or BOM computation the caller waits on ended in failure
+    pass
+
+class ReportFailed(Exception):
+    # Report generation ended in failure
+    pass
+
+class SafetyCapExceeded(Exception):
+    # A cleanup would delete more than it is allowed to in one run
+    pass
+
 def http_exception_handler(self, response, name):
     error_codes = {
         404: EndpointNotFound,
@@ -44,7 +44,10 @@ It is possible to generate generate_config file by initalizing API as following:
     urlbase="https://hub-hostname"
     
     hub = HubInstance(urlbase, username, password, insecure=True)
-    
+
+All requests are sent through a single pooled, keep-alive requests.Session (hub.session).
+The number of pooled connections and retries can be set with the pool_size and retries keyword
+arguments, e.g. HubInstance(urlbase, api_token=token, pool_size=20, retries=5)
     
 '''
 import logging
@@ -63,9 +66,12 @@ class HubInstance(object):
 
     # TODO: What to do about the config file for thread-safety, concurrency
     configfile = ".restconfig.json"
+
+    # Optional blackduck.NameIndex.NameIndex answering project/version lookups by name locally
+    name_index = None
       
     from .Core import (
-        _create,_get_hub_rest_api_version_info,_get_major_version,_get_parameter_string,_validated_json_data,
+        _create,_create_session,_get_hub_rest_api_version_info,_get_major_version,_get_parameter_string,_validated_json_data,
         execute_delete,execute_get,execute_post,execute_put,get_api_version,get_apibase,get_auth_token,get_headers,
         get_limit_paramstring,get_link,get_matched_components,get_tags_url,get_urlbase,read_config,write_config,
         _check_version_compatibility
@@ -98,7 +104,7 @@ class HubInstance(object):
         download_notification_report, download_report
     )
     from .Projects import (
-        _find_user_group_url, _find_user_url, _get_projects_url, _project_role_urls, 
+        _find_user_group_url, _find_user_url, _get_indexed, _get_projects_url, _project_role_urls, 
         assign_project_application_id, assign_user_group_to_project, assign_user_to_project, 
         compare_project_versions, create_project, create_project_version, delete_all_empty_versions, 
         delete_application_id, delete_empty_projects, delete_empty_versions, delete_project_by_name, 
@@ -153,6 +159,12 @@ class HubInstance(object):
         
         if self.config['debug']:
             logger.debug(f"Reading connection and authentication info from {self.configfile}")
+
+        # All requests share one pooled, keep-alive session to avoid a TCP+TLS handshake per call
+        self.session = self._create_session(
+            pool_size=kwargs.get('pool_size', 10),
+            retries=kwargs.get('retries', 3)
+        )
         
         self.token, self.csrf_token, self.cookie = self.get_auth_token()
         try:
@@ -1,5 +1,4 @@
 import logging
-import requests
 import json
 from operator import itemgetter
 import urllib.parse
@@ -9,7 +8,7 @@ logger = logging.getLogger(__name__)
 def get_ldap_state(self):
     url = self.config['baseurl'] + "/api/v1/ldap/state"
     headers = self.get_headers()
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
 
@@ -18,7 +17,7 @@ def enable_ldap(self):
     headers = self.get_headers()
     payload = {}
     payload['ldapEnabled'] = True
-    response = requests.post(url, headers=headers, verify = not self.config['insecure'], json=payload)
+    response = self.session.post(url, headers=headers, json=payload)
     jsondata = response.json()
     return jsondata
     
@@ -27,7 +26,7 @@ def disable_ldap(self):
     headers = self.get_headers()
     payload = {}
     payload['ldapEnabled'] = False
-    response = requests.post(url, headers=headers, verify = not self.config['insecure'], json=payload)
+    response = self.session.post(url, headers=headers, json=payload)
     jsondata = response.json()
     return jsondata
     
@@ -35,6 +34,6 @@ def get_ldap_configs(self):
     url = self.config['baseurl'] + "/api/v1/ldap/configs"
     headers = self.get_headers()
     headers['Content-Type']  = "application/json"
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""
+Local SQLite mirror of the Black Duck inventory
+
+Reporting scripts usually re-crawl projects, versions and BOMs through the REST API on
+every run, which takes hours on a large server and loads it needlessly. A Mirror syncs
+that inventory into a local SQLite database once, then incrementally:
+
+    * every sync lists projects and their versions (one request per project)
+    * the BOM of a version (components, vulnerable components, policy status and
+      codelocations) is fetched again only when the version is new, its
+      lastBomUpdateDate/settingUpdatedAt changed, or a notification since the previous
+      sync referenced it (e.g. POLICY_VIOLATION or VULNERABILITY, which do not touch
+      the version itself)
+    * projects and versions gone from the server are deleted with their BOM
+
+Each table keeps a few indexed columns for querying plus the whole JSON document.
+
+Usage:
+
+    from blackduck import Client
+    from blackduck.Mirror import Mirror
+
+    bd = Client(token=..., base_url=...)
+    with Mirror(bd, "inventory.sqlite") as mirror:
+        print(mirror.sync())
+        rows = mirror.query("SELECT project_name, version_name, count(*) FROM components "
+                            "JOIN versions USING (version_href) WHERE policy_status = 'IN_VIOLATION' "
+                            "GROUP BY version_href")
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import json
+import logging
+import sqlite3
+
+import requests
+
+from .Notifications import iso8601, notification_versions
+from .Pagination import KeysetCursor
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    project_href TEXT PRIMARY KEY, name TEXT, updated_at TEXT, json TEXT);
+CREATE TABLE IF NOT EXISTS versions (
+    version_href TEXT PRIMARY KEY, project_href TEXT, project_name TEXT, version_name TEXT,
+    phase TEXT, distribution TEXT, bom_stamp TEXT, synced_at TEXT, json TEXT);
+CREATE TABLE IF NOT EXISTS components (
+    component_href TEXT PRIMARY KEY, version_href TEXT, component_name TEXT, component_version_name TEXT,
+    policy_status TEXT, review_status TEXT, json TEXT);
+CREATE TABLE IF NOT EXISTS vulnerabilities (
+    version_href TEXT, component_name TEXT, component_version_name TEXT, vulnerability_name TEXT,
+    severity TEXT, remediation_status TEXT, json TEXT);
+CREATE TABLE IF NOT EXISTS policy_status (
+    version_href TEXT PRIMARY KEY, overall_status TEXT, json TEXT);
+CREATE TABLE IF NOT EXISTS codelocations (
+    codelocation_href TEXT PRIMARY KEY, version_href TEXT, name TEXT, updated_at TEXT, json TEXT);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY, value TEXT);
+CREATE INDEX IF NOT EXISTS versions_project ON versions (project_href);
+CREATE INDEX IF NOT EXISTS components_version ON components (version_href);
+CREATE INDEX IF NOT EXISTS vulnerabilities_version ON vulnerabilities (version_href);
+CREATE INDEX IF NOT EXISTS codelocations_version ON codelocations (version_href);
+"""
+
+BOM_TABLES = ('components', 'vulnerabilities', 'policy_status', 'codelocations')
+
+
+def bom_stamp(version):
+    """Value that changes whenever the BOM or the settings of a version change"""
+    return "|".join(version.get(key) or "" for key in ('createdAt', 'lastBomUpdateDate', 'settingUpdatedAt'))
+
+
+def _now():
+    return iso8601(datetime.now(timezone.utc))
+
+
+class Mirror:
+    """Incrementally synced SQLite copy of projects, versions and their BOMs"""
+
+    def __init__(self, bd, path, max_workers=8, notifications_url="/api/notifications"):
+        """
+        Args:
+            bd (blackduck.Client): client to sync from
+            path (str): sqlite database file, created if missing
+            max_workers (int): versions fetched concurrently. Defaults to 8.
+            notifications_url (str): notifications feed used to detect BOM changes. Defaults to
+                "/api/notifications"; None disables it.
+        """
+        self.bd = bd
+        self.max_workers = max_workers
+        self.notifications_url = notifications_url
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def query(self, sql, parameters=()):
+        """Run a query against the mirror
+
+        Returns:
+            list(sqlite3.Row): rows, accessible by column name
+        """
+        return self.db.execute(sql, parameters).fetchall()
+
+    def _get_state(self, key):
+        row = self.db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (key, value))
+
+    def _notified_versions(self):
+        """hrefs of the versions referenced by notifications since the previous sync, and the new cursor token"""
+        token = self._get_state('notifications')
+        if self.notifications_url is None or token is None:
+            # first sync: everything is fetched anyway, follow notifications from now on
+            return set(), KeysetCursor('createdAt', _now()).token
+        cursor = KeysetCursor.from_token(token)
+        hrefs = set()
+        try:
+            for notification in self.bd.get_items_by_key(self.notifications_url, cursor):
+                hrefs |= notification_versions(notification)
+        except requests.HTTPError as err:
+            logger.warning(f"unable to read notifications ({err}), relying on version timestamps only")
+            return set(), token
+        return hrefs, cursor.token
+
+    def _fetch_versions(self, project):
+        return project, list(self.bd.get_resource('versions', project))
+
+    def _fetch_bom(self, project_version):
+        project, version = project_version
+        return (
+            project,
+            version,
+            list(self.bd.get_resource('components', version)),
+            list(self.bd.get_resource('vulnerable-components', version)),
+            self.bd.get_resource('policy-status', version, items=False),
+            list(self.bd.get_resource('codelocations', version)),
+        )
+
+    def sync(self, full=False):
+        """Bring the mirror up to date with the server
+
+        Args:
+            full (bool): fetch every BOM again, ignoring timestamps and notifications. Defaults to False.
+
+        Returns:
+            dict: counts of 'projects', 'versions', 'refreshed' versions and 'deleted' versions
+        """
+        notified, notifications_token = self._notified_versions()
+        stamps = dict(self.db.execute("SELECT version_href, bom_stamp FROM versions").fetchall())
+        projects = list(self.bd.get_resource('projects'))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            project_versions = list(executor.map(self._fetch_versions, projects))
+
+            stale = []
+            current = set()
+            with self.db:
+                for project, versions in project_versions:
+                    project_href = project['_meta']['href']
+                    self.db.execute("INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?)",
+                                    (project_href, project['name'], project.get('updatedAt'), json.dumps(project)))
+                    for version in versions:
+                        href = version['_meta']['href']
+                        current.add(href)
+                        if full or href in notified or href not in stamps or stamps[href] != bom_stamp(version):
+                            stale.append((project, version))
+                self._delete_missing(current, {p['_meta']['href'] for p in projects})
+
+            for bom in executor.map(self._fetch_bom, stale):
+                # writes stay on this thread: one transaction per version
+                with self.db:
+                    self._store_version(*bom)
+
+        with self.db:
+            self._set_state('notifications', notifications_token)
+            self._set_state('synced_at', _now())
+        stats = {
+            'projects': len(projects), 'versions': len(current), 'refreshed': len(stale),
+            'deleted': len(set(stamps) - current)
+        }
+        logger.info(f"mirror synced: {stats}")
+        return stats
+
+    def _delete_missing(self, version_hrefs, project_hrefs):
+        for (href,) in self.db.execute("SELECT version_href FROM versions").fetchall():
+            if href not in version_hrefs:
+                logger.debug(f"version {href} is gone, deleting it from the mirror")
+                self.db.execute("DELETE FROM versions WHERE version_href = ?", (href,))
+                for table in BOM_TABLES:
+                    self.db.execute(f"DELETE FROM {table} WHERE version_href = ?", (href,))
+        for (href,) in self.db.execute("SELECT project_href FROM projects").fetchall():
+            if href not in project_hrefs:
+                self.db.execute("DELETE FROM projects WHERE project_href = ?", (href,))
+
+    def _store_version(self, project, version, components, vulnerable_components, policy_status, codelocations):
+        href = version['_meta']['href']
+        self.db.execute("INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+            href, project['_meta']['href'], project['name'], version.get('versionName'), version.get('phase'),
+            version.get('distribution'), bom_stamp(version), _now(), json.dumps(version)))
+        for table in BOM_TABLES:
+            self.db.execute(f"DELETE FROM {table} WHERE version_href = ?", (href,))
+        self.db.executemany("INSERT OR REPLACE INTO components VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            (c['_meta']['href'], href, c.get('componentName'), c.get('componentVersionName'),
+             c.get('policyStatus'), c.get('reviewStatus'), json.dumps(c))
+            for c in components
+        ])
+        rows = []
+        for v in vulnerable_components:
+            vulnerability = v.get('vulnerabilityWithRemediation') or {}
+            rows.append((href, v.get('componentName'), v.get('componentVersionName'),
+                         vulnerability.get('vulnerabilityName'), vulnerability.get('severity'),
+                         vulnerability.get('remediationStatus'), json.dumps(v)))
+        self.db.executemany("INSERT INTO vulnerabilities VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.db.execute("INSERT OR REPLACE INTO policy_status VALUES (?, ?, ?)",
+                        (href, policy_status.get('overallStatus'), json.dumps(policy_status)))
+        self.db.executemany("INSERT OR REPLACE INTO codelocations VALUES (?, ?, ?, ?, ?)", [
+            (c['_meta']['href'], href, c.get('name'), c.get('updatedAt'), json.dumps(c))
+            for c in codelocations
+        ])
@@ -0,0 +1,242 @@
+"""
+Compact typed models for the most common Blackduck resources
+
+Every resource returned by Client is a nested dict holding the whole JSON document,
+including the full list of _meta.links. For in-process analytics over large BOMs that
+costs a lot of memory and every attribute access is a dict lookup (often a nested one).
+The models below keep only the commonly used fields in __slots__, intern the strings
+that repeat across thousands of objects (license names, origins, statuses) and index
+_meta.links once so link(rel) is a single dict lookup. The raw JSON is kept only when
+asked for with keep_raw=True.
+
+Models are built from JSON as items are consumed, so they plug in as a projection:
+
+    from blackduck.Models import BomComponent
+
+    for component in bd.get_items(components_url, projection=BomComponent.from_json):
+        print(component.name, component.version_name, component.policy_status)
+        vulnerabilities_url = component.link('vulnerabilities')
+
+They can also be passed as the parent to Client.get_resource / list_resources.
+"""
+
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _lookup(obj, path):
+    for key in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+class Resource:
+    """Base of the typed models: href, an O(1) rel -> href index and, optionally, the raw JSON
+
+    Subclasses list their fields in FIELDS as (attribute, path into the JSON document) and
+    the attributes whose string values repeat across objects in INTERNED.
+    """
+
+    __slots__ = ('href', '_links', '_raw')
+    FIELDS = ()
+    INTERNED = frozenset()
+
+    def __init__(self, href=None, links=None, raw=None, **values):
+        self.href = href
+        self._links = links or {}
+        self._raw = raw
+        for attribute, _ in self.FIELDS:
+            setattr(self, attribute, values.get(attribute))
+
+    @classmethod
+    def from_json(cls, obj, keep_raw=False):
+        """Build a model from a JSON document (dict) as returned by Client
+
+        Args:
+            obj (dict): the resource, either whole or slimmed by get_items(fields=...)
+            keep_raw (bool): keep a reference to obj, available as .raw. Defaults to False.
+
+        Returns:
+            Resource: instance of cls
+        """
+        model = cls.__new__(cls)
+        meta = obj.get('_meta') or {}
+        href = meta.get('href')
+        model.href = _intern(href)
+        rels = meta.get('rels')
+        if rels is None:
+            rels = {
+                sys.intern(link['rel']): sys.intern(link['href'])
+                for link in meta.get('links', ()) if 'rel' in link and 'href' in link
+            }
+        model._links = rels
+        model._raw = obj if keep_raw else None
+        for attribute, path in cls.FIELDS:
+            value = cls._convert(attribute, _lookup(obj, path))
+            setattr(model, attribute, value)
+        return model
+
+    @classmethod
+    def _convert(cls, attribute, value):
+        if attribute in cls.INTERNED:
+            if isinstance(value, list):
+                return tuple(_intern(v) for v in value)
+            return _intern(value)
+        return value
+
+    def link(self, rel):
+        """Url of the related resource rel, or None if the resource has no such link"""
+        return self._links.get(rel)
+
+    @property
+    def links(self):
+        """dict(str -> str) of rel -> href"""
+        return self._links
+
+    @property
+    def resources(self):
+        """Same form as Client.list_resources: rel -> href plus 'href' for the resource itself"""
+        return dict(self._links, href=self.href)
+
+    @property
+    def raw(self):
+        """The JSON document the model was built from, if it was built with keep_raw=True
+
+        Raises:
+            AttributeError: the raw JSON was not kept
+        """
+        if self._raw is None:
+            raise AttributeError(f"{type(self).__name__} was built without keep_raw=True")
+        return self._raw
+
+    def to_json(self):
+        """Rebuild a (partial) JSON document holding the modelled fields and the links"""
+        obj = {path[0]: getattr(self, attribute) for attribute, path in self.FIELDS if len(path) == 1}
+        obj['_meta'] = {'href': self.href, 'links': [{'rel': rel, 'href': href} for rel, href in self._links.items()]}
+        return obj
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.href == other.href and all(
+            getattr(self, attribute) == getattr(other, attribute) for attribute, _ in self.FIELDS)
+
+    def __hash__(self):
+        return hash((type(self), self.href))
+
+    def __repr__(self):
+        fields = ", ".join(f"{attribute}={getattr(self, attribute)!r}" for attribute, _ in self.FIELDS[:2])
+        return f"{type(self).__name__}({fields}, href={self.href!r})"
+
+
+class Project(Resource):
+    FIELDS = (
+        ('name', ('name',)),
+        ('description', ('description',)),
+        ('tier', ('projectTier',)),
+        ('created_at', ('createdAt',)),
+        ('updated_at', ('updatedAt',)),
+    )
+    __slots__ = tuple(attribute for attribute, _ in FIELDS)
+
+
+class Version(Resource):
+    FIELDS = (
+        ('name', ('versionName',)),
+        ('phase', ('phase',)),
+        ('distribution', ('distribution',)),
+        ('released_on', ('releasedOn',)),
+        ('created_at', ('createdAt',)),
+        ('last_bom_update', ('lastBomUpdateDate',)),
+    )
+    INTERNED = frozenset(('phase', 'distribution'))
+    __slots__ = tuple(attribute for attribute, _ in FIELDS)
+
+
+class BomComponent(Resource):
+    FIELDS = (
+        ('name', ('componentName',)),
+        ('version_name', ('componentVersionName',)),
+        ('component', ('component',)),
+        ('component_version', ('componentVersion',)),
+        ('policy_status', ('policyStatus',)),
+        ('review_status', ('reviewStatus',)),
+        ('approval_status', ('approvalStatus',)),
+        ('licenses', ('licenses',)),
+        ('origins', ('origins',)),
+        ('match_types', ('matchTypes',)),
+        ('usages', ('usages',)),
+    )
+    INTERNED = frozenset(('policy_status', 'review_status', 'approval_status', 'match_types', 'usages'))
+    __slots__ = tuple(attribute for attribute, _ in FIELDS)
+
+    @classmethod
+    def _convert(cls, attribute, value):
+        if attribute == 'licenses':
+            # license display names, e.g. ('Apache License 2.0',)
+            return tuple(_intern(license.get('licenseDisplay') or license.get('licenseName'))
+                         for license in value or ())
+        if attribute == 'origins':
+            # (namespace, external id) pairs, e.g. (('maven', 'org.slf4j:slf4j-api:1.7.30'),)
+            return tuple((_intern(origin.get('externalNamespace')), origin.get('externalId'))
+                         for origin in value or ())
+        return super()._convert(attribute, value)
+
+
+class Vulnerability(Resource):
+    FIELDS = (
+        ('name', ('vulnerabilityName',)),
+        ('severity', ('severity',)),
+        ('source', ('source',)),
+        ('base_score', ('baseScore',)),
+        ('overall_score', ('overallScore',)),
+        ('remediation_status', ('remediationStatus',)),
+        ('published_date', ('vulnerabilityPublishedDate',)),
+    )
+    INTERNED = frozenset(('severity', 'source', 'remediation_status'))
+    __slots__ = tuple(attribute for attribute, _ in FIELDS)
+
+    @classmethod
+    def from_json(cls, obj, keep_raw=False):
+        """Accepts the items of version vulnerable-bom-components (vulnerabilityWithRemediation)
+        as well as those of component version vulnerabilities (name, publishedDate)"""
+        vulnerability = obj.get('vulnerabilityWithRemediation')
+        if vulnerability is None:
+            vulnerability = dict(obj, vulnerabilityName=obj.get('name'),
+                                 vulnerabilityPublishedDate=obj.get('publishedDate'))
+        elif '_meta' not in vulnerability:
+            vulnerability = dict(vulnerability, _meta=obj.get('_meta'))
+        model = super().from_json(vulnerability)
+        model._raw = obj if keep_raw else None
+        return model
+
+
+class License(Resource):
+    FIELDS = (
+        ('name', ('name',)),
+        ('family', ('licenseFamily', 'name')),
+        ('ownership', ('ownership',)),
+        ('source', ('licenseSource',)),
+    )
+    INTERNED = frozenset(('name', 'family', 'ownership', 'source'))
+    __slots__ = tuple(attribute for attribute, _ in FIELDS)
+
+
+class CodeLocation(Resource):
+    FIELDS = (
+        ('name', ('name',)),
+        ('url', ('url',)),
+        ('scan_size', ('scanSize',)),
+        ('created_at', ('createdAt',)),
+        ('updated_at', ('updatedAt',)),
+        ('mapped_project_version', ('mappedProjectVersion',)),
+    )
+    __slots__ = tuple(attribute for attribute, _ in FIELDS)
@@ -0,0 +1,289 @@
+"""
+Portfolio-wide index of project and version urls by name
+
+Looking a project or version up by name is a q=name: search on the server every time, and
+CSV-driven batch scripts do it for every row. A NameIndex lists every project once, keeps
+their urls in dicts (project name -> href, (project name, version name) -> href) persisted
+in SQLite, and resolves names locally. The versions of a project are listed the first time
+one of them is looked up, so the first lookup costs one listing of the projects, not a
+crawl of every version on the server.
+
+    * after ttl seconds, the next lookup refreshes the index incrementally: projects are
+      listed again, and the versions of projects that are new or whose updatedAt changed
+      are listed again at their next lookup; projects gone from the server are dropped
+    * refresh(full=True) forgets the versions of every project; a version created
+      elsewhere under a project whose updatedAt did not change is only indexed then (or
+      when a lookup by its name misses and falls back to the server search)
+    * invalidate(project_name) makes the next lookup reload that project and its versions
+      (call it after creating one), remove() drops deleted projects and versions
+
+By default only urls are indexed: callers GET the object itself by href (one request, no
+search), so what they edit is never stale. With keep_objects=True the index also keeps the
+objects as listed, and object(href) serves them without any request; they are then as old
+as the last refresh (at most ttl seconds, unless changed through the same HubInstance).
+
+A HubInstance uses an index for get_project_by_name, get_version_by_name,
+get_project_version_by_name and get_projects_by_version_name once one is assigned to
+it, keeps it up to date on create/delete, and falls back to the server search on a miss.
+
+Usage:
+
+    from blackduck.HubRestApi import HubInstance
+    from blackduck.NameIndex import NameIndex
+
+    hub = HubInstance()
+    hub.name_index = NameIndex(hub, "names.sqlite", ttl=3600)
+    for row in csv.DictReader(f):
+        version = hub.get_project_version_by_name(row['project'], row['version'])  # one GET by href
+
+NameIndex works the same with a blackduck.Client: NameIndex(bd, "names.sqlite").
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS project_names (
+    name TEXT PRIMARY KEY, href TEXT, updated_at TEXT, versions_listed_at TEXT, json TEXT);
+CREATE TABLE IF NOT EXISTS version_names (
+    project_name TEXT, version_name TEXT, href TEXT, json TEXT, PRIMARY KEY (project_name, version_name));
+CREATE TABLE IF NOT EXISTS index_state (
+    key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class NameIndex:
+    """Local name -> url lookups for projects and versions, refreshed incrementally"""
+
+    def __init__(self, bd, path=None, ttl=3600.0, max_workers=8, page_size=1000, keep_objects=False):
+        """
+        Args:
+            bd (blackduck.Client/blackduck.HubRestApi.HubInstance): client to list projects and versions with
+            path (str): SQLite file keeping the index between runs. Defaults to None (in memory only).
+            ttl (float): seconds after which a lookup first refreshes the index. Defaults to 3600.
+            max_workers (int): projects whose versions are listed concurrently. Defaults to 8.
+            page_size (int): items per request when listing. Defaults to 1000.
+            keep_objects (bool): keep the listed objects too, served by object() without a GET.
+                Defaults to False.
+        """
+        self.bd = bd
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.keep_objects = keep_objects
+        self._lock = threading.RLock()
+        self._pending = set()  # names of projects to reload at the next lookup
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._projects = dict()  # name -> href
+        self._updated = dict()  # name -> updatedAt
+        self._listed = dict()  # name -> updatedAt of the project when its versions were listed
+        self._versions = dict()  # project name -> version name -> href, for projects whose versions are listed
+        self._objects = dict()  # href -> object, if keep_objects
+        for name, href, updated_at, listed_at, document in self._db.execute(
+                "SELECT name, href, updated_at, versions_listed_at, json FROM project_names"):
+            self._projects[name] = href
+            self._updated[name] = updated_at
+            if listed_at is not None:
+                self._listed[name] = listed_at
+                self._versions[name] = dict()
+            self._keep(href, document)
+        for project_name, version_name, href, document in self._db.execute(
+                "SELECT project_name, version_name, href, json FROM version_names"):
+            if project_name in self._versions:
+                self._versions[project_name][version_name] = href
+                self._keep(href, document)
+        row = self._db.execute("SELECT value FROM index_state WHERE key = 'refreshed_at'").fetchone()
+        self.refreshed_at = float(row[0]) if row else None
+
+    def __len__(self):
+        return len(self._projects)
+
+    def close(self):
+        self._db.close()
+
+    def project_href(self, name):
+        """Url of the project named name, or None if the index does not know it"""
+        self._ensure_fresh()
+        return self._projects.get(name)
+
+    def version_href(self, project_name, version_name):
+        """Url of version version_name of project project_name, or None if the index does not know it"""
+        self._ensure_fresh()
+        return self._versions_of(project_name).get(version_name)
+
+    def href(self, project_name, version_name=None):
+        """Url of a project, or of one of its versions, or None"""
+        if version_name is None:
+            return self.project_href(project_name)
+        return self.version_href(project_name, version_name)
+
+    def object(self, href):
+        """The project or version at href as last listed, or None if not kept (see keep_objects)"""
+        return self._objects.get(href)
+
+    def projects_with_version(self, version_name):
+        """(project name, project href, version href) for every indexed project having a version named version_name
+
+        Lists the versions of every project not listed yet.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            unlisted = [name for name in self._projects if not self._is_listed(name)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(self._versions_of, unlisted))
+        with self._lock:
+            return [(name, self._projects[name], versions[version_name])
+                    for name, versions in self._versions.items() if version_name in versions]
+
+    def _ensure_fresh(self):
+        if self.refreshed_at is None or time.time() - self.refreshed_at > self.ttl:
+            self.refresh()
+        if self._pending:
+            with self._lock:
+                pending, self._pending = self._pending, set()
+            for name in pending:
+                self._reload(name)
+
+    def refresh(self, full=False):
+        """List the projects; the versions of new or changed ones (of all of them if full) are listed again lazily
+
+        Returns:
+            dict: counts of 'projects' listed, 'changed' (versions to list again) and 'removed'
+        """
+        projects = self._list_projects()
+        with self._lock:
+            changed = [p for p in projects if full or p['name'] not in self._projects
+                       or self._updated.get(p['name']) != p.get('updatedAt')]
+            for project in changed:
+                self._store_project(project)
+            gone = set(self._projects) - {p['name'] for p in projects}
+            for name in gone:
+                self.remove(name)
+            self.refreshed_at = time.time()
+            self._db.execute("INSERT OR REPLACE INTO index_state VALUES ('refreshed_at', ?)", (str(self.refreshed_at),))
+            self._db.commit()
+        logger.info(f"name index refreshed: {len(projects)} projects, {len(changed)} changed, {len(gone)} removed")
+        return {'projects': len(projects), 'changed': len(changed), 'removed': len(gone)}
+
+    def add_project(self, project):
+        """Record a project found or created elsewhere; its versions are listed at their first lookup"""
+        with self._lock:
+            self._store_project(project)
+            self._db.commit()
+
+    def add_version(self, project_name, version):
+        """Record a version found or created elsewhere"""
+        with self._lock:
+            if project_name not in self._versions:
+                return  # added with the other versions when they are listed
+            href = version['_meta']['href']
+            self._versions[project_name][version['versionName']] = href
+            self._keep(href, version)
+            self._db.execute("INSERT OR REPLACE INTO version_names VALUES (?, ?, ?, ?)",
+                             (project_name, version['versionName'], href, self._document(version)))
+            self._db.commit()
+
+    def remove(self, project_name, version_name=None):
+        """Forget a deleted project (with its versions), or one deleted version"""
+        with self._lock:
+            if version_name is not None:
+                href = self._versions.get(project_name, {}).pop(version_name, None)
+                self._objects.pop(href, None)
+                self._db.execute("DELETE FROM version_names WHERE project_name = ? AND version_name = ?",
+                                 (project_name, version_name))
+            else:
+                self._forget_versions(project_name)
+                self._objects.pop(self._projects.pop(project_name, None), None)
+                self._updated.pop(project_name, None)
+                self._db.execute("DELETE FROM project_names WHERE name = ?", (project_name,))
+            self._db.commit()
+
+    def invalidate(self, project_name):
+        """Reload a project and its versions at the next lookup, e.g. after creating either"""
+        with self._lock:
+            self._pending.add(project_name)
+
+    def _is_listed(self, name):
+        return name in self._versions and self._listed.get(name) == self._updated.get(name)
+
+    def _versions_of(self, name):
+        """version name -> href of project name, listing its versions first if they are not"""
+        with self._lock:
+            if self._is_listed(name) or name not in self._projects:
+                return self._versions.get(name, {})
+            href, updated_at = self._projects[name], self._updated.get(name)
+        # the versions url of a project is its url + /versions
+        project = {'name': name, '_meta': {'href': href, 'links': [{'rel': "versions", 'href': href + "/versions"}]}}
+        versions = self._list_versions(project)
+        with self._lock:
+            if self._projects.get(name) != href:
+                return {}  # removed meanwhile
+            self._forget_versions(name)
+            self._listed[name] = updated_at
+            self._versions[name] = {version['versionName']: version['_meta']['href'] for version in versions}
+            for version in versions:
+                self._keep(version['_meta']['href'], version)
+            self._db.execute("UPDATE project_names SET versions_listed_at = ? WHERE name = ?", (updated_at, name))
+            self._db.executemany("INSERT OR REPLACE INTO version_names VALUES (?, ?, ?, ?)",
+                                 [(name, v['versionName'], v['_meta']['href'], self._document(v)) for v in versions])
+            self._db.commit()
+            return self._versions[name]
+
+    def _store_project(self, project):
+        # the versions of a new or changed project are listed again at their next lookup
+        name, href = project['name'], project['_meta']['href']
+        self._forget_versions(name)
+        self._objects.pop(self._projects.get(name), None)
+        self._projects[name] = href
+        self._updated[name] = project.get('updatedAt')
+        self._keep(href, project)
+        self._db.execute("INSERT OR REPLACE INTO project_names VALUES (?, ?, ?, NULL, ?)",
+                         (name, href, project.get('updatedAt'), self._document(project)))
+
+    def _forget_versions(self, name):
+        for href in self._versions.pop(name, {}).values():
+            self._objects.pop(href, None)
+        self._listed.pop(name, None)
+        self._db.execute("DELETE FROM version_names WHERE project_name = ?", (name,))
+
+    def _keep(self, href, obj):
+        if self.keep_objects and obj is not None:
+            self._objects[href] = json.loads(obj) if isinstance(obj, str) else obj
+
+    def _document(self, obj):
+        return json.dumps(obj) if self.keep_objects else None
+
+    def _reload(self, name):
+        matches = [p for p in self._list_projects({'q': f"name:{name}"}) if p['name'] == name]
+        if matches:
+            self.add_project(matches[0])
+        else:
+            self.remove(name)
+
+    def _list_projects(self, params=None):
+        if hasattr(self.bd, 'get_resource'):  # blackduck.Client
+            return list(self.bd.get_resource('projects', params=dict(params or {}), page_size=self.page_size))
+        return self._pages(lambda parameters: self.bd.get_projects(limit=self.page_size, parameters=parameters),
+                           params)
+
+    def _list_versions(self, project):
+        if hasattr(self.bd, 'get_resource'):
+            return list(self.bd.get_resource('versions', project, page_size=self.page_size))
+        return self._pages(lambda parameters: self.bd.get_project_versions(
+            project, limit=self.page_size, parameters=parameters))
+
+    def _pages(self, get_page, params=None):
+        """All items of a HubInstance listing, page by page"""
+        items = []
+        while True:
+            page = get_page(dict(params or {}, offset=len(items)))
+            items.extend(page.get('items', []))
+            if not page.get('items') or len(items) >= page.get('totalCount', 0):
+                return items
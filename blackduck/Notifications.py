@@ -0,0 +1,192 @@
+"""
+Incremental change feed on /api/notifications
+
+Scripts that wait for something to happen on the server (a BOM computed, a new
+vulnerability, a policy violation) usually poll /api/notifications by hand, walking the
+same recent notifications again on every poll. A NotificationStream tails the feed
+instead: it remembers a high-water mark (a KeysetCursor on createdAt, persisted in a
+checkpoint store so a restarted process carries on where it stopped), asks only for the
+window between that mark and now (startDate/endDate), drops the notifications already
+seen and dispatches each new one to the handlers registered for its type.
+
+Delivery is at-least-once: the mark is saved after handlers return, so a crash in the
+middle of a poll can replay notifications after the last save.
+
+Usage:
+
+    from blackduck import Client
+    from blackduck.Checkpoint import FileCheckpointStore
+    from blackduck.Notifications import NotificationStream, BOM_COMPUTED
+
+    bd = Client(token=..., base_url=...)
+    stream = NotificationStream(bd, store=FileCheckpointStore("notifications.json"))
+
+    @stream.on(BOM_COMPUTED)
+    def bom_computed(event):
+        print("BOM computed for", event.project_versions)
+
+    stream.run(interval=30)
+"""
+
+from datetime import datetime, timezone
+import logging
+import threading
+
+from .Checkpoint import checkpoint_key
+from .Pagination import KeysetCursor
+
+logger = logging.getLogger(__name__)
+
+BOM_EDIT = 'BOM_EDIT'
+VULNERABILITY = 'VULNERABILITY'
+POLICY_VIOLATION = 'RULE_VIOLATION'
+POLICY_VIOLATION_CLEARED = 'RULE_VIOLATION_CLEARED'
+POLICY_OVERRIDE = 'POLICY_OVERRIDE'
+BOM_COMPUTED = 'VERSION_BOM_CODE_LOCATION_BOM_COMPUTED'
+
+
+def iso8601(when):
+    """Format a datetime (naive means UTC) the way the notifications API expects"""
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc)
+    return when.strftime("%Y-%m-%dT%H:%M:%S.") + f"{when.microsecond // 1000:03d}Z"
+
+
+def notification_versions(notification):
+    """hrefs of the project versions a notification is about"""
+    content = notification.get('content') or {}
+    hrefs = [content.get('projectVersion')]
+    hrefs += [affected.get('projectVersion') for affected in content.get('affectedProjectVersions', ())]
+    return {href for href in hrefs if href}
+
+
+class NotificationEvent:
+    """A notification with its commonly used parts pulled out"""
+
+    __slots__ = ('type', 'created_at', 'href', 'content', 'project_versions', 'raw')
+
+    def __init__(self, notification):
+        self.type = notification.get('type')
+        self.created_at = notification.get('createdAt')
+        self.href = (notification.get('_meta') or {}).get('href')
+        self.content = notification.get('content') or {}
+        self.project_versions = notification_versions(notification)
+        self.raw = notification
+
+    def __repr__(self):
+        return f"NotificationEvent({self.type}, {self.created_at}, {self.href})"
+
+
+class NotificationStream:
+    """Tail /api/notifications from a persisted high-water mark and dispatch events by type"""
+
+    def __init__(self, bd, store=None, url="/api/notifications", types=None, start=None, page_size=100):
+        """
+        Args:
+            bd (blackduck.Client): client to read notifications with
+            store (FileCheckpointStore/SqliteCheckpointStore): where the high-water mark is saved.
+                Defaults to None (kept in memory only).
+            url (str): notifications endpoint, e.g. a user's notifications. Defaults to "/api/notifications".
+            types (iterable(str)): only fetch these notification types. Defaults to None (all types,
+                or the types with a handler when handlers are registered with on()).
+            start (datetime): where to start when the store has no mark yet. Defaults to now.
+            page_size (int): notifications per request. Defaults to 100.
+        """
+        self.bd = bd
+        self.store = store
+        self.url = url
+        self.types = sorted(types) if types else None
+        self.page_size = page_size
+        self.handlers = dict()
+        token = store.get(self.key) if store is not None else None
+        if token is not None:
+            self.cursor = KeysetCursor.from_token(token)
+        else:
+            self.cursor = KeysetCursor('createdAt', iso8601(start or datetime.now(timezone.utc)))
+
+    @property
+    def key(self):
+        """Name of the high-water mark in the store"""
+        return "notifications:" + checkpoint_key(self.url, {'types': self.types or []})
+
+    def on(self, notification_type, handler=None):
+        """Register handler(event) for a notification type, or None for every type
+
+        Can be used as a decorator: @stream.on(BOM_COMPUTED)
+        """
+        if handler is None:
+            return lambda handler: self.on(notification_type, handler) or handler
+        self.handlers.setdefault(notification_type, []).append(handler)
+
+    def _params(self):
+        types = self.types
+        if types is None and self.handlers and None not in self.handlers:
+            types = sorted(self.handlers)
+        return {'filter': [f"notificationType:{t}" for t in types]} if types else {}
+
+    def _save(self, token):
+        if self.store is not None:
+            self.store.set(self.key, token)
+
+    def events(self):
+        """Yield the notifications created since the high-water mark, advancing it
+
+        The window ends at the time of the call, so notifications created meanwhile are left
+        for the next call. An event counts as handled once the next one is requested (or the
+        iteration ends); the mark only ever covers handled events and is saved every
+        page_size of them and at the end. If the consumer stops with an exception, the
+        event it was handling is yielded again by the next call, or after a restart.
+
+        Yields:
+            NotificationEvent: in createdAt order
+        """
+        end = iso8601(datetime.now(timezone.utc))
+        key_params = lambda value: {'startDate': value, 'endDate': end}
+        mark = self.cursor.token  # covers the handled events only; the cursor runs ahead of it
+        count = 0
+        failed = False
+        try:
+            for notification in self.bd.get_items_by_key(self.url, self.cursor, key_params=key_params,
+                                                         page_size=self.page_size, params=self._params()):
+                token = self.cursor.token
+                yield NotificationEvent(notification)
+                mark = token
+                count += 1
+                if count % self.page_size == 0:
+                    self._save(mark)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # the cursor may have moved past an event that was not handled (the consumer stopped
+            # on an exception, or fetching failed): step back to the mark
+            self.cursor = KeysetCursor.from_token(mark)
+            if count and not failed:
+                self._save(mark)
+
+    def poll(self):
+        """Dispatch the notifications created since the last poll to their handlers
+
+        Returns:
+            int: number of notifications dispatched
+        """
+        count = 0
+        for event in self.events():
+            for handler in self.handlers.get(event.type, []) + self.handlers.get(None, []):
+                handler(event)
+            count += 1
+        logger.debug(f"dispatched {count} notifications, high-water mark {self.cursor.value}")
+        return count
+
+    def run(self, interval=30.0, stop=None):
+        """poll() every interval seconds until stop is set
+
+        Args:
+            interval (float): seconds between polls. Defaults to 30.
+            stop (threading.Event): set it (e.g. from a handler or another thread) to return.
+                Defaults to None (run forever).
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.poll()
+            stop.wait(interval)
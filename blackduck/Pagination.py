@@ -0,0 +1,85 @@
+"""
+Keyset (cursor) pagination state for Client.get_items_by_key
+
+Offset pagination gets slower on the server as the offset grows and misses or repeats
+items when the collection changes during the walk. Keyset pagination instead sorts the
+collection by a key such as createdAt or updatedAt and asks for the items at or after the
+last key value seen. A KeysetCursor tracks that value together with the identities of the
+items already yielded at it, so the inclusive boundary never yields an item twice, and it
+can be saved as an opaque token to resume the walk later.
+
+Usage:
+
+    cursor = KeysetCursor.from_token(saved_token) if saved_token else KeysetCursor('createdAt')
+    for notification in bd.get_items_by_key("/api/notifications", cursor=cursor):
+        ...
+    saved_token = cursor.token
+"""
+
+import base64
+import hashlib
+import json
+import logging
+
+from .Utils import safe_get
+
+logger = logging.getLogger(__name__)
+
+
+def item_identity(item):
+    """Stable identity of an item: its href, or a digest of its content if it has none"""
+    href = safe_get(item, '_meta', 'href')
+    if href:
+        return href
+    return hashlib.sha1(json.dumps(item, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class KeysetCursor:
+    """Resumable position of a keyset walk"""
+
+    def __init__(self, key='createdAt', value=None, seen=()):
+        """
+        Args:
+            key (str): item field the collection is sorted by, e.g. 'createdAt' or 'updatedAt'
+            value (str): last key value yielded. Defaults to None (start of the collection).
+            seen (iterable(str)): identities of the items already yielded with that key value
+        """
+        self.key = key
+        self.value = value
+        self.seen = set(seen)
+        self.duplicates = 0  # items dropped because they were already yielded
+        self.out_of_order = 0  # items sorting before the cursor, a sign of a skipped or moved item
+
+    @property
+    def token(self):
+        """Opaque string to persist and pass to from_token() to resume the walk"""
+        state = {'key': self.key, 'value': self.value, 'seen': sorted(self.seen)}
+        return base64.urlsafe_b64encode(json.dumps(state).encode('utf-8')).decode('ascii')
+
+    @classmethod
+    def from_token(cls, token):
+        state = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return cls(state['key'], state['value'], state['seen'])
+
+    def advance(self, item):
+        """Move the cursor past item
+
+        Returns:
+            bool: True if the item is new and should be yielded, False if it is a duplicate
+        """
+        value = item.get(self.key)
+        identity = item_identity(item)
+        if self.value is not None and value is not None and value < self.value:
+            self.out_of_order += 1
+            logger.warning(f"item {identity} has {self.key} {value} before the cursor ({self.value}), "
+                           f"the collection is not sorted by {self.key} or changed during the walk")
+            return False
+        if value == self.value:
+            if identity in self.seen:
+                self.duplicates += 1
+                return False
+            self.seen.add(identity)
+        else:
+            self.value = value
+            self.seen = {identity}
+        return True
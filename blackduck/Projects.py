@@ -1,5 +1,5 @@
 import logging
-import requests
+import copy
 import json
 from operator import itemgetter
 import urllib.parse
@@ -23,7 +23,7 @@ def get_projects(self, limit=100, parameters={}):
     url = self._get_projects_url() + self._get_parameter_string(parameters)
     headers['Accept'] = 'application/vnd.blackducksoftware.project-detail-4+json'
     logger.debug(f"Retrieving projects using url {url}")
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
 
@@ -48,6 +48,8 @@ def create_project(self, project_name, version_name="Default Version", parameter
         }
     }
     response = self.execute_post(url, data=post_data)
+    if self.name_index is not None:
+        self.name_index.invalidate(project_name)
     return response
 
 def create_project_version(self, project_obj, new_version_name, clone_version=None, parameters={}):
@@ -71,12 +73,36 @@ def create_project_version(self, project_obj, new_version_name, clone_version=No
     if clone_version:
         post_data["cloneFromReleaseUrl"] = clone_version['_meta']['href']
     response = self.execute_post(url, data=post_data)
+    if self.name_index is not None:
+        self.name_index.invalidate(project_obj['name'])
     return response
 
+def _get_indexed(self, url):
+    # the object the name index keeps (keep_objects=True), or a GET of the url it gave
+    kept = self.name_index.object(url)
+    if kept is not None:
+        return copy.deepcopy(kept)  # callers edit what they get
+    headers = self.get_headers()
+    headers['Accept'] = 'application/vnd.blackducksoftware.project-detail-4+json'
+    response = self.session.get(url, headers=headers)
+    if response.status_code == 404:
+        return None  # deleted elsewhere; the caller falls back to a search
+    response.raise_for_status()
+    return response.json()
+
 def get_project_by_name(self, project_name):
+    if self.name_index is not None:
+        url = self.name_index.project_href(project_name)
+        project = self._get_indexed(url) if url else None
+        if project:
+            return project
+        if url:
+            self.name_index.remove(project_name)
     project_list = self.get_projects(parameters={"q":"name:{}".format(project_name)})
     for project in project_list['items']:
         if project['name'] == project_name:
+            if self.name_index is not None:
+                self.name_index.add_project(project)
             return project
 
 def get_projects_by_version_name(self, version_name, exclude_projects=None):
@@ -86,7 +112,18 @@ def get_projects_by_version_name(self, version_name, exclude_projects=None):
         version_name {str} -- version name to be searched
         exclude_projects {list} -- list of project names to be excluded from scanning for given version name
     """
-    headers = self.get_headers()
+    exclude_projects = exclude_projects or []
+    if self.name_index is not None:
+        # one local lookup instead of a version search per project; on a miss, search as below
+        items = []
+        for project_name, project_url, version_url in self.name_index.projects_with_version(version_name):
+            if project_name not in exclude_projects:
+                project, version = self._get_indexed(project_url), self._get_indexed(version_url)
+                if project and version:
+                    project['version'] = version
+                    items.append(project)
+        if items:
+            return {'items': items, 'totalCount': len(items)}
     projects = self.get_projects(limit=9999).get('items',[])
     if len(projects) == 0:
         logger.error('No projects found')
@@ -102,11 +139,20 @@ def get_projects_by_version_name(self, version_name, exclude_projects=None):
         return jsondata
 
 def get_version_by_name(self, project, version_name):
+    if self.name_index is not None:
+        url = self.name_index.version_href(project['name'], version_name)
+        version = self._get_indexed(url) if url else None
+        if version:
+            return version
+        if url:
+            self.name_index.remove(project['name'], version_name)
     version_list = self.get_project_versions(project, parameters={'q':"versionName:{}".format(version_name)})
     # A query by name can return more than one version if other versions
     # have names that include the search term as part of their name
     for version in version_list['items']:
         if version['versionName'] == version_name:
+            if self.name_index is not None:
+                self.name_index.add_version(project['name'], version)
             return version
 
 def get_project_version_by_name(self, project_name, version_name):
@@ -138,7 +184,7 @@ def get_project_by_id(self, project_id, limit=100):
     paramstring = self.get_limit_paramstring(limit)
     url = self._get_projects_url() + "/" + project_id + paramstring
     headers['Accept'] = 'application/vnd.blackducksoftware.project-detail-4+json'
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
 
@@ -148,7 +194,7 @@ def get_project_versions(self, project, limit=100, parameters={}):
     url = project['_meta']['href'] + "/versions" + self._get_parameter_string(parameters)
     headers = self.get_headers()
     headers['Accept'] = 'application/vnd.blackducksoftware.project-detail-4+json'
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
 
@@ -157,7 +203,7 @@ def get_version_components(self, projectversion, limit=1000):
     url = projectversion['_meta']['href'] + "/components" + paramstring
     headers = self.get_headers()
     headers['Accept'] = 'application/vnd.blackducksoftware.bill-of-materials-6+json'
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
 
@@ -174,15 +220,24 @@ def update_project_version_settings(self, project_name, version_name, new_settin
     version = self.get_project_version_by_name(project_name, version_name)
 
     if version:
+        changed = False
         for k,v in new_settings.items():
             if k in PROJECT_VERSION_SETTINGS:
-                logger.debug("updating setting {} in version {} with value {}".format(
-                    k, version['versionName'], v))
-                version[k] = v
+                if version.get(k) != v:
+                    logger.debug("updating setting {} in version {} with value {}".format(
+                        k, version['versionName'], v))
+                    version[k] = v
+                    changed = True
             else:
                 logger.warn("Setting {} is not in the list of project version settings ({})".format(
                     k, PROJECT_VERSION_SETTINGS))
 
+        if not changed:
+            # a PUT of an unchanged version still triggers a BOM recomputation on the server
+            logger.info("Version {} already has settings {}, not updating".format(
+                version['versionName'], new_settings))
+            return
+
         url = version['_meta']['href']
 
         response = self.execute_put(url, version)
@@ -202,7 +257,7 @@ def get_version_by_id(self, project_id, version_id, limit=100):
     paramstring = self.get_limit_paramstring(limit)
     url = self._get_projects_url() + "/" + project_id + "/versions/" + version_id
     headers['Accept'] = 'application/vnd.blackducksoftware.project-detail-4+json'
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
     
@@ -213,7 +268,7 @@ def compare_project_versions(self, version, compareTo):
     cto = compareTo['_meta']['href'].replace(apibase, '')
     url = apibase + cwhat + "/compare" + cto + "/components" + paramstring
     headers = self.get_headers()
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
 
@@ -251,6 +306,8 @@ def delete_project_version_by_name(self, project_name, version_name, save_scans=
             # delete the project accordingly?
             logger.info("Deleting project-version at: {}".format(project_version['_meta']['href']))
             self.execute_delete(project_version['_meta']['href'])
+            if self.name_index is not None:
+                self.name_index.remove(project_name, version_name)
         else:
             logger.debug("Did not find version with name {} in project {}".format(version_name, project_name))
     else:
@@ -280,6 +337,8 @@ def delete_project_by_name(self, project_name, save_scans=False, backup_scans=Fa
         project_url = project['_meta']['href']
         logger.info("Deleting project {}".format(project_name))
         self.execute_delete(project_url)
+        if self.name_index is not None:
+            self.name_index.remove(project_name)
     else:
         logger.debug("Did not find project with name {}".format(project_name))
         
@@ -307,7 +366,7 @@ def delete_empty_projects(self):
         p_empty = True
         versions = self.get_project_versions(p).get('items', [])
         for v in versions:
-            codelocations = self.get_version_codelocations(v)
+            codelocations = self.get_version_codelocations(v, limit=1)
             if codelocations['totalCount'] != 0:
                 p_empty = False
                 logger.debug("Found a non-empty version in project {}, skipping...".format(
@@ -317,6 +376,8 @@ def delete_empty_projects(self):
             logger.info("Project {} is empty, deleting".format(p['name']))
             self.execute_delete(p['_meta']['href'])
             deleted_projects.append(p['name'])
+            if self.name_index is not None:
+                self.name_index.remove(p['name'])
     return deleted_projects
 
 def delete_empty_versions(self, project):
@@ -325,12 +386,14 @@ def delete_empty_versions(self, project):
     logger.debug("Deleting empty versions for project {}".format(project['name']))
     deleted_versions = list()
     for v in versions:
-        codelocations = self.get_version_codelocations(v).get('items', [])
+        codelocations = self.get_version_codelocations(v, limit=1).get('items', [])
         if not codelocations:
             logger.info("Deleting empty version {} from project {}".format(
                 v['versionName'], project['name']))
             self.execute_delete(v['_meta']['href'])
             deleted_versions.append((project['name'], v['versionName']))
+            if self.name_index is not None:
+                self.name_index.remove(project['name'], v['versionName'])
         else:
             logger.debug("Version {} within project {} has scans (i.e. not empty), skipping".format(
                 v['versionName'], project['name']))
@@ -403,11 +466,10 @@ def assign_user_group_to_project(self, project_name, user_group_name, project_ro
                     post_data = {"group": user_group_url}
                     headers['Content-Type'] = 'application/json'
 
-                response = requests.post(
+                response = self.session.post(
                     url, 
                     headers=headers, 
-                    data=json.dumps(post_data), 
-                    verify = not self.config['insecure'])
+                    data=json.dumps(post_data))
                 return response
             else:
                 assignable_groups = [u['name'] for u in assignable_user_groups['items']]
@@ -472,11 +534,10 @@ def assign_user_to_project(self, user_name, project_name, project_roles, limit=1
                     post_data = {"user": user_url}
                     headers['Content-Type'] = 'application/json'
 
-                response = requests.post(
+                response = self.session.post(
                     url,
                     headers=headers,
-                    data=json.dumps(post_data),
-                    verify=not self.config['insecure'])
+                    data=json.dumps(post_data))
                 return response
             else:
                 assignable_username = [u['name'] for u in assignable_users['items']]
@@ -0,0 +1,131 @@
+"""
+Client-side request rate and concurrency limits for HubSession
+
+TokenBucket caps the number of requests per second sent by every thread sharing a session.
+AIMDLimiter caps the number of requests in flight and adapts that cap to the server's
+health: it grows additively while responses are quick and successful, and shrinks
+multiplicatively when the server throttles (429/503), errors out, or latency rises above
+a threshold.
+
+Usage:
+
+    from blackduck import Client
+    from blackduck.RateLimit import AIMDLimiter, TokenBucket
+
+    bd = Client(token=..., base_url=...,
+                rate_limiter=TokenBucket(rate=20),
+                concurrency_limiter=AIMDLimiter(initial=8, maximum=32, latency_threshold=5.0))
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+THROTTLING_STATUS_CODES = (429, 503)
+
+
+class TokenBucket:
+    """Allow on average 'rate' requests per second with bursts of up to 'burst' requests"""
+
+    def __init__(self, rate, burst=None):
+        """
+        Args:
+            rate (float): requests per second
+            burst (int): bucket capacity. Defaults to max(1, rate).
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    """Additive increase / multiplicative decrease limit on the number of requests in flight"""
+
+    def __init__(self, initial=8, minimum=1, maximum=64, latency_threshold=None, backoff_ratio=0.5):
+        """
+        Args:
+            initial (int): starting concurrency limit
+            minimum (int): the limit never shrinks below this
+            maximum (int): the limit never grows above this
+            latency_threshold (float): seconds above which a response counts as congestion.
+                Defaults to None (only throttling and errors count).
+            backoff_ratio (float): multiplier applied to the limit on congestion. Defaults to 0.5.
+        """
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError("expected 1 <= minimum <= initial <= maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._last_decrease = time.monotonic()
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self):
+        """Block until a request slot is free
+
+        Returns:
+            float: start time to hand back to release()
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+        return time.monotonic()
+
+    def release(self, start, throttled=False):
+        """Free the slot and adjust the limit from the outcome of the request
+
+        Args:
+            start (float): as returned by acquire()
+            throttled (bool): the server throttled or failed the request
+        """
+        now = time.monotonic()
+        latency = now - start
+        congested = throttled or (self.latency_threshold is not None and latency > self.latency_threshold)
+        with self._condition:
+            self._in_flight -= 1
+            if congested:
+                # back off once per window: requests started before the last decrease
+                # were already accounted for by it
+                if start >= self._last_decrease:
+                    self._limit = max(self.minimum, self._limit * self.backoff_ratio)
+                    self._last_decrease = now
+                    logger.debug("congestion (latency %.2fs), concurrency limit lowered to %i", latency, self.limit)
+            else:
+                # grows by about one per window of successful requests
+                self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+
+def was_throttled(response):
+    """True if the server throttled the response, including attempts retried by urllib3"""
+    if response.status_code in THROTTLING_STATUS_CODES:
+        return True
+    retries = getattr(response.raw, 'retries', None)
+    history = getattr(retries, 'history', None) or ()
+    return any(attempt.status in THROTTLING_STATUS_CODES for attempt in history)
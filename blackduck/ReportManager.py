@@ -0,0 +1,166 @@
+"""
+Generate many reports at once and download them concurrently
+
+Report scripts usually handle one version at a time: POST the report, sleep and poll its
+status until it is COMPLETED, download the zip into memory and write it out. A
+ReportManager submits every report up front, polls their statuses from one shared loop
+(a ScanWaiter, with adaptive intervals), streams each completed zip to disk as soon as it
+is ready on a bounded pool of downloads, and deletes the report from the server afterwards
+so reports do not pile up there.
+
+Usage:
+
+    from concurrent.futures import as_completed
+    from blackduck.ReportManager import ReportManager
+
+    with ReportManager(bd, directory="sboms", max_downloads=8) as reports:
+        futures = {reports.sbom(version): version for version in versions}
+        for future in as_completed(futures):
+            print(futures[future]['versionName'], future.result())  # path of the zip
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import os
+import threading
+
+import requests
+
+from .Exceptions import ReportFailed
+from .ScanWaiter import ScanWaiter, _resolve
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ReportManager:
+    """Submit reports, poll them collectively and download completed ones with bounded concurrency"""
+
+    def __init__(self, bd, directory=".", max_downloads=4, delete=True, waiter=None, **waiter_kwargs):
+        """
+        Args:
+            bd (blackduck.Client): client to generate the reports with
+            directory (str): where the zips are written, created if missing. Defaults to ".".
+            max_downloads (int): reports downloaded concurrently. Defaults to 4.
+            delete (bool): delete each report from the server once downloaded. Defaults to True.
+            waiter (blackduck.ScanWaiter.ScanWaiter): poll loop to share. Defaults to None (a new one,
+                created with waiter_kwargs, e.g. min_interval, max_interval or timeout).
+        """
+        self.bd = bd
+        self.directory = directory
+        self.delete = delete
+        os.makedirs(directory, exist_ok=True)
+        self._own_waiter = waiter is None
+        self.waiter = waiter or ScanWaiter(bd, **waiter_kwargs)
+        self._downloads = ThreadPoolExecutor(max_workers=max_downloads)
+        self._generating = set()  # waiter futures of this manager's reports not generated yet
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Wait for the downloads in progress; reports still being generated are abandoned
+
+        Their futures are cancelled, also when the waiter is shared and keeps polling for others.
+        """
+        if self._own_waiter:
+            self.waiter.close()
+        with self._lock:
+            generating, self._generating = self._generating, set()
+        for generated in generating:
+            generated.cancel()
+        self._downloads.shutdown()
+
+    def submit(self, url, data, filename=None):
+        """Request a report and return a future for its downloaded zip
+
+        Args:
+            url (str): report collection to POST to, e.g. a version's sbom-reports
+            data (dict): report request body
+            filename (str): name of the zip in directory. Defaults to None (the server's fileName).
+
+        Returns:
+            concurrent.futures.Future: result is the path of the downloaded zip; raises ReportFailed
+                or TimeoutError
+        """
+        r = self.bd.session.post(url, json=data)
+        r.raise_for_status()
+        location = r.headers['Location']
+        logger.debug(f"report requested at {location}")
+
+        def check():
+            report = self.bd.get_json(location)
+            status = report.get('status')
+            if status == 'FAILED':
+                raise ReportFailed(f"report {location} failed")
+            return status == 'COMPLETED', report, status
+
+        downloaded = Future()
+
+        def completed(generated):
+            with self._lock:
+                self._generating.discard(generated)
+            if generated.cancelled():
+                downloaded.cancel()
+            elif generated.exception() is not None:
+                _resolve(downloaded, exception=generated.exception())
+            else:
+                try:
+                    download = self._downloads.submit(self._download, location, generated.result(), filename)
+                except RuntimeError as err:
+                    # generated just as this manager was closed
+                    _resolve(downloaded, exception=err)
+                    return
+                download.add_done_callback(lambda d: _copy_outcome(d, downloaded))
+
+        generated = self.waiter.watch(check)
+        with self._lock:
+            self._generating.add(generated)
+        generated.add_done_callback(completed)
+        return downloaded
+
+    def sbom(self, version, sbom_type="SPDX_23", report_format="JSON", filename=None):
+        """Request the SBOM of a project version; see submit()"""
+        data = {'reportFormat': report_format, 'reportType': "SBOM", 'sbomType': sbom_type}
+        return self.submit(version['_meta']['href'] + "/sbom-reports", data, filename)
+
+    def version_report(self, version, categories, report_format="CSV", filename=None):
+        """Request a version details report of the given categories (e.g. ['VERSION', 'COMPONENTS']); see submit()"""
+        url = self.bd.list_resources(version)['versionReport']
+        data = {'categories': list(categories), 'reportType': "VERSION", 'reportFormat': report_format,
+                'versionId': version['_meta']['href'].split("/")[-1]}
+        return self.submit(url, data, filename)
+
+    def _download(self, location, report, filename):
+        report_id = location.rstrip("/").split("/")[-1]
+        links = (report.get('_meta') or {}).get('links') or []
+        download_url = next((link['href'] for link in links if link.get('rel') == 'download'),
+                            f"/api/reports/{report_id}")
+        path = os.path.join(self.directory, filename or report.get('fileName') or f"{report_id}.zip")
+
+        with self.bd.session.get(download_url, headers={'Accept': "application/zip"}, stream=True) as r:
+            r.raise_for_status()
+            with open(path + ".part", "wb") as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+        os.replace(path + ".part", path)
+        logger.info(f"report {report_id} downloaded to {path}")
+
+        if self.delete:
+            try:
+                self.bd.session.delete(location).raise_for_status()
+            except requests.RequestException as err:
+                logger.warning(f"unable to delete report {location}: {err}")
+        return path
+
+
+def _copy_outcome(source, target):
+    if source.exception() is not None:
+        _resolve(target, exception=source.exception())
+    else:
+        _resolve(target, source.result())
@@ -0,0 +1,238 @@
+"""
+Read report zips as a stream of records
+
+Reports are downloaded as zip files, which scripts usually load whole into memory (or
+write to disk), extract, and json.load entirely; a file-level version details report can
+be gigabytes. zipfile cannot help without a seekable file, since it starts from the
+central directory at the end of the archive. ReportReader instead walks the local file
+headers as the bytes arrive, inflates each member with zlib on the fly and parses it
+incrementally:
+
+    * JSON members: the items of their top-level arrays (e.g. aggregateBomViewEntries,
+      detailedFileBomViewEntries) are yielded one by one, using ijson
+    * CSV members: rows are yielded as dicts
+
+so memory use stays flat whatever the size of the report. JSON parsing requires ijson
+(pip3 install blackduck[streaming]).
+
+Usage:
+
+    from blackduck.ReportReader import ReportReader
+
+    r = bd.session.get(download_url, headers={'Accept': "application/zip"}, stream=True)
+    for member, key, record in ReportReader.from_response(r).records(keys=['aggregateBomViewEntries']):
+        print(record['componentName'])
+"""
+
+import csv
+import io
+import logging
+import struct
+import zlib
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+LOCAL_HEADER = b"PK\x03\x04"
+DATA_DESCRIPTOR = b"PK\x07\x08"
+CENTRAL_DIRECTORY = b"PK\x01\x02"
+END_OF_CENTRAL_DIRECTORY = b"PK\x05\x06"
+READ_SIZE = 64 * 1024
+
+
+class _Source:
+    """Reads from a file-like object with the ability to push back unconsumed bytes"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.pushed = b""
+
+    def read(self, size):
+        if self.pushed:
+            data, self.pushed = self.pushed[:size], self.pushed[size:]
+            return data
+        return self.fileobj.read(size)
+
+    def read_exactly(self, size):
+        chunks = []
+        while size:
+            data = self.read(size)
+            if not data:
+                raise EOFError("unexpected end of zip stream")
+            chunks.append(data)
+            size -= len(data)
+        return b"".join(chunks)
+
+    def unread(self, data):
+        self.pushed = data + self.pushed
+
+
+class _Member(io.RawIOBase):
+    """The uncompressed content of one zip member, read straight from the stream"""
+
+    def __init__(self, source, name, method, flags, crc, compressed_size, zip64):
+        if method not in (0, 8):
+            raise ValueError(f"{name}: unsupported zip compression method {method}")
+        if method == 0 and flags & 0x08:
+            raise ValueError(f"{name}: stored member of unknown size cannot be streamed")
+        self.source = source
+        self.name = name
+        self.flags = flags
+        self.crc = crc
+        self.zip64 = zip64
+        self.remaining = compressed_size if not flags & 0x08 else None
+        self.inflater = zlib.decompressobj(-zlib.MAX_WBITS) if method == 8 else None
+        self.pending = b""
+        self.computed_crc = 0
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self):
+        if self.remaining is not None:
+            data = self.source.read(min(READ_SIZE, self.remaining)) if self.remaining else b""
+            if self.remaining and not data:
+                raise EOFError(f"{self.name}: unexpected end of zip stream")
+            self.remaining -= len(data)
+        else:
+            data = self.source.read(READ_SIZE)
+            if not data:
+                raise EOFError(f"{self.name}: unexpected end of zip stream")
+        if self.inflater is None:
+            return data, self.remaining == 0
+        out = self.inflater.decompress(data)
+        if self.remaining == 0 and not self.inflater.eof:
+            raise EOFError(f"{self.name}: compressed data is truncated")
+        if self.inflater.eof:
+            # the compressed data ended inside this chunk; the rest belongs to what follows
+            self.source.unread(self.inflater.unused_data)
+            return out, True
+        return out, False
+
+    def _finish(self):
+        self.finished = True
+        if self.flags & 0x08:
+            signature = self.source.read_exactly(4)
+            if signature != DATA_DESCRIPTOR:
+                self.source.unread(signature)
+            self.crc = struct.unpack("<I", self.source.read_exactly(4))[0]
+            self.source.read_exactly(16 if self.zip64 else 8)  # compressed and uncompressed sizes
+        if self.computed_crc != self.crc:
+            raise ValueError(f"{self.name}: CRC mismatch, the zip stream is corrupt")
+
+    def readinto(self, buffer):
+        while not self.pending and not self.finished:
+            data, last = self._next_chunk()
+            self.computed_crc = zlib.crc32(data, self.computed_crc)
+            self.pending = data
+            if last:
+                self._finish()
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def drain(self):
+        while self.readinto(bytearray(READ_SIZE)):
+            pass
+
+
+class ReportReader:
+    """Iterate the members and records of a zip read sequentially from a file-like object"""
+
+    def __init__(self, fileobj):
+        """
+        Args:
+            fileobj: file-like object positioned at the start of the zip, e.g. response.raw
+        """
+        self.source = _Source(fileobj)
+
+    @classmethod
+    def from_response(cls, response):
+        """Reader on the body of a requests response made with stream=True"""
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return cls(response.raw)
+
+    def members(self):
+        """Yield (name, binary file-like object) for each member, in archive order
+
+        Each file object reads straight from the stream, so it is only valid until the
+        next member is requested; whatever was not read of it is skipped then.
+        """
+        while True:
+            signature = self.source.read(4)
+            if signature and len(signature) < 4:
+                signature += self.source.read_exactly(4 - len(signature))
+            if signature in (b"", CENTRAL_DIRECTORY, END_OF_CENTRAL_DIRECTORY):
+                return  # the central directory repeats what the local headers said
+            if signature != LOCAL_HEADER:
+                raise ValueError(f"not a zip stream (signature {signature!r})")
+            (_, flags, method, _, _, crc, compressed_size, _, name_length,
+             extra_length) = struct.unpack("<HHHHHIIIHH", self.source.read_exactly(26))
+            name = self.source.read_exactly(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+            extra = self.source.read_exactly(extra_length)
+            zip64 = False
+            while len(extra) >= 4:
+                header_id, size = struct.unpack("<HH", extra[:4])
+                if header_id == 0x0001:
+                    zip64 = True
+                    if compressed_size == 0xFFFFFFFF and size >= 16:
+                        compressed_size = struct.unpack("<Q", extra[12:20])[0]
+                extra = extra[4 + size:]
+            member = _Member(self.source, name, method, flags, crc, compressed_size, zip64)
+            if not name.endswith("/"):  # not a directory entry
+                yield name, io.BufferedReader(member, buffer_size=READ_SIZE)
+            member.drain()
+
+    def records(self, keys=None):
+        """Yield (member name, key, record) for every record of every JSON and CSV member
+
+        Args:
+            keys (iterable(str)): names of the top-level JSON arrays to read, e.g.
+                ['aggregateBomViewEntries']. Defaults to None (every top-level array).
+                key is None for CSV rows.
+        """
+        keys = set(keys) if keys is not None else None
+        for name, member in self.members():
+            lower_name = name.lower()
+            if lower_name.endswith(".json"):
+                for key, record in _json_records(member, keys):
+                    yield name, key, record
+            elif lower_name.endswith(".csv"):
+                for row in csv.DictReader(io.TextIOWrapper(member, encoding='utf-8-sig', newline='')):
+                    yield name, None, row
+            else:
+                logger.debug(f"skipping report member {name}")
+
+
+def _json_records(stream, keys):
+    """Items of the top-level arrays of a JSON document, built one at a time"""
+    if ijson is None:
+        raise ImportError("Reading JSON report records requires ijson. Install it with: "
+                          "pip3 install blackduck[streaming]")
+    builder = None
+    current = None
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == current + ".item" and event in ('end_map', 'end_array'):
+                yield current, builder.value
+                builder = None
+            continue
+        if not prefix.endswith(".item") or prefix.count(".") != 1:
+            continue
+        key = prefix[:-len(".item")]
+        if keys is not None and key not in keys:
+            continue
+        if event in ('start_map', 'start_array'):
+            current = key
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif event not in ('end_map', 'end_array'):
+            yield key, value  # array of scalars
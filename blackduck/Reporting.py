@@ -40,9 +40,14 @@ def create_version_notices_report(self, version, format="TEXT", include_copyrigh
     notices_report_url = self.get_link(version, 'licenseReports')
     return self.execute_post(notices_report_url, post_data)
 
-def download_report(self, report_id):
+def download_report(self, report_id, stream=False):
     # TODO: Fix me, looks like the reports should be downloaded from different paths than the one here, and depending on the type and format desired the path can change
+    # stream=True leaves the body unread, e.g. for ReportReader.from_response(response).records()
     url = self.get_urlbase() + "/api/reports/{}".format(report_id)
+    if stream:
+        headers = self.get_headers()
+        headers.update({'Content-Type': 'application/zip', 'Accept':'application/zip'})
+        return self.session.get(url, headers=headers, stream=True)
     return self.execute_get(url, {'Content-Type': 'application/zip', 'Accept':'application/zip'})
 
 def download_notification_report(self, report_location_url):
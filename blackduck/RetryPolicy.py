@@ -0,0 +1,184 @@
+"""
+Pluggable retry policy for HubSession
+
+By default HubSession retries with a fixed exponential backoff (see Client.retry_adapter),
+so many workers failing at the same moment retry at the same moments too. A RetryPolicy
+replaces it with:
+
+    * full-jitter exponential backoff: each wait is drawn uniformly from
+      [0, min(backoff_max, backoff_factor * 2 ** (attempt - 1))]
+    * Retry-After: when the server sends it (seconds or HTTP date), it is honored instead
+      of the computed backoff, up to retry_after_max
+    * an optional RetryBudget shared by every request of the session, capping retries to
+      a fraction of recent traffic so an outage does not multiply the load on the server
+    * per-endpoint overrides selected by regular expression on the url, e.g. longer waits
+      for report downloads
+
+Usage:
+
+    from blackduck import Client
+    from blackduck.RetryPolicy import RetryBudget, RetryPolicy
+
+    policy = RetryPolicy(
+        retries=5, backoff_factor=1, backoff_max=60, budget=RetryBudget(ratio=0.2),
+        overrides={r"/reports/": {'retries': 10, 'backoff_factor': 5, 'backoff_max': 300}}
+    )
+    bd = Client(token=..., base_url=..., retry_policy=policy)
+"""
+
+from collections import deque
+import logging
+import random
+import re
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import MaxRetryError
+from requests.packages.urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class RetryBudget:
+    """Limit retries to a fraction of the requests sent over a sliding window"""
+
+    def __init__(self, ratio=0.2, min_retries=10, window=10.0):
+        """
+        Args:
+            ratio (float): maximum retries as a fraction of requests in the window. Defaults to 0.2.
+            min_retries (int): retries always allowed per window, so low traffic can still retry
+            window (float): length of the sliding window in seconds. Defaults to 10.
+        """
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        for events in (self._requests, self._retries):
+            while events and events[0] < now - self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            self._requests.append(now)
+
+    def record_retry(self):
+        with self._lock:
+            self._retries.append(time.monotonic())
+
+    def can_retry(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            return len(self._retries) < max(self.min_retries, self.ratio * len(self._requests))
+
+
+class JitterRetry(Retry):
+    """urllib3 Retry with full-jitter backoff, a cap on Retry-After and an optional shared RetryBudget"""
+
+    def __init__(self, *args, budget=None, max_backoff=120.0, max_retry_after=300.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = budget
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+
+    def new(self, **kw):
+        # urllib3 creates a new Retry per attempt from its own known parameters only
+        retry = super().new(**kw)
+        retry.budget = self.budget
+        retry.max_backoff = self.max_backoff
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+    def get_backoff_time(self):
+        consecutive_errors = 0
+        for attempt in reversed(self.history):
+            if attempt.redirect_location is not None:
+                break
+            consecutive_errors += 1
+        if consecutive_errors == 0:
+            return 0
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** (consecutive_errors - 1))))
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if not super().is_retry(method, status_code, has_retry_after):
+            return False
+        if self.budget is not None and not self.budget.can_retry():
+            # hand the response back to the caller instead of retrying
+            logger.warning("retry budget exhausted, not retrying %s response", status_code)
+            return False
+        return True
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if error is not None and self.budget is not None and not self.budget.can_retry():
+            logger.warning("retry budget exhausted, not retrying %s", error)
+            raise MaxRetryError(_pool, url, error) from error
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if self.budget is not None:
+            self.budget.record_retry()
+        return retry
+
+
+class RetryPolicy:
+    """Build the retrying HTTPAdapters used by a HubSession"""
+
+    def __init__(self,
+                 retries=3,
+                 backoff_factor=2,
+                 backoff_max=120.0,
+                 retry_after_max=300.0,
+                 status_forcelist=(429, 500, 502, 503, 504),
+                 budget=None,
+                 overrides=None):
+        """
+        Args:
+            retries (int): maximum number of times to retry a request. Defaults to 3.
+            backoff_factor (float): base of the exponential backoff in seconds. Defaults to 2.
+            backoff_max (float): cap on a single backoff in seconds. Defaults to 120.
+            retry_after_max (float): cap on a Retry-After wait in seconds. Defaults to 300.
+            status_forcelist (iterable(int)): HTTP response status codes to retry
+            budget (RetryBudget): shared limit on retries. Defaults to None (unlimited).
+            overrides (dict(str -> dict)): url regular expression -> keyword arguments of this
+                constructor (except budget and overrides) to use for matching endpoints
+        """
+        self.retries = int(retries)
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.status_forcelist = tuple(status_forcelist)
+        self.budget = budget
+        self.overrides = [(re.compile(pattern), settings) for pattern, settings in (overrides or {}).items()]
+
+    def retry(self, **settings):
+        """Build a JitterRetry from this policy, optionally with some settings overridden"""
+        return JitterRetry(
+            total=int(settings.get('retries', self.retries)),
+            backoff_factor=settings.get('backoff_factor', self.backoff_factor),
+            status_forcelist=settings.get('status_forcelist', self.status_forcelist),
+            budget=self.budget,
+            max_backoff=settings.get('backoff_max', self.backoff_max),
+            max_retry_after=settings.get('retry_after_max', self.retry_after_max),
+        )
+
+    def adapter(self, pool_maxsize=10):
+        """HTTPAdapter for all endpoints without an override"""
+        return HTTPAdapter(max_retries=self.retry(), pool_maxsize=int(pool_maxsize))
+
+    def endpoint_adapters(self, pool_maxsize=10):
+        """List of (compiled url regular expression, HTTPAdapter) for the overrides, in order"""
+        return [
+            (pattern, HTTPAdapter(max_retries=self.retry(**settings), pool_maxsize=int(pool_maxsize)))
+            for pattern, settings in self.overrides
+        ]
+
@@ -4,6 +4,8 @@ import json
 from operator import itemgetter
 import urllib.parse
 
+from .Utils import link_index
+
 logger = logging.getLogger(__name__)
 
 def _get_role_url(self):
@@ -16,11 +18,7 @@ def get_roles(self, parameters={}):
 
 def get_roles_url_from_user_or_group(self, user_or_group):
     # Given a user or user group object, return the 'roles' url
-    roles_url = None
-    for endpoint in user_or_group['_meta']['links']:
-        if endpoint['rel'] == "roles":
-            roles_url = endpoint['href']
-    return roles_url
+    return link_index.get(user_or_group, 'roles')
 
 def get_roles_for_user_or_group(self, user_or_group):
     roles_url = self.get_roles_url_from_user_or_group(user_or_group)
@@ -0,0 +1,345 @@
+"""
+Bulk transfer of scan files
+
+ScanUploader sends many scan files (.bdio, .json/.jsonld) to /api/scan/data concurrently.
+Each file is streamed from disk rather than read into memory, retried on its own when it
+fails (successful files are never sent again), and counted in a TransferReport with
+per-file timings and overall throughput. With a checkpoint store, a run that is started
+again skips the files a previous run already uploaded.
+
+ScanDownloader fetches the scan files (enclosure / scan-data links of codelocations) of a
+version, or of the whole server, the same way: concurrently, in 1 MiB chunks, checking
+the length received. Files already present with the size the server reports are skipped,
+and partial files (.part) left by an interrupted run are resumed with Range requests.
+
+Usage:
+
+    from blackduck.Checkpoint import SqliteCheckpointStore
+    from blackduck.ScanTransfer import ScanUploader
+
+    uploader = ScanUploader(bd, max_workers=8, store=SqliteCheckpointStore("uploads.sqlite"),
+                            progress=lambda path, sent, total: print(path, sent, total))
+    report = uploader.upload(glob.glob("scans/*.bdio"))
+    print(f"{len(report.succeeded)} uploaded, {len(report.failed)} failed, {report.throughput / 1e6:.1f} MB/s")
+
+    report = ScanDownloader(bd, "backup", max_workers=8).download_all()
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    '.json': "application/ld+json",
+    '.jsonld': "application/ld+json",
+    '.bdio': "application/vnd.blackducksoftware.bdio+zip",
+}
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+SCAN_RELS = ('enclosure', 'scan-data')
+CHUNK_SIZE = 1024 * 1024
+
+
+class IncompleteDownload(requests.RequestException):
+    """The body received does not have the announced length; retried like network errors"""
+
+
+class TransferResult:
+    """Outcome of the transfer of one file"""
+
+    __slots__ = ('path', 'ok', 'skipped', 'bytes', 'seconds', 'attempts', 'error')
+
+    def __init__(self, path, ok=False, skipped=False, bytes=0, seconds=0.0, attempts=0, error=None):
+        self.path = path
+        self.ok = ok
+        self.skipped = skipped
+        self.bytes = bytes
+        self.seconds = seconds
+        self.attempts = attempts
+        self.error = error
+
+    def __repr__(self):
+        outcome = "skipped" if self.skipped else "ok" if self.ok else f"failed ({self.error})"
+        return f"TransferResult({self.path}, {outcome}, {self.bytes} bytes, {self.attempts} attempts)"
+
+
+class TransferReport:
+    """Per-file results and totals of a bulk transfer"""
+
+    def __init__(self, results, seconds):
+        self.results = results
+        self.seconds = seconds
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.ok and not r.skipped]
+
+    @property
+    def skipped(self):
+        return [r for r in self.results if r.skipped]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def bytes(self):
+        return sum(r.bytes for r in self.results if not r.skipped)
+
+    @property
+    def throughput(self):
+        """Bytes per second over the whole transfer"""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+class _ProgressReader:
+    """File object reporting the bytes read from it; sized so requests sends a Content-Length"""
+
+    def __init__(self, f, size, callback):
+        self.f = f
+        self.size = size
+        self.sent = 0
+        self.callback = callback
+
+    def __len__(self):
+        return self.size - self.sent
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sent += len(data)
+        if self.callback is not None and data:
+            self.callback(len(data))
+        return data
+
+
+def _retrying(result, attempt, retries, backoff, action):
+    """Call attempt() until it returns a successful response, recording the outcome in result
+
+    Network errors and 429/5xx responses are retried up to retries times with exponential
+    backoff; other errors fail at once. attempt() may raise OSError for local failures.
+    """
+    start = time.monotonic()
+    while True:
+        result.attempts += 1
+        try:
+            response = attempt()
+            if response.ok:
+                result.ok = True
+                break
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+            retryable = response.status_code in RETRY_STATUS_CODES
+        except (requests.RequestException, OSError) as err:
+            error = str(err)
+            retryable = isinstance(err, requests.RequestException)
+        if not retryable or result.attempts > retries:
+            result.error = error
+            logger.error(f"{action} of {result.path} failed after {result.attempts} attempts: {error}")
+            break
+        wait = backoff * 2 ** (result.attempts - 1)
+        logger.warning(f"{action} of {result.path} failed ({error}), retrying in {wait}s")
+        time.sleep(wait)
+    result.seconds = time.monotonic() - start
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+class ScanUploader:
+    """Concurrent, streamed, individually retried upload of scan files"""
+
+    def __init__(self, bd, max_workers=4, retries=3, backoff=2.0, progress=None, store=None,
+                 url="/api/scan/data/?mode=replace"):
+        """
+        Args:
+            bd (blackduck.Client): client to upload with
+            max_workers (int): files uploaded concurrently. Defaults to 4.
+            retries (int): further attempts for a file after a network error or a 429/5xx. Defaults to 3.
+            backoff (float): seconds before the first retry of a file, doubled for each next one. Defaults to 2.
+            progress (callable): progress(path, bytes sent, total bytes), called as data is sent
+                and from several threads. Defaults to None.
+            store (FileCheckpointStore/SqliteCheckpointStore): remembers uploaded files (by path, size and
+                modification time) so they are skipped by later runs. Defaults to None.
+            url (str): upload endpoint. Defaults to "/api/scan/data/?mode=replace".
+        """
+        self.bd = bd
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.progress = progress
+        self.store = store
+        self.url = url
+        self._lock = threading.Lock()
+
+    def upload(self, paths):
+        """Upload the files, returning once every one succeeded or ran out of attempts
+
+        Args:
+            paths (iterable(str)): scan files; the extension selects the Content-Type
+
+        Returns:
+            TransferReport: with one TransferResult per path, in order
+        """
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self._upload_file, paths))
+        report = TransferReport(results, time.monotonic() - start)
+        logger.info(f"uploaded {len(report.succeeded)} files ({report.bytes} bytes, "
+                    f"{report.throughput / 1e6:.2f} MB/s), skipped {len(report.skipped)}, "
+                    f"failed {len(report.failed)}")
+        return report
+
+    def _upload_file(self, path):
+        result = TransferResult(path)
+        content_type = CONTENT_TYPES.get(os.path.splitext(path)[1].lower())
+        if content_type is None:
+            result.error = f"unknown scan file type: {path}"
+            logger.error(result.error)
+            return result
+        key = _file_key(path)
+        if self.store is not None and self.store.get(key) is not None:
+            result.ok = result.skipped = True
+            return result
+
+        size = os.path.getsize(path)
+        _retrying(result, lambda: self._send(path, size, content_type), self.retries, self.backoff, "upload")
+        if result.ok:
+            result.bytes = size
+        if result.ok and self.store is not None:
+            with self._lock:
+                self.store.set(key, size)
+        return result
+
+    def _send(self, path, size, content_type):
+        sent = [0]
+
+        def callback(count):
+            sent[0] += count
+            self.progress(path, sent[0], size)
+
+        with open(path, "rb") as f:
+            body = _ProgressReader(f, size, callback if self.progress else None)
+            return self.bd.session.post(self.url, data=body, headers={'Content-Type': content_type})
+
+
+def scan_filename(url):
+    """Local file name for a scan url: its last path segment, qualified by the one before when generic"""
+    segments = [unquote(segment) for segment in urlparse(url).path.split("/") if segment]
+    name = segments[-1]
+    if name in SCAN_RELS and len(segments) > 1:
+        name = f"{segments[-2]}-{name}"
+    return name
+
+
+class ScanDownloader:
+    """Concurrent, chunked, resumable download of scan files"""
+
+    def __init__(self, bd, directory, max_workers=4, retries=3, backoff=2.0, progress=None):
+        """
+        Args:
+            bd (blackduck.Client): client to download with
+            directory (str): where the scan files are written, created if missing
+            max_workers (int): files downloaded concurrently. Defaults to 4.
+            retries (int): further attempts for a file after a network error, a 429/5xx or a short
+                body. Defaults to 3.
+            backoff (float): seconds before the first retry of a file, doubled for each next one. Defaults to 2.
+            progress (callable): progress(path, bytes received, total bytes or None), called as data
+                is received and from several threads. Defaults to None.
+        """
+        self.bd = bd
+        self.directory = directory
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.progress = progress
+        os.makedirs(directory, exist_ok=True)
+
+    def scan_urls(self, codelocations):
+        """Urls of the scan files of codelocations, in order and without duplicates"""
+        urls = dict()
+        for codelocation in codelocations:
+            resources = self.bd.list_resources(codelocation)
+            for rel in SCAN_RELS:
+                if rel in resources:
+                    urls[resources[rel]] = None
+        return list(urls)
+
+    def download_version(self, version):
+        """Download the scan files of every codelocation mapped to a project version"""
+        return self.download(self.scan_urls(self.bd.get_resource('codelocations', version)))
+
+    def download_all(self):
+        """Download the scan files of every codelocation mapped to any project version"""
+        codelocations = (codelocation for _, _, codelocation in
+                         self.bd.walk("projects/versions/codelocations", max_workers=self.max_workers))
+        return self.download(self.scan_urls(codelocations))
+
+    def download(self, urls):
+        """Download scan files by url, returning once every one succeeded or ran out of attempts
+
+        Returns:
+            TransferReport: with one TransferResult per url, in order
+        """
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self._download_file, urls))
+        report = TransferReport(results, time.monotonic() - start)
+        logger.info(f"downloaded {len(report.succeeded)} files ({report.bytes} bytes, "
+                    f"{report.throughput / 1e6:.2f} MB/s), skipped {len(report.skipped)}, "
+                    f"failed {len(report.failed)}")
+        return report
+
+    def _download_file(self, url):
+        path = os.path.join(self.directory, scan_filename(url))
+        result = TransferResult(path)
+        if os.path.exists(path):
+            try:
+                head = self.bd.session.head(url, allow_redirects=True)
+                length = head.headers.get('Content-Length') if head.ok else None
+            except requests.RequestException:
+                length = None
+            if length is not None and int(length) == os.path.getsize(path):
+                result.ok = result.skipped = True
+                return result
+        _retrying(result, lambda: self._fetch(url, path, result), self.retries, self.backoff, "download")
+        return result
+
+    def _fetch(self, url, path, result):
+        part = path + ".part"
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': f"bytes={offset}-"} if offset else {}
+        with self.bd.session.get(url, headers=headers, stream=True) as r:
+            if r.status_code == 416:
+                # the partial file does not match what the server has now: start over
+                os.remove(part)
+                raise IncompleteDownload(f"range {offset}- not satisfiable, restarting")
+            if not r.ok:
+                return r
+            content_range = re.match(r"bytes (\d+)-\d+/(\d+)", r.headers.get('Content-Range', ""))
+            if r.status_code == 206 and content_range and int(content_range.group(1)) == offset:
+                mode, expected = "ab", int(content_range.group(2))
+            else:
+                # the server sent the whole file
+                offset = 0
+                length = r.headers.get('Content-Length')
+                mode, expected = "wb", int(length) if length and 'Content-Encoding' not in r.headers else None
+            received = offset
+            with open(part, mode) as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    received += len(chunk)
+                    result.bytes += len(chunk)
+                    if self.progress is not None:
+                        self.progress(path, received, expected)
+        if expected is not None and received != expected:
+            raise IncompleteDownload(f"received {received} of {expected} bytes")
+        os.replace(part, path)
+        return r
@@ -0,0 +1,252 @@
+"""
+Wait for many scans / BOM computations at once
+
+Waiting for a scan to be processed is usually a sleep loop per codelocation or version,
+each polling at a fixed interval. A ScanWaiter watches any number of them from one
+background loop: every watch is checked on a shared thread pool, watches whose state did
+not change are checked less and less often (from min_interval up to max_interval) and
+each watch is a concurrent.futures.Future resolving when processing is done.
+
+    * watch_codelocation: the latest scan of the codelocation reached scanState SUCCESS
+      (resolves to the scan summary) or FAILURE (raises ScanFailed)
+    * watch_version: the version's bom-status is UP_TO_DATE (resolves to the bom-status)
+      or *_WITH_ERRORS (raises ScanFailed)
+
+Both take an optional 'since' (ISO 8601 string or datetime) so an older, already complete
+scan or BOM does not count. A watch that is not done within timeout raises TimeoutError.
+
+watch(check) polls any other condition the same way, e.g. report generation (see ReportManager).
+
+Usage:
+
+    from concurrent.futures import wait
+    from blackduck.ScanWaiter import ScanWaiter
+
+    with ScanWaiter(bd, timeout=3600) as waiter:
+        futures = [waiter.watch_version(version, since=upload_time) for version in versions]
+        for future in wait(futures).done:
+            print(future.result()['status'])
+"""
+
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from datetime import datetime
+import functools
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+import requests
+
+from .Exceptions import ScanFailed
+from .Notifications import iso8601
+
+logger = logging.getLogger(__name__)
+
+SCAN_SUCCESS = ('SUCCESS', 'COMPLETE')
+SCAN_FAILURE = ('FAILURE', 'ERROR', 'CANCELLED')
+BOM_SUCCESS = ('UP_TO_DATE',)
+BOM_FAILURE = ('UP_TO_DATE_WITH_ERRORS', 'PROCESSING_WITH_ERRORS')
+
+
+class _Watch:
+    """One thing being waited for, with its own adaptive polling interval"""
+
+    def __init__(self, check, interval, deadline):
+        self.check = check  # callable returning (done, result, state)
+        self.interval = interval
+        self.deadline = deadline
+        self.state = None
+        self.future = Future()
+
+
+class ScanWaiter:
+    """Single background poll loop resolving futures as scans and BOM computations complete"""
+
+    def __init__(self, bd, min_interval=5.0, max_interval=60.0, backoff=1.5, timeout=3600.0, max_workers=8):
+        """
+        Args:
+            bd (blackduck.Client): client to poll with
+            min_interval (float): seconds between checks of a watch whose state just changed. Defaults to 5.
+            max_interval (float): cap on the seconds between checks of a watch. Defaults to 60.
+            backoff (float): interval multiplier after a check without change. Defaults to 1.5.
+            timeout (float): seconds after which a watch fails with TimeoutError. Defaults to 3600.
+            max_workers (int): checks run concurrently. Defaults to 8.
+        """
+        self.bd = bd
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._schedule = []  # heap of (next check time, sequence, watch)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ScanWaiter", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop polling; watches still pending are cancelled"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        with self._condition:
+            for _, _, watch in self._schedule:
+                watch.future.cancel()
+        self._executor.shutdown()
+
+    def _url(self, obj_or_url):
+        return obj_or_url if isinstance(obj_or_url, str) else obj_or_url['_meta']['href']
+
+    def watch_codelocation(self, codelocation, since=None):
+        """Future resolving to the latest scan summary of codelocation once it is processed
+
+        Args:
+            codelocation (dict/str): codelocation object or url
+            since (str/datetime): ignore scans created before this. Defaults to None.
+
+        Returns:
+            concurrent.futures.Future: result is the scan summary (dict); raises ScanFailed or TimeoutError
+        """
+        codelocation_url = self._url(codelocation)
+        since = iso8601(since) if isinstance(since, datetime) else since
+
+        def check():
+            codelocation = self.bd.get_json(codelocation_url)
+            latest_scan_url = self.bd.list_resources(codelocation).get('latest-scan')
+            if latest_scan_url is None:
+                return False, None, 'NO_SCAN'
+            scan = self.bd.get_json(latest_scan_url)
+            state = scan.get('scanState') or scan.get('status')
+            if since is not None and scan.get('createdAt', '') < since:
+                return False, None, 'WAITING_FOR_NEW_SCAN'
+            if state in SCAN_FAILURE:
+                raise ScanFailed(f"scan of {codelocation.get('name')} {state}: {scan.get('statusMessage')}")
+            return state in SCAN_SUCCESS, scan, state
+
+        return self.watch(check)
+
+    def watch_version(self, version, since=None):
+        """Future resolving to the bom-status of version once its BOM is computed
+
+        Args:
+            version (dict/str): project version object or url
+            since (str/datetime): ignore BOMs last updated before this. Defaults to None.
+
+        Returns:
+            concurrent.futures.Future: result is the bom-status (dict); raises ScanFailed or TimeoutError
+        """
+        bom_status_url = self._url(version) + "/bom-status"
+        since = iso8601(since) if isinstance(since, datetime) else since
+
+        def check():
+            bom_status = self.bd.get_json(bom_status_url)
+            state = bom_status.get('status')
+            if since is not None and (bom_status.get('lastBomUpdateDate') or '') < since:
+                return False, None, f"{state} (before {since})"
+            if state in BOM_FAILURE:
+                raise ScanFailed(f"BOM of {bom_status_url} {state}")
+            return state in BOM_SUCCESS, bom_status, state
+
+        return self.watch(check)
+
+    def watch(self, check):
+        """Poll check() from the shared loop until it reports done
+
+        Args:
+            check (callable): returns (done, result, state); state is any comparable value used to
+                detect progress for the adaptive interval. A requests.RequestException it raises
+                is logged and the check retried; any other exception fails the future.
+
+        Returns:
+            concurrent.futures.Future: resolving to result
+        """
+        now = time.monotonic()
+        watch = _Watch(check, self.min_interval, now + self.timeout)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("ScanWaiter is closed")
+            heapq.heappush(self._schedule, (now, next(self._sequence), watch))
+            self._condition.notify()
+        return watch.future
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    wait = self._schedule[0][0] - time.monotonic() if self._schedule else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                if self._closed:
+                    return
+                # every watch due now is checked in this round
+                now = time.monotonic()
+                due = []
+                while self._schedule and self._schedule[0][0] <= now:
+                    due.append(heapq.heappop(self._schedule)[2])
+            for watch in due:
+                if not watch.future.cancelled():
+                    # settled as each check returns: a slow one holds up no other watch, nor this loop
+                    outcome = self._executor.submit(watch.check)
+                    outcome.add_done_callback(functools.partial(self._settled, watch))
+
+    def _settled(self, watch, outcome):
+        try:
+            self._settle(watch, outcome)
+        except Exception as err:
+            # one broken watch must not affect the others
+            logger.exception(f"unable to settle watch: {err}")
+            _resolve(watch.future, exception=err)
+
+    def _settle(self, watch, outcome):
+        try:
+            done, result, state = outcome.result()
+        except requests.RequestException as err:
+            # the server may be busy processing what we wait for: keep polling
+            logger.warning(f"check failed ({err}), will retry")
+            done, result, state = False, None, watch.state
+        except Exception as err:
+            _resolve(watch.future, exception=err)
+            return
+        if watch.future.cancelled():
+            return  # cancelled by the caller while being checked
+        if done:
+            _resolve(watch.future, result)
+            return
+        now = time.monotonic()
+        if now >= watch.deadline:
+            _resolve(watch.future, exception=TimeoutError(f"still {state} after {self.timeout} seconds"))
+            return
+        if state != watch.state:
+            logger.debug(f"state changed to {state}")
+            watch.interval = self.min_interval
+        else:
+            watch.interval = min(self.max_interval, watch.interval * self.backoff)
+        watch.state = state
+        with self._condition:
+            if self._closed:
+                watch.future.cancel()  # checked while closing
+                return
+            heapq.heappush(self._schedule, (min(now + watch.interval, watch.deadline), next(self._sequence), watch))
+            self._condition.notify()
+
+
+def _resolve(future, result=None, exception=None):
+    """Set the outcome of future unless the caller cancelled it meanwhile"""
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
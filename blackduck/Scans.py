@@ -1,9 +1,10 @@
 import logging
-import requests
 import json
 from operator import itemgetter
 import urllib.parse
 
+from .Utils import link_index
+
 logger = logging.getLogger(__name__)
 
 def upload_scan(self, filename):
@@ -12,11 +13,11 @@ def upload_scan(self, filename):
     if filename.endswith('.json') or filename.endswith('.jsonld'):
         headers['Content-Type'] = 'application/ld+json'
         with open(filename,"rb") as f:
-            response = requests.post(url, headers=headers, data=f, verify=not self.config['insecure'])
+            response = self.session.post(url, headers=headers, data=f)
     elif filename.endswith('.bdio'):
         headers['Content-Type'] = 'application/vnd.blackducksoftware.bdio+zip'
         with open(filename,"rb") as f:
-            response = requests.post(url, headers=headers, data=f, verify=not self.config['insecure'])
+            response = self.session.post(url, headers=headers, data=f)
     else:
         raise Exception("Unkown file type")
     return response
@@ -32,10 +33,8 @@ def download_project_scans(self, project_name,version_name, output_folder=None):
     result = []
     
     for item in codelocations['items']:
-        links = item['_meta']['links']
-        matches = [x for x in links if x['rel'] == 'enclosure' or x['rel'] == 'scan-data']
-        for m in matches:
-            url = m['href']
+        links = link_index.links(item)
+        for url in [links[rel] for rel in ('enclosure', 'scan-data') if rel in links]:
             filename = url.split('/')[6]
             if output_folder:
                 pathname = os.path.join(output_folder, filename)
@@ -43,9 +42,9 @@ def download_project_scans(self, project_name,version_name, output_folder=None):
                 if not os.path.exists(project_name):
                     os.mkdir(project_name)
                 pathname = os.path.join(project_name, filename)
-            responce = requests.get(url, headers=self.get_headers(), stream=True, verify=not self.config['insecure'])
+            responce = self.session.get(url, headers=self.get_headers(), stream=True)
             with open(pathname, "wb") as f:
-                for data in responce.iter_content():
+                for data in responce.iter_content(chunk_size=1024 * 1024):
                     f.write(data)
             result.append({filename, pathname})
     return result
@@ -56,7 +55,7 @@ def get_codelocations(self, limit=100, unmapped=False, parameters={}):
     headers = self.get_headers()
     url = self.get_apibase() + "/codelocations" + paramstring
     headers['Accept'] = 'application/vnd.blackducksoftware.scan-4+json'
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     if unmapped:
         jsondata['items'] = [s for s in jsondata['items'] if 'mappedProjectVersion' not in s]
@@ -69,7 +68,7 @@ def get_codelocations_internal(self, limit=100, unmapped=False, parameters={}):
     headers = self.get_headers()
     url = self.get_apibase() + "/codelocations" + paramstring
     headers['Accept'] = 'application/vnd.blackducksoftware.internal-1+json'
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     if unmapped:
         jsondata['items'] = [s for s in jsondata['items'] if 'mappedProjectVersion' not in s]
@@ -90,7 +89,7 @@ def get_codelocation_scan_summaries(self, code_location_id = None, code_location
     else:
         url = self.get_apibase() + \
             "/codelocations/{}/scan-summaries".format(code_location_id)
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
 
@@ -106,13 +105,13 @@ def delete_unmapped_codelocations(self, limit=1000):
 def delete_codelocation(self, locationid):
     url = self.config['baseurl'] + "/api/codelocations/" + locationid
     headers = self.get_headers()
-    response = requests.delete(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.delete(url, headers=headers)
     return response
     
 def get_scan_locations(self, code_location_id):
     headers = self.get_headers()
     headers['Accept'] = 'application/vnd.blackducksoftware.scan-4+json'
     url = self.get_apibase() + "/codelocations/{}".format(code_location_id)
-    response = requests.get(url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.get(url, headers=headers)
     jsondata = response.json()
     return jsondata
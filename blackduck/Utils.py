@@ -9,7 +9,10 @@ from datetime import datetime, timedelta
 import dateutil.parser
 import json
 import logging
+from pprint import pformat
 import re
+import sys
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -106,6 +109,127 @@ def get_resource_name(obj):
         return part
     
 
+class LinkIndex:
+    """Side table of object href -> links dict (rel -> href, plus 'href' for the object itself)
+
+    Finding a link by scanning ['_meta']['links'] is linear in the number of links, and the
+    same object is usually searched again and again in inner loops. The index builds the
+    dict once per object, keyed by the object's href so the objects themselves are left
+    untouched, and keeps the last max_entries of them. Each entry remembers the links list
+    it was built from: a copy of the object fetched again (new links list) is indexed anew,
+    so links added or removed on the server are never served stale.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(obj):
+        """Build the links dict of obj from its ['_meta']['links'] (or compact ['_meta']['rels'])
+
+        Raises:
+            TypeError: obj has no ['_meta']['links']
+        """
+        rels = safe_get(obj, '_meta', 'rels')
+        if rels is not None:
+            # compact form produced by Client.get_items(..., fields=[...])
+            return dict(rels, href=safe_get(obj, '_meta', 'href'))
+        links = safe_get(obj, '_meta', 'links')
+        try:
+            rel_href_pairs = iter(links)
+        except TypeError:
+            logger.error("unable to list links of object (missing ['_meta']['links']):")
+            logger.error(pformat(obj))
+            raise
+        links_dict = {}
+        for link in rel_href_pairs:
+            if 'rel' in link and 'href' in link:
+                # the first link of a rel wins, as when scanning the list
+                links_dict.setdefault(link['rel'], link['href'])
+        # save url to the object itself if available, otherwise save 'href': None
+        links_dict['href'] = safe_get(obj, '_meta', 'href')
+        return links_dict
+
+    def links(self, obj):
+        """Links dict of obj, built on first use
+
+        Args:
+            obj (dict): blackduck object with ['_meta']['links']
+
+        Returns:
+            dict(str -> str): rel -> href, plus 'href' for the object itself
+        """
+        try:
+            meta = obj['_meta']
+            href = meta['href']
+        except (KeyError, TypeError):
+            return self.build(obj)
+        source = self._source(meta)
+        # lock-free read: a dict lookup is atomic, only inserts and evictions are serialized
+        entry = self._entries.get(href)
+        if entry is None or entry[0] is not source:
+            entry = (source, self.build(obj))
+            with self._lock:
+                self._entries.pop(href, None)
+                self._entries[href] = entry
+                if len(self._entries) > self.max_entries:
+                    # evict the oldest entry (dicts keep insertion order)
+                    del self._entries[next(iter(self._entries))]
+        return entry[1]
+
+    def get(self, obj, rel):
+        """Url of link rel of obj, or None"""
+        try:
+            # hot path of inner loops: one call, no lock
+            meta = obj['_meta']
+            source, links_dict = self._entries[meta['href']]
+            if source is not self._source(meta):
+                links_dict = self.links(obj)
+        except (KeyError, TypeError):
+            links_dict = self.links(obj)
+        return links_dict.get(rel)
+
+    @staticmethod
+    def _source(meta):
+        """The list (or compact dict) the links dict of an object is built from"""
+        rels = meta.get('rels')
+        return meta.get('links') if rels is None else rels
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# shared by the HubInstance methods; each Client has its own
+link_index = LinkIndex()
+
+
+def project_item(obj, fields):
+    """Utility function to slim a blackduck object down to the given fields.
+       ['_meta'] is kept in a compact form: its href and a rel -> href dict ('rels')
+       replacing the much larger list of links. Repeated strings are interned.
+
+    Args:
+        obj (dict): blackduck object to slim down
+        fields (iterable(string)): top-level keys to keep
+
+    Returns:
+        dict: new object with only the requested keys and the compact ['_meta']
+    """
+    slim = {key: obj[key] for key in fields if key in obj}
+    meta = obj.get('_meta')
+    if meta is not None:
+        href = meta.get('href')
+        rels = {}
+        for link in meta.get('links', []):
+            if 'rel' in link and 'href' in link:
+                # the first link of a rel wins, as in LinkIndex.build
+                rels.setdefault(sys.intern(link['rel']), sys.intern(link['href']))
+        slim['_meta'] = {'href': sys.intern(href) if href else href, 'rels': rels}
+    return slim
+
 def pfmt(value):
     """Utility function to 'pretty format' a dict or json 
 
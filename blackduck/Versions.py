@@ -1,5 +1,4 @@
 import logging
-import requests
 import json
 from operator import itemgetter
 import urllib.parse
@@ -19,7 +18,7 @@ def add_version_as_component(self, main_project_release, sub_project_release):
     payload = {}
     payload['component'] = sub_project_release_as_custom_component_url
     logger.debug(json.dumps(payload))
-    response = requests.post(main_project_release_component_link, headers=headers, verify = not self.config['insecure'], json=payload)
+    response = self.session.post(main_project_release_component_link, headers=headers, json=payload)
     logger.debug(response)
     return response
 
@@ -35,5 +34,5 @@ def remove_version_as_component(self, main_project_release, sub_project_release)
     logger.debug(main_project_release_component_link)
     subcomponent_url = main_project_release_component_link + "/" + sub_data[5] + "/versions/" + sub_data[7]
     logger.debug(subcomponent_url)
-    response = requests.delete(subcomponent_url, headers=headers, verify = not self.config['insecure'])
+    response = self.session.delete(subcomponent_url, headers=headers)
     return response
@@ -1,3 +1,4 @@
 
 from .HubRestApi import HubInstance
 from .Client import Client
+from .AsyncClient import AsyncClient
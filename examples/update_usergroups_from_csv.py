@@ -41,9 +41,10 @@ import argparse
 import sys
 import json
 import traceback
-from requests import HTTPError, RequestException
+from requests import HTTPError
 
 from blackduck import Client
+from blackduck.Bulk import BulkMutator, plan
 
 def log_config():
     logging.basicConfig(format='%(asctime)s:%(levelname)s:%(module)s: %(message)s', stream=sys.stderr, level=logging.DEBUG)
@@ -55,6 +56,7 @@ def parse_parameter():
     parser = argparse.ArgumentParser("Bulk update user groups from CSV file - modifies the name of the user groups given the existing name and new name")
     parser.add_argument("CSV", help="Location of the CSV file")
                     # "CSV File requires two columns titled 'Existing' and 'New'",
+    parser.add_argument("--dry-run", action='store_true', help="Only print the changes that would be made")
     return parser.parse_args()
 
 def get_user_group_by_name(hub_client, name):
@@ -63,50 +65,34 @@ def get_user_group_by_name(hub_client, name):
     }
     for user_group in hub_client.get_items("/api/usergroups", params=params):
         if user_group['name'] == name:
-            user_url = hub_client.list_resources(user_group)['href']
             print(f"Found user group: {name}")
             return user_group
     
 
-def read_csv(hub_client, csv_path):
-    updated = 0
-    failed = 0
-    not_found = 0
+def read_csv(hub_client, csv_path, dry_run=False):
+    desired = dict()
     with open(csv_path, newline='') as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
-            existing_name = (row['Existing'])
-            new_name = (row['New'])
-            try:
-                user = get_user_group_by_name(hub_client, existing_name)
-                if user:
-                    update_user_group(hub_client, existing_name, new_name, user)
-                    updated += 1
-                else:
-                    logging.info(f"User group {existing_name} was not found")
-                    not_found += 1
-            except RequestException as err:
-                logging.error(f"Failed to update user group {existing_name}. Reason is " + str(err))
-                failed += 1
-            except Exception as err:
-                raise err
-
-        logging.info(f"------------------------------")
-        logging.info(f"Execution complete.")
-        logging.info(f"{updated} user groups updated")
-        logging.info(f"{not_found} user groups were not found")
-        logging.info(f"{failed} user groups failed to update")
-
-def update_user_group(hub_client, existing_name, new_name, user_group):
-    user_group_url = hub_client.list_resources(user_group)['href']
-
-    # Update the name.
-    user_group['name'] = new_name
-    #if user_group.get('externalGroupName') and user['externalGroupName'] == name:
-    user_group['externalName'] = new_name
-
-    logging.info(f"Updating user group {existing_name} to {user_group['name']} for user group {user_group_url}")
-    hub_client.session.put(user_group_url, json=user_group)
+            # Update the name.
+            desired[row['Existing']] = {'name': row['New'], 'externalName': row['New']}
+
+    # user groups that already match their row are not PUT again
+    groups_plan = plan(desired, lambda name: get_user_group_by_name(hub_client, name))
+    for line in groups_plan.describe():
+        logging.info(line)
+    if dry_run:
+        return
+
+    report = groups_plan.apply(BulkMutator(hub_client.session))
+    logging.info(f"------------------------------")
+    logging.info(f"Execution complete.")
+    logging.info(f"{len(report.succeeded)} user groups updated")
+    logging.info(f"{len(groups_plan.unchanged)} user groups were already up to date")
+    logging.info(f"{len(groups_plan.missing)} user groups were not found")
+    logging.info(f"{len(report.failed) + len(groups_plan.errors)} user groups failed to update")
+    for result in report.failed:
+        logging.error(f"Failed to update user group {result.operation.key}. Reason is {result.error}")
 
 
 def main():
@@ -121,7 +107,7 @@ def main():
                             timeout=15,
                             retries=3)
         
-        read_csv(hub_client, args.CSV)
+        read_csv(hub_client, args.CSV, args.dry_run)
     except HTTPError as err:
         hub_client.http_error_handler(err)
     except Exception as err:
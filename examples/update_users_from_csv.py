@@ -38,9 +38,10 @@ import argparse
 import sys
 import json
 import traceback
-from requests import HTTPError, RequestException
+from requests import HTTPError
 
 from blackduck import Client
+from blackduck.Bulk import BulkMutator, plan
 
 def log_config():
     logging.basicConfig(format='%(asctime)s:%(levelname)s:%(module)s: %(message)s', stream=sys.stderr, level=logging.DEBUG)
@@ -52,6 +53,7 @@ def parse_parameter():
     parser = argparse.ArgumentParser("Bulk update users from CSV file - modifies the email addresses of the users given the existing email and new email address")
     parser.add_argument("CSV", help="Location of the CSV file")
                     # "CSV File requires two columns titled 'Existing' and 'New'",
+    parser.add_argument("--dry-run", action='store_true', help="Only print the changes that would be made")
     return parser.parse_args()
 
 def get_user_by_email(hub_client, email):
@@ -60,54 +62,46 @@ def get_user_by_email(hub_client, email):
     }
     for user in hub_client.get_items("/api/users", params=params):
         if user['email'] == email:
-            user_url = hub_client.list_resources(user)['href']
             print(f"Found user: {email}")
             return user
     
 
-def read_csv(hub_client, csv_path):
-    updated = 0
-    failed = 0
-    not_found = 0
+def read_csv(hub_client, csv_path, dry_run=False):
+    desired = dict()
     with open(csv_path, newline='') as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
-            existing_email = (row['Existing'])
-            new_email = (row['New'])
-            try:
-                user = get_user_by_email(hub_client, existing_email)
-                if user:
-                    update_user(hub_client, existing_email, new_email, user)
-                    updated += 1
-                else:
-                    logging.info(f"User {existing_email} was not found")
-                    not_found += 1
-            except RequestException as err:
-                logging.error(f"Failed to update user {existing_email}. Reason is " + str(err))
-                failed += 1
-            except Exception as err:
-                raise err
-
-        logging.info(f"------------------------------")
-        logging.info(f"Execution complete.")
-        logging.info(f"{updated} users updated")
-        logging.info(f"{not_found} users were not found")
-        logging.info(f"{failed} users failed to update")
-
-def update_user(hub_client, existing_email, new_email, user):
-    user_url = hub_client.list_resources(user)['href']
-
-    # Update the email address.
-    user['email'] = new_email
-
-    # Not just update the email address.  If the email is also used as userName and externalUserName then update them too.
-    if user['userName'] == existing_email:
-        user['userName'] = new_email
-    if user.get('externalUserName') and user['externalUserName'] == existing_email:
-        user['externalUserName'] = new_email
-
-    logging.info(f"Updating user {existing_email} to {user['email']} for user {user_url}")
-    hub_client.session.put(user_url, json=user)
+            desired[row['Existing']] = updated_fields(row['Existing'], row['New'])
+
+    # users that already match their row are not PUT again
+    users_plan = plan(desired, lambda email: get_user_by_email(hub_client, email))
+    for line in users_plan.describe():
+        logging.info(line)
+    if dry_run:
+        return
+
+    report = users_plan.apply(BulkMutator(hub_client.session))
+    logging.info(f"------------------------------")
+    logging.info(f"Execution complete.")
+    logging.info(f"{len(report.succeeded)} users updated")
+    logging.info(f"{len(users_plan.unchanged)} users were already up to date")
+    logging.info(f"{len(users_plan.missing)} users were not found")
+    logging.info(f"{len(report.failed) + len(users_plan.errors)} users failed to update")
+    for result in report.failed:
+        logging.error(f"Failed to update user {result.operation.key}. Reason is {result.error}")
+
+def updated_fields(existing_email, new_email):
+    def fields(user):
+        # Update the email address.
+        updated = {'email': new_email}
+
+        # Not just update the email address.  If the email is also used as userName and externalUserName then update them too.
+        if user['userName'] == existing_email:
+            updated['userName'] = new_email
+        if user.get('externalUserName') and user['externalUserName'] == existing_email:
+            updated['externalUserName'] = new_email
+        return updated
+    return fields
 
 
 def main():
@@ -122,7 +116,7 @@ def main():
                             timeout=15,
                             retries=3)
         
-        read_csv(hub_client, args.CSV)
+        read_csv(hub_client, args.CSV, args.dry_run)
     except HTTPError as err:
         hub_client.http_error_handler(err)
     except Exception as err:
@@ -26,6 +26,13 @@ REQUIRED = [
     'requests', 'python-dateutil'
 ]
 
+# What packages are optional?
+EXTRAS = {
+    'async': ['aiohttp'],
+    'streaming': ['ijson'],
+    'yaml': ['PyYAML'],
+}
+
 # The rest you shouldn't have to touch too much :)
 # ------------------------------------------------
 # Except, perhaps the License and Trove Classifiers!
@@ -111,6 +118,7 @@ setup(
     #     'git+git://github.com/blackducksoftware/tortilla#egg=tortilla-0.5.1b'
     # ],
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     setup_requires=['pytest-runner'],
     tests_require=['pytest', 'requests-mock', 'pytest-datadir'],
     include_package_data=True,
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import asyncio
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from blackduck import AsyncClient
+
+
+def stub_app(total_count, calls):
+    """Minimal Black Duck stand-in: token auth, root resources and a paginated collection"""
+    app = web.Application()
+
+    async def authenticate(request):
+        assert request.headers['Authorization'] == "token theMadeUpAPIToken"
+        calls['authenticate'] += 1
+        return web.json_response(
+            {'bearerToken': "aBearerToken", 'expiresInMilliseconds': 7200000},
+            headers={'X-CSRF-TOKEN': "aCsrfToken"}
+        )
+
+    async def root(request):
+        return web.json_response({'projects': str(request.url.with_path("/api/projects")), '_meta': {}})
+
+    async def projects(request):
+        assert request.headers['authorization'] == "bearer aBearerToken"
+        offset = int(request.query.get('offset', 0))
+        limit = int(request.query.get('limit', 100))
+        items = [{'name': f"project-{i}"} for i in range(offset, min(offset + limit, total_count))]
+        return web.json_response({'totalCount': total_count, 'items': items})
+
+    app.router.add_post("/api/tokens/authenticate", authenticate)
+    app.router.add_get("/api/", root)
+    app.router.add_get("/api/projects", projects)
+    return app
+
+
+def test_async_client_get_resource():
+    calls = {'authenticate': 0}
+    app = stub_app(12, calls)
+
+    async def crawl():
+        async with TestServer(app) as server:
+            async with AsyncClient(token="theMadeUpAPIToken", base_url=str(server.make_url("/"))) as bd:
+                names = [p['name'] async for p in bd.get_resource('projects', page_size=5)]
+                metadata, _ = await asyncio.gather(bd.get_metadata('projects'), bd.get_metadata('projects'))
+                return names, metadata
+
+    names, metadata = asyncio.run(crawl())
+
+    assert names == [f"project-{i}" for i in range(12)]
+    assert metadata['totalCount'] == 12
+    assert calls['authenticate'] == 1
+
+
+def test_async_client_retries_only_idempotent_methods():
+    calls = {'authenticate': 0, 'GET': 0, 'POST': 0}
+    app = stub_app(0, calls)
+
+    async def flaky(request):
+        calls[request.method] += 1
+        return web.json_response({}, status=502 if calls[request.method] == 1 else 200)
+
+    app.router.add_get("/api/flaky", flaky)
+    app.router.add_post("/api/flaky", flaky)
+
+    async def call():
+        async with TestServer(app) as server:
+            async with AsyncClient(token="theMadeUpAPIToken", base_url=str(server.make_url("/"))) as bd:
+                bd.session.backoff_factor = 0
+                return (await bd.session.post("/api/flaky")).status, (await bd.session.get("/api/flaky")).status
+
+    assert asyncio.run(call()) == (502, 200)
+    assert calls['POST'] == 1  # not sent again: it may have created something already
+    assert calls['GET'] == 2
@@ -0,0 +1,870 @@
+#!/usr/bin/env python
+
+import json
+import pytest
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from requests.packages.urllib3.response import HTTPResponse
+
+from blackduck import Client
+from blackduck.Cache import MemoryCache, SqliteCache
+from blackduck.Checkpoint import FileCheckpointStore, SqliteCheckpointStore
+from blackduck.Models import BomComponent, Version
+from blackduck.Pagination import KeysetCursor
+from blackduck.RateLimit import AIMDLimiter, TokenBucket
+from blackduck.RetryPolicy import RetryBudget, RetryPolicy
+
+
+fake_hub_host = "https://my-hub-host"
+made_up_api_token = "theMadeUpAPIToken"
+
+
+@pytest.fixture()
+def client(requests_mock):
+    requests_mock.post(
+        "{}/api/tokens/authenticate".format(fake_hub_host),
+        json={'bearerToken': "aBearerToken", 'expiresInMilliseconds': 7200000},
+        headers={'X-CSRF-TOKEN': "aCsrfToken"}
+    )
+    yield Client(token=made_up_api_token, base_url=fake_hub_host)
+
+
+def paginated_items(total_count):
+    """Callback for requests_mock serving 'total_count' items honoring offset and limit"""
+    def callback(request, context):
+        query = parse_qs(urlparse(request.url).query)
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', ['100'])[0])
+        items = [{'name': f"item-{i}"} for i in range(offset, min(offset + limit, total_count))]
+        return {'totalCount': total_count, 'items': items}
+    return callback
+
+
+@pytest.mark.parametrize("total_count", [0, 7, 10, 23])
+def test_get_items_concurrently_preserves_order(client, requests_mock, total_count):
+    requests_mock.get("{}/api/things".format(fake_hub_host), json=paginated_items(total_count))
+
+    serial = [i['name'] for i in client.get_items("/api/things", page_size=5)]
+    concurrent = [i['name'] for i in client.get_items("/api/things", page_size=5, max_workers=3)]
+
+    assert concurrent == serial == [f"item-{i}" for i in range(total_count)]
+
+
+@pytest.mark.parametrize("make_cache", [
+    lambda tmp_path: MemoryCache(ttl=0),
+    lambda tmp_path: SqliteCache(str(tmp_path / "cache.sqlite"), ttl=0),
+])
+def test_cache_revalidates_with_etag(requests_mock, tmp_path, make_cache):
+    requests_mock.post(
+        "{}/api/tokens/authenticate".format(fake_hub_host),
+        json={'bearerToken': "aBearerToken", 'expiresInMilliseconds': 7200000},
+        headers={'X-CSRF-TOKEN': "aCsrfToken"}
+    )
+    bd = Client(token=made_up_api_token, base_url=fake_hub_host, cache=make_cache(tmp_path))
+    project_url = "{}/api/projects/1".format(fake_hub_host)
+    requests_mock.get(project_url, [
+        {'json': {'name': "a-project"}, 'headers': {'ETag': '"v1"'}},
+        {'status_code': 304},
+    ])
+
+    assert bd.get_json(project_url) == {'name': "a-project"}
+    assert bd.get_json(project_url) == {'name': "a-project"}
+    assert requests_mock.request_history[-1].headers['If-None-Match'] == '"v1"'
+
+
+def test_cache_serves_fresh_entries_and_invalidates_on_put(client, requests_mock):
+    client.session.cache = MemoryCache(ttl=300)
+    project_url = "{}/api/projects/1".format(fake_hub_host)
+    get = requests_mock.get(project_url, json={'name': "a-project"})
+    requests_mock.put(project_url)
+
+    client.get_json(project_url)
+    client.get_json(project_url)
+    assert get.call_count == 1
+
+    client.session.put(project_url, json={'name': "renamed"})
+    client.get_json(project_url)
+    assert get.call_count == 2
+
+
+@pytest.mark.parametrize("make_cache", [
+    lambda tmp_path: MemoryCache(ttl=300),
+    lambda tmp_path: SqliteCache(str(tmp_path / "cache.sqlite"), ttl=300),
+])
+def test_cache_invalidates_the_collection_of_a_deleted_item(client, requests_mock, tmp_path, make_cache):
+    client.session.cache = make_cache(tmp_path)
+    versions_url = "{}/api/projects/1/versions".format(fake_hub_host)
+    versions = [{'versionName': f"{v}.0", '_meta': {'href': f"{versions_url}/{v}"}} for v in range(2)]
+    listing = requests_mock.get(versions_url, json=lambda request, context: {'totalCount': len(versions),
+                                                                            'items': versions})
+    components = requests_mock.get(versions_url + "/1/components", json={'totalCount': 0, 'items': []})
+    requests_mock.delete(versions_url + "/1", status_code=204)
+
+    for _ in range(2):
+        client.get_json(versions_url + "?limit=100")
+        client.get_json(versions_url + "/1/components")
+    assert listing.call_count == components.call_count == 1
+
+    client.session.delete(versions_url + "/1")
+    del versions[1]
+    assert client.get_json(versions_url + "?limit=100")['totalCount'] == 1
+    client.get_json(versions_url + "/1/components")
+    assert listing.call_count == components.call_count == 2
+
+
+def test_coalesce_concurrent_identical_gets(client, requests_mock):
+    client.session.coalesce = True
+    component_url = "{}/api/components/1/versions/2".format(fake_hub_host)
+
+    def slow_component(request, context):
+        time.sleep(0.2)  # keep the request in flight while the other threads arrive
+        return {'componentName': "a-component"}
+    get = requests_mock.get(component_url, json=slow_component)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: client.get_json(component_url), range(8)))
+
+    assert get.call_count == 1
+    assert all(r == {'componentName': "a-component"} for r in results)
+
+
+def test_aimd_limiter_backs_off_on_throttling(client, requests_mock):
+    client.session.concurrency_limiter = AIMDLimiter(initial=8, minimum=1, maximum=16)
+    requests_mock.get("{}/api/busy".format(fake_hub_host), status_code=429)
+    requests_mock.get("{}/api/healthy".format(fake_hub_host), json={})
+
+    client.session.get("/api/busy")
+    assert client.session.concurrency_limiter.limit == 4
+
+    for _ in range(20):
+        client.session.get("/api/healthy")
+    assert client.session.concurrency_limiter.limit > 4
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_retry_policy_jitter_retry_after_and_budget():
+    budget = RetryBudget(ratio=0.5, min_retries=1)
+    retry = RetryPolicy(retries=5, backoff_factor=1, backoff_max=4, retry_after_max=30, budget=budget).retry()
+
+    unavailable = HTTPResponse(status=503, headers={'Retry-After': "600"}, preload_content=False)
+    assert retry.get_retry_after(unavailable) == 30
+
+    for _ in range(4):
+        retry = retry.increment('GET', "/api/projects", response=unavailable)
+    assert all(0 <= retry.get_backoff_time() <= 4 for _ in range(100))
+    assert len({retry.get_backoff_time() for _ in range(10)}) > 1
+
+    # 4 retries against 0 requests in the window exhaust the budget
+    assert not retry.is_retry('GET', 503)
+    for _ in range(10):
+        budget.record_request()
+    assert retry.is_retry('GET', 503)
+
+
+def test_retry_policy_endpoint_overrides():
+    policy = RetryPolicy(retries=3, overrides={r"/reports/": {'retries': 10}})
+    bd = Client(token=made_up_api_token, base_url=fake_hub_host, retry_policy=policy)
+
+    report_url = "{}/api/projects/1/versions/2/reports/3".format(fake_hub_host)
+    assert bd.session.get_adapter(report_url).max_retries.total == 10
+    assert bd.session.get_adapter("{}/api/projects".format(fake_hub_host)).max_retries.total == 3
+
+
+def keyset_items(notifications):
+    """Callback for requests_mock serving notifications sorted by createdAt and filtered by startDate"""
+    def callback(request, context):
+        query = parse_qs(urlparse(request.url).query)
+        assert query['sort'] == ["createdAt ASC"]
+        offset = int(query['offset'][0])
+        limit = int(query['limit'][0])
+        start = query.get('startDate', [""])[0]
+        matching = sorted((n for n in notifications if n['createdAt'] >= start), key=lambda n: n['createdAt'])
+        return {'totalCount': len(matching), 'items': matching[offset:offset + limit]}
+    return callback
+
+
+def test_get_items_by_key_resumes_without_duplicates(client, requests_mock):
+    notifications = [
+        {'createdAt': f"2024-01-0{day}T00:00:00.000Z", '_meta': {'href': f"n-{day}-{i}"}}
+        for day in range(1, 5) for i in range(3)
+    ]
+    requests_mock.get("{}/api/notifications".format(fake_hub_host), json=keyset_items(notifications))
+
+    cursor = KeysetCursor('createdAt')
+    first = [n['_meta']['href'] for _, n in zip(range(5), client.get_items_by_key("/api/notifications", cursor, page_size=2))]
+
+    notifications.append({'createdAt': "2024-01-09T00:00:00.000Z", '_meta': {'href': "n-9-0"}})
+    resumed = KeysetCursor.from_token(cursor.token)
+    rest = [n['_meta']['href'] for n in client.get_items_by_key("/api/notifications", resumed, page_size=2)]
+
+    assert first + rest == [n['_meta']['href'] for n in notifications]
+    assert resumed.out_of_order == 0
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda tmp_path: FileCheckpointStore(str(tmp_path / "checkpoints.json")),
+    lambda tmp_path: SqliteCheckpointStore(str(tmp_path / "checkpoints.sqlite")),
+])
+@pytest.mark.parametrize("max_workers", [None, 3])
+def test_get_items_resumes_from_checkpoint(client, requests_mock, tmp_path, make_store, max_workers):
+    requests_mock.get("{}/api/things".format(fake_hub_host), json=paginated_items(23))
+
+    crawl = client.get_items("/api/things", page_size=5, max_workers=max_workers, checkpoint=make_store(tmp_path))
+    interrupted = [next(crawl)['name'] for _ in range(12)]
+    crawl.close()  # e.g. the script crashed while handling the 13th item
+
+    # a new run, with a new store instance reading the same file
+    checkpoint = make_store(tmp_path)
+    resumed = [i['name'] for i in client.get_items("/api/things", page_size=5, max_workers=max_workers,
+                                                   checkpoint=checkpoint)]
+
+    assert interrupted == [f"item-{i}" for i in range(12)]
+    assert resumed == [f"item-{i}" for i in range(10, 23)]
+    assert checkpoint.get("/api/things") is None
+
+
+def resource(href, name, **links):
+    return {'name': name, '_meta': {'href': href, 'links': [{'rel': rel, 'href': url} for rel, url in links.items()]}}
+
+
+def test_walk_streams_project_version_component_tuples(client, requests_mock):
+    api = "{}/api".format(fake_hub_host)
+    requests_mock.get(api + "/", json={'projects': api + "/projects", '_meta': {'href': api + "/"}})
+    projects = []
+    for p in range(3):
+        project_url = f"{api}/projects/{p}"
+        projects.append(resource(project_url, f"project-{p}", versions=project_url + "/versions"))
+        versions = []
+        for v in range(2):
+            version_url = f"{project_url}/versions/{v}"
+            versions.append(resource(version_url, f"version-{v}", components=version_url + "/components"))
+            components = [resource(f"{version_url}/components/{c}", f"component-{c}") for c in range(2)]
+            requests_mock.get(version_url + "/components", json={'totalCount': 2, 'items': components})
+        requests_mock.get(project_url + "/versions", json={'totalCount': 2, 'items': versions})
+    requests_mock.get(api + "/projects", json={'totalCount': 3, 'items': projects})
+
+    tuples = client.walk("projects/versions/components", filters={'versions': lambda v: v['name'] == "version-1"},
+                         max_workers=4)
+
+    assert sorted((p['name'], v['name'], c['name']) for p, v, c in tuples) == [
+        (f"project-{p}", "version-1", f"component-{c}") for p in range(3) for c in range(2)
+    ]
+
+
+def test_get_items_streaming_matches_buffered(client, requests_mock):
+    pytest.importorskip("ijson")
+    requests_mock.get("{}/api/things".format(fake_hub_host), json=paginated_items(12))
+
+    streamed = list(client.get_items("/api/things", page_size=5, streaming=True))
+
+    assert streamed == list(client.get_items("/api/things", page_size=5))
+    assert len(streamed) == 12
+
+
+def test_get_items_fields_keeps_links_usable(client, requests_mock):
+    api = "{}/api".format(fake_hub_host)
+    project_url = api + "/projects/1"
+    project = dict(resource(project_url, "a-project", versions=project_url + "/versions"), description="x" * 1000)
+    requests_mock.get(api + "/projects", json={'totalCount': 1, 'items': [project]})
+    requests_mock.get(project_url + "/versions", json={'totalCount': 1, 'items': [{'versionName': "1.0"}]})
+
+    slim = next(client.get_items("/api/projects", fields=['name']))
+
+    assert slim == {'name': "a-project", '_meta': {'href': project_url, 'rels': {'versions': project_url + "/versions"}}}
+    assert [v['versionName'] for v in client.get_resource('versions', slim)] == ["1.0"]
+    assert '_hub_rest_api_python_resources_dict' not in slim
+    assert next(client.get_items("/api/projects", fields=['name'], projection=lambda p: p['name'])) == "a-project"
+
+
+def test_get_items_fields_resolves_duplicate_rels_like_full_objects(client, requests_mock):
+    from blackduck.Utils import LinkIndex
+    project_url = "{}/api/projects/1".format(fake_hub_host)
+    project = resource(project_url, "a-project", versions=project_url + "/versions")
+    project['_meta']['links'].append({'rel': "versions", 'href': project_url + "/other-versions"})
+    requests_mock.get("{}/api/projects".format(fake_hub_host), json={'totalCount': 1, 'items': [project]})
+
+    slim = next(client.get_items("/api/projects", fields=['name']))
+
+    assert slim['_meta']['rels']['versions'] == LinkIndex.build(project)['versions'] == project_url + "/versions"
+
+
+def test_models_intern_strings_and_index_links(client, requests_mock):
+    version_url = "{}/api/projects/1/versions/2".format(fake_hub_host)
+    components = [
+        dict(resource(f"{version_url}/components/{c}", None, vulnerabilities=f"{version_url}/components/{c}/vulns"),
+             componentName=f"component-{c}", policyStatus="".join(["NOT_IN_", "VIOLATION"]),
+             licenses=[{'licenseDisplay': "Apache License 2.0"}],
+             origins=[{'externalNamespace': "maven", 'externalId': f"org.example:component-{c}:1.0"}])
+        for c in range(3)
+    ]
+    requests_mock.get(version_url + "/components", json={'totalCount': 3, 'items': components})
+    requests_mock.get(version_url + "/components/1/vulns", json={'totalCount': 0, 'items': []})
+
+    models = list(client.get_items(version_url + "/components", projection=BomComponent.from_json))
+
+    assert [m.name for m in models] == ["component-0", "component-1", "component-2"]
+    assert models[0].policy_status is models[2].policy_status == "NOT_IN_VIOLATION"
+    assert models[1].licenses == ("Apache License 2.0",)
+    assert models[1].origins == (("maven", "org.example:component-1:1.0"),)
+    assert models[1].link('vulnerabilities') == version_url + "/components/1/vulns"
+    assert list(client.get_resource('vulnerabilities', models[1])) == []
+    assert not hasattr(models[0], '__dict__')
+    with pytest.raises(AttributeError):
+        models[0].raw
+    version = Version.from_json({'versionName': "1.0", '_meta': {'href': version_url}}, keep_raw=True)
+    assert version.raw['versionName'] == version.name == "1.0"
+
+
+def test_mirror_syncs_incrementally(client, requests_mock, tmp_path):
+    api = "{}/api".format(fake_hub_host)
+    requests_mock.get(api + "/", json={'projects': api + "/projects", '_meta': {'href': api + "/"}})
+    project_url = api + "/projects/1"
+    requests_mock.get(api + "/projects", json={'totalCount': 1, 'items': [
+        resource(project_url, "a-project", versions=project_url + "/versions")]})
+    versions = []
+    for v in range(2):
+        version_url = f"{project_url}/versions/{v}"
+        bom = {rel: f"{version_url}/{rel}" for rel in ('components', 'vulnerable-components', 'policy-status',
+                                                        'codelocations')}
+        versions.append(dict(resource(version_url, None, **bom), versionName=f"{v}.0",
+                             lastBomUpdateDate="2024-01-01T00:00:00.000Z"))
+        requests_mock.get(bom['components'], json={'totalCount': 1, 'items': [
+            dict(resource(f"{version_url}/components/1", None), componentName="a-component",
+                 policyStatus="IN_VIOLATION")]})
+        requests_mock.get(bom['vulnerable-components'], json={'totalCount': 0, 'items': []})
+        requests_mock.get(bom['policy-status'], json={'overallStatus': "IN_VIOLATION"})
+        requests_mock.get(bom['codelocations'], json={'totalCount': 0, 'items': []})
+    requests_mock.get(project_url + "/versions", json=lambda request, context: {'totalCount': len(versions),
+                                                                                'items': versions})
+    notifications = []
+    requests_mock.get(api + "/notifications", json=keyset_items(notifications))
+
+    from blackduck.Mirror import Mirror
+    with Mirror(client, str(tmp_path / "mirror.sqlite"), max_workers=2) as mirror:
+        assert mirror.sync() == {'projects': 1, 'versions': 2, 'refreshed': 2, 'deleted': 0}
+        assert mirror.sync()['refreshed'] == 0
+
+        versions[0]['lastBomUpdateDate'] = "2024-02-01T00:00:00.000Z"
+        notifications.append({'createdAt': "2999-01-01T00:00:00.000Z", '_meta': {'href': api + "/notifications/1"},
+                              'content': {'affectedProjectVersions': [{'projectVersion': versions[1]['_meta']['href']}]}})
+        assert mirror.sync()['refreshed'] == 2
+
+        versions[0]['settingUpdatedAt'] = "2024-03-01T00:00:00.000Z"  # e.g. phase changed, BOM did not
+        versions[0]['phase'] = "RELEASED"
+        assert mirror.sync()['refreshed'] == 1
+        assert [tuple(row) for row in mirror.query("SELECT phase FROM versions WHERE version_name = '0.0'")] == \
+            [("RELEASED",)]
+
+        del versions[1]
+        assert mirror.sync() == {'projects': 1, 'versions': 1, 'refreshed': 0, 'deleted': 1}
+        rows = mirror.query("SELECT project_name, version_name, component_name FROM components "
+                            "JOIN versions USING (version_href) WHERE policy_status = 'IN_VIOLATION'")
+        assert [tuple(row) for row in rows] == [("a-project", "0.0", "a-component")]
+
+
+def test_notification_stream_dispatches_new_notifications_once(client, requests_mock, tmp_path):
+    from blackduck.Notifications import BOM_COMPUTED, NotificationStream
+    notifications = [
+        {'createdAt': f"2024-01-01T00:00:0{i}.000Z", 'type': BOM_COMPUTED if i % 2 else "BOM_EDIT",
+         '_meta': {'href': f"n-{i}"}, 'content': {'projectVersion': f"v-{i}"}}
+        for i in range(5)
+    ]
+    requests_mock.get("{}/api/notifications".format(fake_hub_host), json=keyset_items(notifications))
+    make_stream = lambda: NotificationStream(client, store=FileCheckpointStore(str(tmp_path / "mark.json")),
+                                             start=datetime(2024, 1, 1), page_size=2)
+
+    computed, everything = [], []
+    stream = make_stream()
+    stream.on(BOM_COMPUTED, lambda event: computed.append(event.project_versions))
+    stream.on(None, lambda event: everything.append(event.href))
+    assert stream.poll() == 5
+
+    notifications.append({'createdAt': "2024-01-01T00:00:09.000Z", 'type': "BOM_EDIT", '_meta': {'href': "n-9"}})
+    restarted = make_stream()  # picks up the persisted high-water mark
+    restarted.on(None, lambda event: everything.append(event.href))
+    assert restarted.poll() == 1
+
+    assert computed == [{"v-1"}, {"v-3"}]
+    assert everything == ["n-0", "n-1", "n-2", "n-3", "n-4", "n-9"]
+
+
+def test_scan_waiter_resolves_futures(client, requests_mock):
+    from blackduck.Exceptions import ScanFailed
+    from blackduck.ScanWaiter import ScanWaiter
+    version_url = "{}/api/projects/1/versions/".format(fake_hub_host)
+    requests_mock.get(version_url + "1/bom-status", [
+        {'json': {'status': "IN_PROGRESS"}},
+        {'json': {'status': "UP_TO_DATE", 'lastBomUpdateDate': "2023-12-31T00:00:00.000Z"}},  # stale BOM
+        {'json': {'status': "UP_TO_DATE", 'lastBomUpdateDate': "2024-01-02T00:00:00.000Z"}},
+    ])
+    requests_mock.get(version_url + "2/bom-status", json={'status': "UP_TO_DATE_WITH_ERRORS"})
+    codelocation_url = "{}/api/codelocations/1".format(fake_hub_host)
+    requests_mock.get(codelocation_url, json=resource(codelocation_url, "a-scan", **{'latest-scan': codelocation_url + "/scan"}))
+    requests_mock.get(codelocation_url + "/scan", json={'scanState': "SUCCESS", 'createdAt': "2024-01-02T00:00:00.000Z"})
+
+    with ScanWaiter(client, min_interval=0.01, max_interval=0.05, timeout=5) as waiter:
+        computed = waiter.watch_version(version_url + "1", since="2024-01-01T00:00:00.000Z")
+        failed = waiter.watch_version({'_meta': {'href': version_url + "2"}})
+        scanned = waiter.watch_codelocation(codelocation_url, since=datetime(2024, 1, 1))
+
+        assert computed.result(timeout=5)['lastBomUpdateDate'] == "2024-01-02T00:00:00.000Z"
+        with pytest.raises(ScanFailed):
+            failed.result(timeout=5)
+        assert scanned.result(timeout=5)['scanState'] == "SUCCESS"
+
+
+def test_report_manager_downloads_and_deletes_reports(client, requests_mock, tmp_path):
+    from blackduck.Exceptions import ReportFailed
+    from blackduck.ReportManager import ReportManager
+    versions = []
+    for v in range(3):
+        version_url = "{}/api/projects/1/versions/{}".format(fake_hub_host, v)
+        report_url = version_url + "/reports/{}".format(v)
+        versions.append(resource(version_url, None))
+        requests_mock.post(version_url + "/sbom-reports", status_code=201, headers={'Location': report_url})
+        status = "FAILED" if v == 2 else "COMPLETED"
+        requests_mock.get(report_url, [{'json': {'status': "IN_PROGRESS"}},
+                                       {'json': {'status': status, 'fileName': f"sbom-{v}.zip"}}])
+        requests_mock.get("{}/api/reports/{}".format(fake_hub_host, v), content=f"zip-{v}".encode())
+        requests_mock.delete(report_url, status_code=204)
+
+    with ReportManager(client, directory=str(tmp_path), max_downloads=2, min_interval=0.01) as reports:
+        futures = [reports.sbom(version) for version in versions]
+        paths = [future.result(timeout=5) for future in futures[:2]]
+        with pytest.raises(ReportFailed):
+            futures[2].result(timeout=5)
+
+    assert [open(path, 'rb').read() for path in paths] == [b"zip-0", b"zip-1"]
+    assert sorted(r.url for r in requests_mock.request_history if r.method == 'DELETE') == [
+        "{}/api/projects/1/versions/{}/reports/{}".format(fake_hub_host, v, v) for v in range(2)]
+
+
+def test_report_manager_close_resolves_reports_of_a_shared_waiter(client, requests_mock, tmp_path):
+    from concurrent.futures import CancelledError, Future
+    from blackduck.ReportManager import ReportManager
+    from blackduck.ScanWaiter import ScanWaiter
+    version_url = "{}/api/projects/1/versions/1".format(fake_hub_host)
+    report_url = version_url + "/reports/1"
+    requests_mock.post(version_url + "/sbom-reports", status_code=201, headers={'Location': report_url})
+    requests_mock.get(report_url, json={'status': "IN_PROGRESS"})
+
+    with ScanWaiter(client, min_interval=0.01) as waiter:
+        with ReportManager(client, directory=str(tmp_path), waiter=waiter) as reports:
+            pending = reports.sbom(resource(version_url, None))
+        with pytest.raises(CancelledError):
+            pending.result(timeout=5)
+
+    class _RunningWaiter:
+        """Hands out watch futures already running, which close() cannot cancel"""
+        def watch(self, check):
+            self.generated = Future()
+            self.generated.set_running_or_notify_cancel()
+            return self.generated
+
+    waiter = _RunningWaiter()
+    reports = ReportManager(client, directory=str(tmp_path), waiter=waiter)
+    late = reports.sbom(resource(version_url, None))
+    reports.close()
+    waiter.generated.set_result({'status': "COMPLETED"})  # generated just after close
+    with pytest.raises(RuntimeError):
+        late.result(timeout=5)
+
+
+def test_report_manager_leaves_a_cancelled_report_alone(client, requests_mock, tmp_path, caplog):
+    from concurrent.futures import Future
+    from blackduck.ReportManager import ReportManager
+    version_url = "{}/api/projects/1/versions/1".format(fake_hub_host)
+    report_url = version_url + "/reports/1"
+    requests_mock.post(version_url + "/sbom-reports", status_code=201, headers={'Location': report_url})
+    requests_mock.get("{}/api/reports/1".format(fake_hub_host), content=b"zip")
+    requests_mock.delete(report_url, status_code=204)
+    generated = Future()
+
+    class _Waiter:
+        def watch(self, check):
+            return generated
+
+    with ReportManager(client, directory=str(tmp_path), waiter=_Waiter()) as reports:
+        unwanted = reports.sbom(resource(version_url, None))
+        assert unwanted.cancel()
+        generated.set_result({'status': "COMPLETED", 'fileName': "sbom.zip"})
+
+    assert "exception calling callback" not in caplog.text
+    assert (tmp_path / "sbom.zip").read_bytes() == b"zip"
+
+
+class _Trickle:
+    """Non-seekable file-like object returning a few bytes per read, like a socket"""
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size=-1):
+        chunk, self.data = self.data[:min(size, 7)], self.data[min(size, 7):]
+        return chunk
+
+
+def test_report_reader_streams_zip_records():
+    import io
+    import zipfile
+    from blackduck.ReportReader import ReportReader
+    pytest.importorskip("ijson")
+    class Unseekable(io.BytesIO):  # forces zipfile to write data descriptors, as a streaming server would
+        def seek(self, *args):
+            raise OSError("unseekable")
+
+    buffer = Unseekable()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("reports/", "")
+        archive.writestr("reports/version.json", json.dumps({
+            'reportMeta': {'a': 1},
+            'aggregateBomViewEntries': [{'componentName': f"c-{i}", 'licenses': [{'name': "MIT"}]} for i in range(50)],
+            'detailedFileBomViewEntries': [{'path': "/a"}, {'path': "/b"}],
+        }))
+        archive.writestr("reports/components.csv", "Component name,Version\nc-0,1.0\nc-1,2.0\n")
+        with archive.open("reports/big.csv", 'w', force_zip64=True) as f:
+            f.write(b"path\n" + b"".join(f"/file-{i}\n".encode() for i in range(1000)))
+    stored = io.BytesIO()
+    with zipfile.ZipFile(stored, 'w') as archive:  # sizes known up front, no compression
+        archive.writestr("stored.csv", "x\n1\n")
+
+    assert list(ReportReader(_Trickle(stored.getvalue())).records()) == [("stored.csv", None, {'x': "1"})]
+    records = list(ReportReader(_Trickle(buffer.getvalue())).records())
+
+    entries = [r for m, k, r in records if k == 'aggregateBomViewEntries']
+    assert [e['componentName'] for e in entries] == [f"c-{i}" for i in range(50)]
+    assert entries[0]['licenses'] == [{'name': "MIT"}]
+    assert [r['path'] for m, k, r in records if k == 'detailedFileBomViewEntries'] == ["/a", "/b"]
+    assert [r for m, k, r in records if m == "reports/components.csv"] == [
+        {'Component name': "c-0", 'Version': "1.0"}, {'Component name': "c-1", 'Version': "2.0"}]
+    assert len([r for m, k, r in records if m == "reports/big.csv"]) == 1000
+
+
+def test_scan_uploader_retries_and_skips_uploaded_files(client, requests_mock, tmp_path):
+    from blackduck.ScanTransfer import ScanUploader
+    paths = []
+    for name, content in (("a.bdio", b"bdio" * 1000), ("b.jsonld", b"{}"), ("c.txt", b"?")):
+        paths.append(str(tmp_path / name))
+        with open(paths[-1], 'wb') as f:
+            f.write(content)
+    received = {}
+    unavailable = [True]  # the first jsonld upload gets a 503
+
+    def scan_data(request, context):
+        body = request.body.read()
+        if request.headers['Content-Type'] == "application/ld+json" and unavailable:
+            unavailable.pop()
+            context.status_code = 503
+        else:
+            received[request.headers['Content-Type']] = body
+            context.status_code = 201
+        return ""
+    requests_mock.post("{}/api/scan/data/?mode=replace".format(fake_hub_host), text=scan_data)
+    progress = []
+    store = FileCheckpointStore(str(tmp_path / "uploads.json"))
+
+    report = ScanUploader(client, max_workers=2, backoff=0, store=store,
+                          progress=lambda path, sent, total: progress.append((path, sent, total))).upload(paths)
+
+    assert [(r.ok, r.attempts) for r in report.results] == [(True, 1), (True, 2), (False, 0)]
+    assert received["application/vnd.blackducksoftware.bdio+zip"] == b"bdio" * 1000
+    assert (paths[0], 4000, 4000) in progress
+    assert report.bytes == 4002 and report.throughput > 0
+
+    again = ScanUploader(client, store=FileCheckpointStore(str(tmp_path / "uploads.json"))).upload(paths[:2])
+    assert len(again.skipped) == 2 and again.bytes == 0
+
+
+def test_scan_downloader_skips_resumes_and_verifies(client, requests_mock, tmp_path):
+    from blackduck.ScanTransfer import ScanDownloader
+    api = "{}/api".format(fake_hub_host)
+    version_url = api + "/projects/1/versions/1"
+    blobs = {f"{api}/scan/data/scan-{i}.bdio": bytes([i]) * (3000 + i) for i in range(3)}
+    codelocations = [resource(f"{api}/codelocations/{i}", f"cl-{i}", **{'scan-data': url})
+                     for i, url in enumerate(blobs)]
+    requests_mock.get(version_url + "/codelocations", json={'totalCount': 3, 'items': codelocations})
+    truncated = [True]  # the first full download of scan-2 is cut short
+
+    def scan_data(request, context):
+        blob = blobs[request.url]
+        context.headers['Content-Length'] = str(len(blob))
+        if request.method == 'HEAD':
+            return b""
+        if 'Range' in request.headers:
+            start = int(request.headers['Range'][len("bytes="):-1])
+            context.status_code = 206
+            context.headers['Content-Range'] = f"bytes {start}-{len(blob) - 1}/{len(blob)}"
+            context.headers['Content-Length'] = str(len(blob) - start)
+            return blob[start:]
+        if request.url.endswith("scan-2.bdio") and truncated:
+            truncated.pop()
+            return blob[:1000]
+        return blob
+    for url in blobs:
+        requests_mock.get(url, content=scan_data)
+        requests_mock.head(url, content=scan_data)
+
+    (tmp_path / "scan-0.bdio").write_bytes(blobs[api + "/scan/data/scan-0.bdio"])  # already downloaded
+    (tmp_path / "scan-1.bdio.part").write_bytes(blobs[api + "/scan/data/scan-1.bdio"][:1234])  # interrupted
+
+    report = ScanDownloader(client, str(tmp_path), max_workers=3, backoff=0).download_version(resource(
+        version_url, None, codelocations=version_url + "/codelocations"))
+
+    assert [(r.ok, r.skipped, r.attempts) for r in report.results] == [(True, True, 0), (True, False, 1), (True, False, 2)]
+    assert report.results[1].bytes == 3001 - 1234
+    for i, (url, blob) in enumerate(blobs.items()):
+        assert (tmp_path / f"scan-{i}.bdio").read_bytes() == blob
+
+
+def test_bulk_mutator_retries_only_what_is_safe(client, requests_mock, tmp_path):
+    from blackduck.Bulk import BulkMutator
+    api = "{}/api".format(fake_hub_host)
+    calls = {}
+
+    def respond(*statuses):
+        def callback(request, context):
+            count = calls[request.method, request.url] = calls.get((request.method, request.url), 0) + 1
+            context.status_code = statuses[min(count, len(statuses)) - 1]
+            if context.status_code == 201:
+                context.headers['Location'] = api + "/created/1"
+            return {}
+        return callback
+    requests_mock.put(api + "/vulns/0", json=respond(503, 200))
+    requests_mock.put(api + "/vulns/1", json=respond(400))
+    requests_mock.delete(api + "/things/0", json=respond(500, 404))  # the first attempt went through
+    requests_mock.post(api + "/things", json=respond(429, 201))
+    requests_mock.post(api + "/others", json=respond(500, 201))  # may have been processed: not retried
+
+    bulk = BulkMutator(client.session, max_workers=4, rate=1000, backoff=0)
+    for i in range(2):
+        bulk.put(api + f"/vulns/{i}", {'remediationStatus': "IGNORED"}, key=f"CVE-{i}")
+    bulk.delete(api + "/things/0")
+    bulk.post(api + "/things", {'name': "new"})
+    bulk.post(api + "/others", {'name': "new"})
+    assert len(bulk) == 5
+    report = bulk.execute()
+
+    assert len(bulk) == 0
+    assert [(r.operation.key, r.ok, r.status_code, r.attempts) for r in report.results] == [
+        ("CVE-0", True, 200, 2), ("CVE-1", False, 400, 1), (api + "/things/0", True, 404, 2),
+        (api + "/things", True, 201, 2), (api + "/others", False, 500, 1)]
+    assert report.results[3].location == api + "/created/1"
+    report.write_csv(str(tmp_path / "results.csv"))
+    assert (tmp_path / "results.csv").read_text().splitlines()[0].startswith("key,method,url,ok,status_code")
+
+
+def test_plan_puts_only_objects_that_differ(client, requests_mock, tmp_path):
+    from blackduck.Bulk import BulkMutator, plan, read_csv
+    api = "{}/api".format(fake_hub_host)
+    users = {name: {'userName': name, 'active': True, 'email': f"{name}@old", 'type': "INTERNAL",
+                    '_meta': {'href': f"{api}/users/{name}"}} for name in ("ann", "bob", "cid")}
+    (tmp_path / "users.csv").write_text("userName,active,email\nann,true,ann@old\nbob,false,\ncid,TRUE,cid@new\ndan,true,\n")
+    for name in users:
+        requests_mock.get(f"{api}/users/{name}", json=users[name])
+        requests_mock.put(f"{api}/users/{name}", status_code=200)
+
+    desired = read_csv(str(tmp_path / "users.csv"), key='userName')
+    assert desired['bob'] == {'active': "false"}
+    users_plan = plan(desired, lambda name: client.get_json(f"{api}/users/{name}") if name in users else None)
+
+    assert [(c.key, c.differences) for c in users_plan.changes] == [
+        ("bob", {'active': (True, False)}), ("cid", {'email': ("cid@old", "cid@new")})]
+    assert users_plan.unchanged == ["ann"] and users_plan.missing == ["dan"]
+    assert "bob: active: True -> False" in users_plan.describe()
+
+    report = users_plan.apply(BulkMutator(client.session, backoff=0))
+    puts = {r.url: r.json() for r in requests_mock.request_history if r.method == 'PUT'}
+    assert len(report.succeeded) == 2 and set(puts) == {f"{api}/users/bob", f"{api}/users/cid"}
+    assert puts[f"{api}/users/bob"] == dict(users["bob"], active=False)
+
+
+def test_cleanup_applies_retention_policy(client, requests_mock):
+    from blackduck.Cleanup import Cleanup, RetentionPolicy
+    from blackduck.Exceptions import SafetyCapExceeded
+    api = "{}/api".format(fake_hub_host)
+    requests_mock.get(api + "/", json={'projects': api + "/projects", '_meta': {'href': api + "/"}})
+    layout = {"A": [("RELEASED", "2020-01-01", 0), ("DEVELOPMENT", "2023-10-01", 2),
+                    ("DEVELOPMENT", "2023-12-30", 0), ("DEVELOPMENT", "2023-12-31", 1)],
+              "B": [("PRERELEASE", "2023-10-01", 1)],
+              "C": [("DEVELOPMENT", "2023-01-01", 1)],
+              "D": []}
+    projects = []
+    for name, versions in layout.items():
+        project_url = f"{api}/projects/{name}"
+        projects.append(resource(project_url, name, versions=project_url + "/versions"))
+        items = []
+        for i, (phase, created, scans) in enumerate(versions):
+            url = f"{project_url}/versions/{i}"
+            version = resource(url, None, codelocations=url + "/codelocations", components=url + "/components")
+            items.append(dict(version, versionName=f"{name}{i}", phase=phase, createdAt=created + "T00:00:00.000Z"))
+            codelocations = [resource(f"{url}/cl/{c}", f"{name}{i}-scan{c}") for c in range(scans)]
+            requests_mock.get(url + "/codelocations", json={'totalCount': scans, 'items': codelocations})
+            requests_mock.get(url + "/components", json={'totalCount': scans, 'items': []})
+            requests_mock.delete(url, status_code=204)
+            for codelocation in codelocations:
+                requests_mock.delete(codelocation['_meta']['href'], status_code=204)
+        requests_mock.get(project_url + "/versions", json={'totalCount': len(items), 'items': items})
+        requests_mock.delete(project_url, status_code=204)
+    requests_mock.get(api + "/projects", json={'totalCount': len(projects), 'items': projects})
+
+    policy = RetentionPolicy(max_age=30, phase_max_age={'PRERELEASE': 120})
+    plan = Cleanup(client, policy, max_workers=4).plan(now=datetime(2024, 1, 1))
+
+    assert sorted((p['name'], v['versionName'], reason) for p, v, reason in plan.versions) == [
+        ("A", "A1", "92 days old (limit 30)"), ("A", "A2", "empty")]
+    assert sorted((p['name'], [v['versionName'] for v, _ in versions]) for p, versions in plan.projects) == [
+        ("C", ["C0"]), ("D", [])]
+    assert plan.project_count == 4 and "delete project D (no versions)" in plan.describe()
+    counts = [r for r in requests_mock.request_history if r.method == 'GET' and r.path.endswith("/components")]
+    assert {r.qs['limit'][0] for r in counts} == {"1"}
+    assert len(plan) == 3  # C0 counts although it goes with its project
+    with pytest.raises(SafetyCapExceeded):
+        Cleanup(client, policy, max_deletions=2).execute(plan)
+    with pytest.raises(SafetyCapExceeded):
+        Cleanup(client, policy, max_deletions=3, max_codelocations=2).execute(plan)  # 3 scans to delete
+    assert not [r for r in requests_mock.request_history if r.method == 'DELETE']
+
+    report = Cleanup(client, policy, max_workers=4).execute(plan)
+    deleted = [r.url for r in requests_mock.request_history if r.method == 'DELETE']
+    assert len(report.succeeded) == 7 and not report.failed
+    assert all("/cl/" in url for url in deleted[:3]) and set(deleted[3:]) == {
+        f"{api}/projects/A/versions/1", f"{api}/projects/A/versions/2", f"{api}/projects/C", f"{api}/projects/D"}
+    only_version_of_c = next(versions for p, versions in plan.projects if p['name'] == "C")[0][0]
+    assert RetentionPolicy(max_age=30, keep_latest=1).candidates([only_version_of_c], datetime(2024, 1, 1)) == ([], [])
+
+
+def test_bulk_mutator_counts_the_session_adapter_retries():
+    import http.server
+    import threading
+    import requests
+    from blackduck.Bulk import BulkMutator
+    from blackduck.Client import retry_adapter
+    calls = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def respond(self):
+            calls.append((self.command, self.path))
+            deleted_before = self.command == 'DELETE' and calls.count(('DELETE', self.path)) > 1
+            self.send_response(404 if deleted_before else 500 if self.command == 'DELETE' else 503)
+            self.send_header('Content-Length', "0")
+            self.end_headers()
+        do_PUT = do_DELETE = respond
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        session = requests.Session()
+        session.mount("http://", retry_adapter(1))  # retries once, without waiting
+        base = f"http://127.0.0.1:{server.server_port}"
+        bulk = BulkMutator(session, retries=3, backoff=0)
+        bulk.delete(base + "/things/0")
+        bulk.put(base + "/busy", {'name': "x"})
+        report = bulk.execute()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert [(r.ok, r.status_code, r.attempts) for r in report.results] == [(True, 404, 2), (False, None, 2)]
+    assert calls.count(('PUT', "/busy")) == 2  # the adapter's retry only, not 4 more of ours on top
+
+
+def test_bulk_mutator_keeps_going_past_a_broken_operation(requests_mock):
+    import socket
+    import requests
+    from blackduck.Bulk import BulkMutator
+    api = "{}/api".format(fake_hub_host)
+    requests_mock.put(api + "/vulns/0", json={})
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        refused = f"http://127.0.0.1:{unused.getsockname()[1]}/things"  # nothing listens there
+    requests_mock.post(refused, real_http=True)
+
+    bulk = BulkMutator(requests.Session(), retries=2, backoff=0)  # no adapter retries: only ours
+    bulk.put(api + "/vulns/1", {'ids': {1, 2}})  # a set is not JSON serializable
+    bulk.put(api + "/vulns/0", {'remediationStatus': "IGNORED"})
+    bulk.post(refused, {'name': "new"})
+    report = bulk.execute()
+
+    assert [(r.ok, r.attempts) for r in report.results] == [(False, 1), (True, 1), (False, 3)]
+    assert report.results[0].error.startswith("TypeError")
+
+
+def test_notification_stream_redelivers_the_event_a_handler_failed_on(client, requests_mock, tmp_path):
+    from blackduck.Notifications import NotificationStream
+    notifications = [{'createdAt': f"2024-01-01T00:00:0{i}.000Z", 'type': "BOM_EDIT", '_meta': {'href': f"n-{i}"}}
+                     for i in range(3)]
+    requests_mock.get("{}/api/notifications".format(fake_hub_host), json=keyset_items(notifications))
+    delivered = []
+
+    def make_stream(name, fail_on=None):
+        stream = NotificationStream(client, store=FileCheckpointStore(str(tmp_path / name)),
+                                    start=datetime(2024, 1, 1), page_size=10)
+
+        @stream.on(None)
+        def handler(event):
+            delivered.append(event.href)
+            if event.href == fail_on:
+                raise RuntimeError("handler failed")
+        return stream
+
+    with pytest.raises(RuntimeError):
+        make_stream("restart.json", fail_on="n-1").poll()
+    assert make_stream("restart.json").poll() == 2  # restarted from the store
+    assert delivered == ["n-0", "n-1", "n-1", "n-2"]
+
+    delivered.clear()
+    stream = make_stream("same.json", fail_on="n-1")
+    with pytest.raises(RuntimeError):
+        stream.poll()
+    stream.handlers.clear()
+    stream.on(None, lambda event: delivered.append(event.href))
+    assert stream.poll() == 2  # the same stream steps back to the failed event
+    assert delivered == ["n-0", "n-1", "n-1", "n-2"]
+
+
+def test_scan_waiter_survives_a_future_cancelled_during_its_check(client):
+    import threading
+    from blackduck.ScanWaiter import ScanWaiter
+    checking, release = threading.Event(), threading.Event()
+
+    def slow_check():
+        checking.set()
+        release.wait(5)
+        return True, "done", "DONE"
+
+    with ScanWaiter(client, min_interval=0.01, max_interval=0.05, timeout=5) as waiter:
+        cancelled = waiter.watch(slow_check)
+        assert checking.wait(5)
+        assert cancelled.cancel()
+        release.set()
+        assert waiter.watch(lambda: (True, "next", "DONE")).result(timeout=5) == "next"
+        assert waiter._thread.is_alive()
+
+
+def test_scan_waiter_is_not_held_up_by_a_hung_check(client):
+    import threading
+    from blackduck.ScanWaiter import ScanWaiter
+    release = threading.Event()
+    checks = []
+
+    def progressing():
+        checks.append(None)
+        return len(checks) == 3, "ready", len(checks)
+
+    with ScanWaiter(client, min_interval=0.01, max_interval=0.05, timeout=10) as waiter:
+        hung = waiter.watch(lambda: (release.wait(10), "late", "DONE"))
+        assert waiter.watch(progressing).result(timeout=5) == "ready"  # checked three times meanwhile
+        assert not hung.done()
+        release.set()
+        assert hung.result(timeout=5) == "late"
@@ -229,6 +229,23 @@ def test_hub_instance_with_write_config_false(requests_mock):
 
         assert not mock_write_config.called
 
+def test_hub_instance_pooled_session(requests_mock):
+    requests_mock.post(
+        "https://my-hub-host/j_spring_security_check", 
+        headers={"Set-Cookie": 'AUTHORIZATION_BEARER={}; Path=/; secure; Secure; HttpOnly'.format(invalid_bearer_token)}
+    )
+    requests_mock.get(
+        "{}/api/current-version".format(fake_hub_host),
+        json = {"version": "2018.11.0"}
+    )
+
+    hub = HubInstance(fake_hub_host, "a_username", "a_password", pool_size=20, retries=5, write_config_flag=False)
+
+    adapter = hub.session.adapters['https://']
+    assert adapter._pool_maxsize == 20
+    assert adapter.max_retries.total == 5
+    assert hub.session.verify
+
 def test_get_policy_by_id(requests_mock, mock_hub_instance, a_test_policy):
     requests_mock.get(fake_hub_host + "/api/policy-rules/00000000-0000-0000-0000-000000000001", json=a_test_policy)
     policy = mock_hub_instance.get_policy_by_id("00000000-0000-0000-0000-000000000001")
@@ -393,6 +410,66 @@ def test_get_version_by_name(requests_mock, mock_hub_instance, shared_datadir):
 
     assert version['versionName'] == version_name
 
+def test_name_index_resolves_names_locally(requests_mock, mock_hub_instance, tmp_path):
+    from blackduck.NameIndex import NameIndex
+    projects_url = mock_hub_instance.get_urlbase() + "/api/projects"
+    projects = [{'name': f"project-{p}", 'updatedAt': "2024-01-01", '_meta': {'href': f"{projects_url}/{p}"}}
+                for p in range(3)]
+    requests_mock.get(projects_url, json={'totalCount': 3, 'items': projects})
+    all_versions = {}
+    for p, project in enumerate(projects):
+        versions = all_versions[p] = [{'versionName': name, 'phase': "PLANNING",
+                                       '_meta': {'href': f"{projects_url}/{p}/versions/{name}"}}
+                                      for name in (["1.0", "2.0"] if p != 1 else ["2.0"])]
+        requests_mock.get(f"{projects_url}/{p}/versions", json={'totalCount': len(versions), 'items': versions})
+        requests_mock.get(project['_meta']['href'], json=project)
+        for version in versions:
+            requests_mock.get(version['_meta']['href'], json=version)
+        requests_mock.delete(f"{projects_url}/{p}", status_code=204)
+    requests_mock.post(projects_url, status_code=201, headers={'Location': f"{projects_url}/3"})
+
+    index = NameIndex(mock_hub_instance, str(tmp_path / "names.sqlite"))
+    mock_hub_instance.name_index = index
+    before = requests_mock.call_count
+
+    assert mock_hub_instance.get_project_by_name("project-2")['_meta']['href'] == f"{projects_url}/2"
+    assert requests_mock.call_count == before + 2  # the projects listed, no versions yet, and one GET
+    requests_mock.get(f"{projects_url}/0/versions/2.0", json=dict(all_versions[0][1], phase="RELEASED"))
+    version = mock_hub_instance.get_project_version_by_name("project-0", "2.0")
+    assert version['phase'] == "RELEASED"  # fetched by href, not a copy kept by the index
+    found = mock_hub_instance.get_projects_by_version_name("1.0", exclude_projects=["project-2"])
+    assert [p['name'] for p in found['items']] == ["project-0"] and found['items'][0]['version']['versionName'] == "1.0"
+    searches = [r for r in requests_mock.request_history[before:] if 'q' in r.qs]
+    # 1 listing of projects and 3 of versions, each on first use, then one GET per object returned
+    assert not searches and requests_mock.call_count == before + 4 + 1 + 2 + 2
+
+    all_versions[1].append({'versionName': "3.0", '_meta': {'href': f"{projects_url}/1/versions/3.0"}})
+    requests_mock.get(f"{projects_url}/1/versions/3.0", json=all_versions[1][-1])
+    found = mock_hub_instance.get_projects_by_version_name("3.0")  # created elsewhere: not indexed yet
+    assert [p['name'] for p in found['items']] == ["project-1"]
+    assert index.version_href("project-1", "3.0") == f"{projects_url}/1/versions/3.0"
+
+    mock_hub_instance.delete_project_by_name("project-1", save_scans=True)
+    assert index.project_href("project-1") is None
+    mock_hub_instance.create_project("project-3")
+    projects.append({'name': "project-3", '_meta': {'href': f"{projects_url}/3"}})
+    requests_mock.get(f"{projects_url}/3/versions", json={'totalCount': 1, 'items': [
+        {'versionName': "Default Version", '_meta': {'href': f"{projects_url}/3/versions/1"}}]})
+    assert index.href("project-3", "Default Version") == f"{projects_url}/3/versions/1"  # reloaded by name
+
+    reopened = NameIndex(mock_hub_instance, str(tmp_path / "names.sqlite"))
+    calls = requests_mock.call_count
+    assert reopened.href("project-0", "1.0") == f"{projects_url}/0/versions/1.0" and reopened.href("project-1") is None
+    assert requests_mock.call_count == calls
+
+    kept = NameIndex(mock_hub_instance, keep_objects=True)
+    mock_hub_instance.name_index = kept
+    calls = requests_mock.call_count
+    version = mock_hub_instance.get_project_version_by_name("project-0", "1.0")
+    assert version['versionName'] == "1.0" and kept.object(version['_meta']['href']) == version
+    assert [r.url.split("?")[0] for r in requests_mock.request_history[calls:]] == [
+        projects_url, f"{projects_url}/0/versions"]  # listings only, no GET per object
+
 def test_create_version_reports(requests_mock, mock_hub_instance):
     pass
 
@@ -446,6 +523,21 @@ def test_get_link(mock_hub_instance):
 
     assert mock_hub_instance.get_link(bd_rest_obj, link_name) == a_url
 
+def test_get_link_indexes_links_once_per_object(mock_hub_instance):
+    links = [{'rel': f"rel-{i}", 'href': f"http://a-url/{i}"} for i in range(3)]
+    links.append({'rel': 'rel-1', 'href': 'http://a-url/duplicate'})
+    bd_rest_obj = {'_meta':{'href': 'http://a-url', 'links': links}}
+
+    assert mock_hub_instance.get_link(bd_rest_obj, 'rel-2') == 'http://a-url/2'
+    assert mock_hub_instance.get_link(bd_rest_obj, 'rel-1') == 'http://a-url/1'
+    assert mock_hub_instance.get_link(bd_rest_obj, 'missing') == None
+    assert '_links' not in bd_rest_obj['_meta']
+
+    # the same object fetched again, with a link removed and one added on the server
+    refetched = {'_meta':{'href': 'http://a-url', 'links': [{'rel': 'rel-3', 'href': 'http://a-url/3'}]}}
+    assert mock_hub_instance.get_link(refetched, 'rel-2') == None
+    assert mock_hub_instance.get_link(refetched, 'rel-3') == 'http://a-url/3'
+
 def test_get_link_returns_None_for_invalid_bd_rest_object(mock_hub_instance):
     bd_rest_obj = {}
 
@@ -498,3 +590,30 @@ def test_get_codelocations_unmapped(mock_hub_instance, code_locations):
     assert code_locs == expected_data
 
 
+
+def test_exhausted_retries_still_return_the_response(mock_hub_instance, requests_mock):
+    import http.server
+    import threading
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def respond(self):
+            self.send_response(503 if self.path == "/busy" else 500)
+            self.send_header('Content-Length', "0")
+            self.end_headers()
+        do_GET = do_PUT = do_DELETE = respond
+
+        def log_message(self, *args):
+            pass
+
+    requests_mock.real_http = True  # through the session's retry adapter to the local server
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        mock_hub_instance.session = mock_hub_instance._create_session(retries=1)  # retries once, without waiting
+        base = f"http://127.0.0.1:{server.server_port}"
+        assert mock_hub_instance.execute_get(base + "/busy").status_code == 503
+        assert mock_hub_instance.execute_put(base + "/broken", {}).status_code == 500
+        assert mock_hub_instance.execute_delete(base + "/broken").status_code == 500
+    finally:
+        server.shutdown()
+        server.server_close()